@@ -6,6 +6,9 @@ class AsyncDict:
         self._data = {}
         self._cond = asyncio.Condition()
 
+    def __len__(self) -> int:
+        return len(self._data)
+
     async def get_item(self, key, timeout: float = None, remove: bool = False):
         async with self._cond:
             await asyncio.wait_for(
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+from ra2yrproto import ra2yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.subscription import SubscriptionPolicy
+
+
+class SyncBridge:
+    """Thread-safe facade to a Manager running in an event loop.
+
+    Worker threads submit commands and get concurrent.futures.Future objects
+    back, so they can keep computing while the loop does network I/O. The
+    latest processed state is available without touching the loop.
+
+    Example
+    -------
+    >>> bridge = SyncBridge(M)  # in the loop that runs M
+    >>> await asyncio.to_thread(planner, bridge)
+
+    where planner does e.g.
+
+    >>> s = bridge.wait_state(after_frame=0)
+    >>> futs = bridge.submit_many([commands_yr.AddMessage(message="hi")])
+    >>> bridge.call(M.M.attack, objects, target).result()
+    """
+
+    def __init__(self, manager: Manager, loop: asyncio.AbstractEventLoop = None):
+        """
+        Parameters
+        ----------
+        manager : Manager
+            The manager
+        loop : asyncio.AbstractEventLoop, optional
+            Loop running the manager. By default, the running loop.
+        """
+        self.manager = manager
+        self.loop = loop or asyncio.get_running_loop()
+        self._cond = threading.Condition()
+        self._latest: ra2yr.GameState = None
+        self._closed = False
+        self._sub = None
+        self._task = None
+        self.loop.call_soon_threadsafe(self._start)
+
+    def _start(self):
+        self._sub = self.manager.states(SubscriptionPolicy.LATEST)
+        self._task = self.loop.create_task(self._consume())
+
+    async def _consume(self):
+        async for s in self._sub:
+            with self._cond:
+                self._latest = s
+                self._cond.notify_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def close(self):
+        """Stop tracking states. Threads waiting for state are woken up."""
+
+        def _close():
+            if self._sub:
+                self._sub.close()
+
+        self.loop.call_soon_threadsafe(_close)
+
+    def latest_state(self) -> ra2yr.GameState | None:
+        """Get the latest processed state, or None if there isn't one yet. The
+        state is shared and must not be modified."""
+        with self._cond:
+            return self._latest
+
+    def wait_state(
+        self, after_frame: int = -1, timeout: float = None
+    ) -> ra2yr.GameState:
+        """Block until a state newer than after_frame is available.
+
+        Raises
+        ------
+        TimeoutError
+            If no such state arrived in time, or the bridge was closed.
+        """
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: self._closed
+                or (
+                    self._latest is not None
+                    and self._latest.current_frame > after_frame
+                ),
+                timeout=timeout,
+            )
+            if (
+                not ok
+                or self._latest is None
+                or self._latest.current_frame <= after_frame
+            ):
+                raise TimeoutError(f"no state after frame {after_frame}")
+            return self._latest
+
+    def run_coroutine(self, aw: Awaitable) -> Future:
+        """Run awaitable in the manager's loop."""
+        return asyncio.run_coroutine_threadsafe(aw, self.loop)
+
+    def call(self, fn: Callable[..., Awaitable], *args, **kwargs) -> Future:
+        """Call a coroutine function in the manager's loop, e.g.
+        ``bridge.call(M.M.attack, objects, target)``."""
+
+        async def _call():
+            return await fn(*args, **kwargs)
+
+        return self.run_coroutine(_call())
+
+    def submit(self, c: Any, **kwargs) -> Future:
+        """Run a command, see Manager.run.
+
+        Returns
+        -------
+        Future
+            Future for the unpacked command result.
+        """
+        return self.run_coroutine(self.manager.run(c, **kwargs))
+
+    def submit_many(self, cmds: list[Any]) -> Future:
+        """Run commands concurrently with a single hand-off to the loop.
+
+        Returns
+        -------
+        Future
+            Future for the list of results. Failed commands have an exception
+            in place of result.
+        """
+
+        async def _run():
+            return await asyncio.gather(
+                *(self.manager.run(c) for c in cmds), return_exceptions=True
+            )
+
+        return self.run_coroutine(_run())
@@ -0,0 +1,227 @@
+from operator import attrgetter
+from pathlib import Path
+
+import numpy as np
+from google.protobuf.descriptor import FieldDescriptor
+from ra2yrproto import ra2yr
+
+from pyra2yr.wire_columns import WIRE_DECODE_MIN, ObjectDecoder
+
+_CPPTYPE_DTYPES = {
+    FieldDescriptor.CPPTYPE_BOOL: np.bool_,
+    FieldDescriptor.CPPTYPE_DOUBLE: np.float64,
+    FieldDescriptor.CPPTYPE_ENUM: np.int32,
+    FieldDescriptor.CPPTYPE_FLOAT: np.float32,
+    FieldDescriptor.CPPTYPE_INT32: np.int32,
+    FieldDescriptor.CPPTYPE_INT64: np.int64,
+    FieldDescriptor.CPPTYPE_UINT32: np.uint32,
+    FieldDescriptor.CPPTYPE_UINT64: np.uint64,
+}
+
+OBJECT_COLUMNS = {
+    "pointer_self": np.uint32,
+    "pointer_house": np.uint32,
+    "pointer_technotypeclass": np.uint32,
+    "object_type": np.int32,
+    "coordinates.x": np.int32,
+    "coordinates.y": np.int32,
+    "coordinates.z": np.int32,
+    "health": np.int32,
+    "current_mission": np.int32,
+}
+
+
+def scalar_columns(descriptor) -> dict[str, type]:
+    """Get numeric, non-repeated fields of a message type and their dtypes.
+
+    Parameters
+    ----------
+    descriptor : Descriptor
+        Message descriptor, e.g. ``ra2yr.House.DESCRIPTOR``
+
+    Returns
+    -------
+    dict[str, type]
+        Mapping from field name to NumPy dtype.
+    """
+    return {
+        f.name: _CPPTYPE_DTYPES[f.cpp_type]
+        for f in descriptor.fields
+        if f.label != FieldDescriptor.LABEL_REPEATED and f.cpp_type in _CPPTYPE_DTYPES
+    }
+
+
+def column_arrays(
+    items, columns: dict[str, type], getter=None
+) -> dict[str, np.ndarray]:
+    """Build one array per column from a sequence of messages.
+
+    The fields of all columns are read in a single pass over the messages.
+
+    Parameters
+    ----------
+    items : Sequence
+        Messages, e.g. ``s.objects``
+    columns : dict[str, type]
+        Attribute paths (e.g. ``coordinates.x``) mapped to dtypes
+    getter : Callable, optional
+        Precomputed ``attrgetter(*columns)``
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Arrays keyed by column.
+    """
+    if not columns:
+        return {}
+    getter = getter or attrgetter(*columns)
+    if len(columns) == 1:
+        k, dtype = next(iter(columns.items()))
+        return {k: np.fromiter(map(getter, items), dtype=dtype, count=len(items))}
+    rows = np.fromiter(
+        map(getter, items), dtype=np.dtype(list(columns.items())), count=len(items)
+    )
+    return {k: rows[k] for k in columns}
+
+
+def object_columns(
+    s: ra2yr.GameState, raw: bytes = None, decoder: ObjectDecoder = None
+) -> dict[str, np.ndarray]:
+    """Get columns of the objects of a state.
+
+    Parameters
+    ----------
+    s : ra2yr.GameState
+        The state
+    raw : bytes, optional
+        Serialized form of s. If given with decoder, large states are decoded
+        from it, which is faster than reading the fields of s.
+    decoder : ObjectDecoder, optional
+        Decoder of the columns, by default read OBJECT_COLUMNS from s
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Arrays keyed by column. Decoded arrays are overwritten by the next
+        call with the same decoder.
+    """
+    if decoder is None:
+        return column_arrays(s.objects, OBJECT_COLUMNS)
+    if raw is not None and len(s.objects) >= WIRE_DECODE_MIN:
+        return decoder.decode(raw).columns
+    return column_arrays(s.objects, decoder.columns)
+
+
+class ColumnTable:
+    """Append-only table of per-frame rows, stored as one array per column."""
+
+    def __init__(self, columns: dict[str, type]):
+        self.columns = columns
+        self._getter = attrgetter(*columns)
+        self._chunks: dict[str, list[np.ndarray]] = {
+            k: [] for k in ["frame"] + list(columns)
+        }
+
+    def append(self, frame: int, items):
+        n = len(items)
+        self.append_columns(frame, column_arrays(items, self.columns, self._getter), n)
+
+    def append_columns(self, frame: int, columns: dict[str, np.ndarray], n: int):
+        """Append n rows given as arrays, which are copied."""
+        self._chunks["frame"].append(np.full(n, frame, dtype=np.uint32))
+        for k in self.columns:
+            self._chunks[k].append(np.array(columns[k], dtype=self.columns[k]))
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        dtypes = {"frame": np.uint32, **self.columns}
+        return {
+            k: np.concatenate(v) if v else np.empty(0, dtype=dtypes[k])
+            for k, v in self._chunks.items()
+        }
+
+
+class ColumnarTables:
+    """Columnar tables built from a sequence of game states.
+
+    Tables are ``frames`` (one row per state), ``houses``, ``objects`` and
+    ``factories`` (one row per item per state). Every table has a ``frame``
+    column that can be used to join them.
+    """
+
+    def __init__(self):
+        self.tables = {
+            "frames": ColumnTable(
+                {"current_frame": np.uint32, "stage": np.int32, "crc": np.uint32}
+            ),
+            "houses": ColumnTable(scalar_columns(ra2yr.House.DESCRIPTOR)),
+            "objects": ColumnTable(OBJECT_COLUMNS),
+            "factories": ColumnTable(scalar_columns(ra2yr.Factory.DESCRIPTOR)),
+        }
+        self._decoder = ObjectDecoder(OBJECT_COLUMNS)
+
+    def append(self, s: ra2yr.GameState, raw: bytes = None):
+        """Append rows of a state.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state
+        raw : bytes, optional
+            Serialized form of s. If given, objects are decoded from it with
+            ObjectDecoder, which is faster for large states.
+        """
+        f = s.current_frame
+        self.tables["frames"].append(f, [s])
+        self.tables["houses"].append(f, s.houses)
+        self.tables["objects"].append_columns(
+            f, object_columns(s, raw, self._decoder), len(s.objects)
+        )
+        self.tables["factories"].append(f, s.factories)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Get all columns keyed by ``<table>.<column>``."""
+        res = {}
+        for name, t in self.tables.items():
+            res.update({f"{name}.{k}": v for k, v in t.arrays().items()})
+        return res
+
+    def save(self, path: str | Path):
+        """Save tables either to a single ``.npz`` archive, or as a directory
+        containing one ``.npy`` file per column. The latter can be loaded with
+        ``np.load(..., mmap_mode="r")``.
+
+        Parameters
+        ----------
+        path : str | Path
+            Output path. If it ends with ``.npz``, an archive is written.
+        """
+        path = Path(path)
+        arrays = self.arrays()
+        if path.suffix == ".npz":
+            np.savez(path, **arrays)
+            return
+        path.mkdir(parents=True, exist_ok=True)
+        for k, v in arrays.items():
+            np.save(path / f"{k}.npy", v)
+
+
+def load_columns(path: str | Path, mmap_mode: str = "r") -> dict[str, np.ndarray]:
+    """Load columns written by ColumnarTables.save.
+
+    Parameters
+    ----------
+    path : str | Path
+        Path to ``.npz`` archive or ``.npy`` directory.
+    mmap_mode : str, optional
+        Memory map mode for ``.npy`` directories, by default "r"
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Columns keyed by ``<table>.<column>``.
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        with np.load(path) as d:
+            return dict(d)
+    return {p.stem: np.load(p, mmap_mode=mmap_mode) for p in path.glob("*.npy")}
@@ -0,0 +1,319 @@
+"""Delta encoded replay format.
+
+A replay consists of gzip compressed, length-delimited records preceded by a
+magic string. The first record is a header holding the format version and
+keyframe interval. Every following record is either a keyframe holding a full
+GameState, or a delta against the previous state. A delta holds the state
+without objects, the removed object pointers and, for each added or changed
+object, the changed fields and the fields reset to their default values.
+"""
+
+import gzip
+import time
+from pathlib import Path
+from typing import Iterator
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal.decoder import _DecodeVarint
+from google.protobuf.internal.encoder import _VarintBytes
+from ra2yrproto import ra2yr
+
+from pyra2yr.util import read_protobuf_messages, read_raw_messages
+
+MAGIC = b"PYRA2YRD"
+VERSION = 1
+
+KEYFRAME = 0
+DELTA = 1
+
+_OBJECT_FIELDS = ra2yr.Object.DESCRIPTOR.fields_by_number
+# Tag of a GameState.objects entry, i.e. field number and length-delimited
+# wire type
+_OBJECTS_TAG = _VarintBytes(
+    ra2yr.GameState.DESCRIPTOR.fields_by_name["objects"].number << 3 | 2
+)
+
+
+def _write_varints(out: list[bytes], values):
+    out.append(_VarintBytes(len(values)))
+    out.extend(_VarintBytes(v) for v in values)
+
+
+def _read_varints(buf, pos: int) -> tuple[list[int], int]:
+    n, pos = _DecodeVarint(buf, pos)
+    res = []
+    for _ in range(n):
+        v, pos = _DecodeVarint(buf, pos)
+        res.append(v)
+    return res, pos
+
+
+def _read_bytes(buf, pos: int) -> tuple[bytes, int]:
+    n, pos = _DecodeVarint(buf, pos)
+    return buf[pos : pos + n], pos + n
+
+
+def _set_field(m, fd: FieldDescriptor, v):
+    if fd.label == FieldDescriptor.LABEL_REPEATED:
+        getattr(m, fd.name).extend(v)
+    elif fd.message_type is not None:
+        getattr(m, fd.name).CopyFrom(v)
+    else:
+        setattr(m, fd.name, v)
+
+
+def object_delta(
+    old: ra2yr.Object, new: ra2yr.Object
+) -> tuple[ra2yr.Object, list[int]]:
+    """Compute field level difference between two versions of an object.
+
+    Returns
+    -------
+    tuple[ra2yr.Object, list[int]]
+        Object holding the changed fields, and numbers of fields that were
+        reset to default value.
+    """
+    old_fields = dict(old.ListFields())
+    delta = ra2yr.Object()
+    for fd, v in new.ListFields():
+        if fd not in old_fields or old_fields.pop(fd) != v:
+            _set_field(delta, fd, v)
+    return delta, [fd.number for fd in old_fields]
+
+
+def apply_object_delta(o: ra2yr.Object, delta: ra2yr.Object, cleared: list[int]):
+    for n in cleared:
+        o.ClearField(_OBJECT_FIELDS[n].name)
+    for fd, _ in delta.ListFields():
+        o.ClearField(fd.name)
+    o.MergeFrom(delta)
+
+
+class DeltaEncoder:
+    """Encode a sequence of game states into delta format records."""
+
+    def __init__(self, keyframe_interval: int = 30):
+        self.keyframe_interval = keyframe_interval
+        self._objects: dict[int, ra2yr.Object] = {}
+        self._order: list[int] = []
+        self._count = 0
+
+    def header(self) -> bytes:
+        out = [MAGIC]
+        payload = _VarintBytes(VERSION) + _VarintBytes(self.keyframe_interval)
+        out.append(_VarintBytes(len(payload)) + payload)
+        return b"".join(out)
+
+    def _reset(self, s: ra2yr.GameState):
+        self._objects = {}
+        for o in s.objects:
+            c = ra2yr.Object()
+            c.CopyFrom(o)
+            self._objects[o.pointer_self] = c
+        self._order = [o.pointer_self for o in s.objects]
+
+    def encode(self, s: ra2yr.GameState) -> bytes:
+        """Encode state into a length-delimited record."""
+        order = [o.pointer_self for o in s.objects]
+        # Objects are keyed by pointer, so fall back to keyframe on duplicates
+        keyframe = self._count % self.keyframe_interval == 0 or len(set(order)) != len(
+            order
+        )
+        self._count += 1
+        if keyframe:
+            self._reset(s)
+            payload = bytes([KEYFRAME]) + s.SerializeToString()
+            return _VarintBytes(len(payload)) + payload
+
+        base = ra2yr.GameState()
+        base.CopyFrom(s)
+        base.ClearField("objects")
+        out = [bytes([DELTA])]
+        b = base.SerializeToString()
+        out.append(_VarintBytes(len(b)) + b)
+        self._encode_objects(out, s, order)
+        payload = b"".join(out)
+        return _VarintBytes(len(payload)) + payload
+
+    def _encode_objects(self, out: list[bytes], s: ra2yr.GameState, order: list[int]):
+        current = set(order)
+        previous = set(self._order)
+        # Previous keyframe may have had duplicate pointers
+        removed = [p for p in dict.fromkeys(self._order) if p not in current]
+        _write_varints(out, removed)
+        for p in removed:
+            del self._objects[p]
+
+        changed = []
+        for o in s.objects:
+            old = self._objects.get(o.pointer_self)
+            if old is None:
+                old = ra2yr.Object()
+                self._objects[o.pointer_self] = old
+            elif old == o:
+                continue
+            delta, cleared = object_delta(old, o)
+            changed.append((o.pointer_self, delta.SerializeToString(), cleared))
+            old.CopyFrom(o)
+        out.append(_VarintBytes(len(changed)))
+        for p, d, cleared in changed:
+            out.append(_VarintBytes(p) + _VarintBytes(len(d)) + d)
+            _write_varints(out, cleared)
+
+        # Object order is only stored if it can't be inferred from previous
+        # order, removals and additions.
+        expected = [p for p in self._order if p in current]
+        expected.extend(p for p in order if p not in previous)
+        if expected == order:
+            out.append(_VarintBytes(0))
+        else:
+            out.append(_VarintBytes(1))
+            _write_varints(out, order)
+        self._order = order
+
+
+class DeltaDecoder:  # pylint: disable=too-few-public-methods
+    """Reconstruct full game states from delta format records.
+
+    Objects are cached in serialized form, so that unchanged objects are only
+    decoded once as part of the full state.
+    """
+
+    def __init__(self):
+        self._objects: dict[int, bytes] = {}
+        self._order: list[int] = []
+
+    def _put(self, p: int, b: bytes):
+        self._objects[p] = _OBJECTS_TAG + _VarintBytes(len(b)) + b
+
+    def _get(self, p: int) -> ra2yr.Object:
+        b = self._objects[p]
+        _, pos = _DecodeVarint(b, len(_OBJECTS_TAG))
+        return ra2yr.Object.FromString(b[pos:])
+
+    def decode(self, record) -> ra2yr.GameState:
+        kind = record[0]
+        if kind == KEYFRAME:
+            s = ra2yr.GameState.FromString(record[1:])
+            self._objects = {}
+            for o in s.objects:
+                self._put(o.pointer_self, o.SerializeToString())
+            self._order = [o.pointer_self for o in s.objects]
+            return s
+        if kind != DELTA:
+            raise RuntimeError(f"invalid record type: {kind}")
+
+        base, pos = _read_bytes(record, 1)
+        removed, pos = _read_varints(record, pos)
+        for p in removed:
+            del self._objects[p]
+        removed = set(removed)
+        added = []
+        n_changed, pos = _DecodeVarint(record, pos)
+        for _ in range(n_changed):
+            p, pos = _DecodeVarint(record, pos)
+            d, pos = _read_bytes(record, pos)
+            cleared, pos = _read_varints(record, pos)
+            if p in self._objects:
+                o = self._get(p)
+            else:
+                o = ra2yr.Object()
+                added.append(p)
+            apply_object_delta(o, ra2yr.Object.FromString(d), cleared)
+            self._put(p, o.SerializeToString())
+        has_order, pos = _DecodeVarint(record, pos)
+        if has_order:
+            order, pos = _read_varints(record, pos)
+        else:
+            order = [p for p in self._order if p not in removed] + added
+        self._order = order
+        return ra2yr.GameState.FromString(
+            base + b"".join(self._objects[p] for p in order)
+        )
+
+
+def is_delta_replay(f) -> bool:
+    """Check whether a (decompressed) replay stream is in delta format. Doesn't
+    consume the stream."""
+    return f.peek(len(MAGIC))[: len(MAGIC)] == MAGIC
+
+
+def read_delta_messages(f) -> Iterator[ra2yr.GameState]:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise RuntimeError("not a delta replay")
+    records = read_raw_messages(f)
+    try:
+        header = next(records)
+    except StopIteration:
+        return
+    version, _ = _DecodeVarint(header, 0)
+    if version != VERSION:
+        raise RuntimeError(f"unsupported delta replay version: {version}")
+    D = DeltaDecoder()
+    for r in records:
+        yield D.decode(r)
+
+
+def read_replay(f) -> Iterator[ra2yr.GameState]:
+    """Read states from either full state or delta format replay.
+
+    Parameters
+    ----------
+    f : gzip.GzipFile
+        Decompressed replay stream. Must support ``peek``.
+    """
+    if is_delta_replay(f):
+        return read_delta_messages(f)
+    return read_protobuf_messages(f)
+
+
+class DeltaReplayWriter:
+    """Write game states to a gzip compressed delta format replay."""
+
+    def __init__(self, path: str | Path, keyframe_interval: int = 30):
+        self.encoder = DeltaEncoder(keyframe_interval)
+        self._f = gzip.open(path, "wb")
+        self._f.write(self.encoder.header())
+
+    def write(self, s: ra2yr.GameState):
+        self._f.write(self.encoder.encode(s))
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, tb):
+        self.close()
+
+
+def convert_to_delta(path: str | Path, output_path: str | Path, keyframe_interval=30):
+    with gzip.open(path, "rb") as f, DeltaReplayWriter(
+        output_path, keyframe_interval
+    ) as w:
+        for s in read_protobuf_messages(f):
+            w.write(s)
+
+
+def benchmark_formats(path: str | Path, delta_path: str | Path) -> dict[str, dict]:
+    """Compare size and full decode time of a replay and its delta encoded
+    counterpart.
+
+    Returns
+    -------
+    dict[str, dict]
+        For both formats, file size in bytes, number of states and decode
+        time in seconds.
+    """
+    res = {}
+    for k, p in [("full", path), ("delta", delta_path)]:
+        t = time.perf_counter()
+        with gzip.open(p, "rb") as f:
+            n = sum(1 for _ in read_replay(f))
+        res[k] = {
+            "size": Path(p).stat().st_size,
+            "states": n,
+            "decode_time": time.perf_counter() - t,
+        }
+    return res
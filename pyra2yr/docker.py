@@ -3,11 +3,13 @@ from dataclasses import dataclass, field, asdict
 
 class Docker:
     @classmethod
-    def _common(cls, compose_files=None):
+    def _common(cls, compose_files=None, project=None):
         cf = compose_files or ["docker-compose.yml"]
         r = ["docker", "compose"]
         for c in cf:
             r.extend(["-f", c])
+        if project:
+            r.extend(["-p", project])
         return r
 
     @classmethod
@@ -20,8 +22,9 @@ class Docker:
         name=None,
         env=None,
         volumes=None,
+        project=None,
     ):
-        r = cls._common(compose_files=compose_files)
+        r = cls._common(compose_files=compose_files, project=project)
         r.extend(["run", "--rm", "-T"])
         if uid:
             r.extend(["-u", f"{uid}:{uid}"])
@@ -38,8 +41,8 @@ class Docker:
         return r
 
     @classmethod
-    def exec(cls, cmd, service, compose_files=None, uid=None, env=None):
-        r = cls._common(compose_files=compose_files)
+    def exec(cls, cmd, service, compose_files=None, uid=None, env=None, project=None):
+        r = cls._common(compose_files=compose_files, project=project)
         r.extend(["exec", "-T"])
         if uid:
             r.extend(["-u", f"{uid}:{uid}"])
@@ -51,12 +54,18 @@ class Docker:
         return r
 
     @classmethod
-    def up(cls, services, compose_files=None):
-        r = cls._common(compose_files)
+    def up(cls, services, compose_files=None, project=None):
+        r = cls._common(compose_files, project=project)
         r.extend(["up", "--wait"])
         r.extend(services)
         return r
 
+    @classmethod
+    def down(cls, compose_files=None, project=None, timeout=1):
+        r = cls._common(compose_files, project=project)
+        r.extend(["down", "--remove-orphans", "-t", str(timeout)])
+        return r
+
 
 @dataclass
 class ComposeService:
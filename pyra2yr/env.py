@@ -0,0 +1,258 @@
+import asyncio
+import copy
+import logging as lg
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.game import Game, MultiGameInstanceConfig
+from pyra2yr.manager import Manager
+
+ObservationFn = Callable[[Manager], np.ndarray]
+RewardFn = Callable[[Manager], float]
+ActionFn = Callable[[Manager, np.ndarray], list[Any]]
+
+
+def env_configs(cfg: MultiGameInstanceConfig, n: int) -> list[MultiGameInstanceConfig]:
+    """Derive configurations for n games that can run at the same time.
+
+    Each copy gets its own instance directory and distinct host ports.
+
+    Parameters
+    ----------
+    cfg : MultiGameInstanceConfig
+        Base configuration
+    n : int
+        Number of games
+
+    Returns
+    -------
+    list[MultiGameInstanceConfig]
+        Configurations. Start each with a distinct Game project name.
+    """
+    res = []
+    stride = max(len(cfg.players), 1)
+    for i in range(n):
+        c = copy.deepcopy(cfg)
+        c.base_directory = Path(cfg.base_directory) / f"env_{i}"
+        c.tunnel_port += i
+        c.vnc_port += i
+        c.novnc_port += i
+        for p in c.players:
+            if p.ws_port > 0:
+                p.ws_port += i * stride
+        res.append(c)
+    return res
+
+
+def default_observation(M: Manager) -> np.ndarray:
+    """Frame, current player's credits, and counts of own and other objects."""
+    s = M.state.s
+    h = next((p for p in s.houses if p.current_player), None)
+    own = sum(1 for o in s.objects if h and o.pointer_house == h.self)
+    return np.array(
+        [s.current_frame, h.money if h else 0, own, len(s.objects) - own],
+        dtype=np.float32,
+    )
+
+
+def default_reward(M: Manager) -> float:
+    # pylint: disable=unused-argument
+    return 0.0
+
+
+class VecEnv:
+    """Drive several games in lockstep from a single event loop.
+
+    Games run in single step mode, so a game advances only when its state is
+    fetched. Each step() applies one action per game, advances every game by
+    ``frame_skip`` frames concurrently, and returns batched observations,
+    rewards and done flags. Managers aren't polled in the background, but
+    Manager.step() is still run for each processed state.
+
+    Example
+    -------
+    >>> cfgs = env_configs(cfg, 4)
+    >>> games = [Game(c, project=f"env{i}") for i, c in enumerate(cfgs)]
+    >>> env = VecEnv.from_games(games, act=my_actions)
+    >>> obs = await env.reset()
+    >>> obs, rewards, dones, infos = await env.step(policy(obs))
+    """
+
+    def __init__(
+        self,
+        managers: list[Manager],
+        observe: ObservationFn = default_observation,
+        reward: RewardFn = default_reward,
+        act: ActionFn = None,
+        frame_skip: int = 1,
+    ):
+        """
+        Parameters
+        ----------
+        managers : list[Manager]
+            One manager per game, not started
+        observe : ObservationFn, optional
+            Observation of a game as an array of fixed shape, by default
+            default_observation
+        reward : RewardFn, optional
+            Reward for the latest step, by default default_reward
+        act : ActionFn, optional
+            Convert the action for a game into commands (e.g.
+            commands_yr.ClickEvent messages). By default, actions are ignored.
+        frame_skip : int, optional
+            Frames to advance per step, by default 1
+        """
+        self.managers = managers
+        self.observe = observe
+        self.reward = reward
+        self.act = act
+        self.frame_skip = max(frame_skip, 1)
+        self.dones = np.zeros(len(managers), dtype=bool)
+        self._started = False
+
+    @classmethod
+    def from_games(
+        cls,
+        games: list[Game],
+        player_index: int = 0,
+        address: str = "0.0.0.0",
+        manager_cls: type[Manager] = Manager,
+        **kwargs,
+    ):
+        """Create managers for a player of each game.
+
+        Parameters
+        ----------
+        games : list[Game]
+            Games (started or not)
+        player_index : int, optional
+            Index of the controlled player, by default 0
+        address : str, optional
+            WebSocket API address, by default "0.0.0.0"
+        manager_cls : type[Manager], optional
+            Manager class, by default Manager
+        **kwargs
+            Passed to VecEnv()
+        """
+        managers = [
+            manager_cls(address=address, port=g.cfg.players[player_index].ws_port)
+            for g in games
+        ]
+        return cls(managers, **kwargs)
+
+    @property
+    def num_envs(self) -> int:
+        return len(self.managers)
+
+    async def _advance(self, M: Manager) -> ra2yr.GameState:
+        await M.process_raw(await M.fetch_state_raw())
+        return M.state.s
+
+    async def _reset_one(self, M: Manager, timeout: float):
+        async def wait_ingame():
+            while True:
+                s = await self._advance(M)
+                if s.stage == ra2yr.STAGE_INGAME and s.current_frame > 1:
+                    return
+                await asyncio.sleep(0.1)
+
+        await asyncio.wait_for(wait_ingame(), timeout)
+        await M.M.set_single_step(True)
+        await self._advance(M)
+
+    async def reset(self, timeout: float = 60.0) -> np.ndarray:
+        """Connect to the games, wait for them to begin, and enable single
+        step mode.
+
+        Returns
+        -------
+        np.ndarray
+            Observations, with games along the first axis.
+        """
+        if not self._started:
+            for M in self.managers:
+                M.start(run_mainloop=False)
+            self._started = True
+        await asyncio.gather(*(self._reset_one(M, timeout) for M in self.managers))
+        self.dones[:] = False
+        return np.stack([self.observe(M) for M in self.managers])
+
+    async def _step_one(self, M: Manager, action) -> tuple[bool, dict]:
+        info = {"errors": []}
+        cmds = self.act(M, action) if self.act else None
+        tasks = [asyncio.create_task(M.run(c)) for c in cmds or []]
+        # Make sure commands are in before the frame advances
+        await asyncio.sleep(0)
+        await M.client.wait_submitted()
+        done = False
+        for _ in range(self.frame_skip):
+            try:
+                s = await self._advance(M)
+            except asyncio.exceptions.TimeoutError:
+                lg.error("failed to fetch state on port %d", M.port)
+                info["errors"].append("timeout")
+                done = True
+                break
+            if s.stage != ra2yr.STAGE_INGAME:
+                done = True
+                break
+        for r in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(r, Exception):
+                info["errors"].append(r)
+        info["frame"] = M.state.s.current_frame
+        return done, info
+
+    async def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        """Apply actions and advance all running games.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            Actions, with games along the first axis
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray, list[dict]]
+            Observations, rewards, done flags and per game info dicts. Games
+            that are done are no longer advanced, and get zero reward.
+        """
+        running = [i for i in range(self.num_envs) if not self.dones[i]]
+        res = await asyncio.gather(
+            *(self._step_one(self.managers[i], actions[i]) for i in running)
+        )
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        infos = [{} for _ in self.managers]
+        for i, (done, info) in zip(running, res):
+            rewards[i] = self.reward(self.managers[i])
+            self.dones[i] = done
+            infos[i] = info
+        obs = np.stack([self.observe(M) for M in self.managers])
+        return obs, rewards, self.dones.copy(), infos
+
+    async def _disable_single_step(self, M: Manager):
+        t = asyncio.create_task(M.M.set_single_step(False))
+        await asyncio.sleep(0)
+        await M.client.wait_submitted()
+        await self._advance(M)
+        await t
+
+    async def close(self):
+        """Disable single step mode and disconnect."""
+        if not self._started:
+            return
+        for i, M in enumerate(self.managers):
+            if self.dones[i]:
+                continue
+            try:
+                await asyncio.wait_for(
+                    self._disable_single_step(M), M.fetch_state_timeout
+                )
+            except asyncio.exceptions.TimeoutError:
+                lg.error("failed to disable single step on port %d", M.port)
+        await asyncio.gather(*(M.stop() for M in self.managers))
+        self._started = False
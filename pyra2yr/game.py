@@ -226,6 +226,8 @@ class MultiGameInstanceConfig:
     tunnel_port: int = 50000
     use_syringe: bool = False
     x11_socket: Path = None
+    vnc_port: int = 5901
+    novnc_port: int = 6081
 
     def __post_init__(self):
         for k in ["color", "location", "name"]:
@@ -344,8 +346,17 @@ class MultiGameInstanceConfig:
 
 
 class GameInstance:
-    def __init__(self, cfg: MultiGameInstanceConfig, player_index: int, game_uid: int):
+    def __init__(
+        self,
+        cfg: MultiGameInstanceConfig,
+        player_index: int,
+        game_uid: int,
+        compose_file: str = "docker-compose.instance.yml",
+        project: str = None,
+    ):
         self.mcfg = cfg
+        self.compose_file = compose_file
+        self.project = project
         self.cfg = self.mcfg.players[player_index]
         self.player_index = player_index
         self.game_uid = game_uid
@@ -355,7 +366,7 @@ class GameInstance:
         self.map_path = self.instance_dir / "spawnmap.ini"
         self.spawn_path = self.instance_dir / "spawn.ini"
         self.wineprefix_dir = self.instance_dir / ".wine"
-        self._container_name = f"game-{self.player_index}"
+        self._container_name = f"{project or 'game'}-{self.player_index}"
         self._proc: subprocess.Popen = None
         if not self.cfg.backend:
             self.cfg.backend = self.mcfg.backend
@@ -414,8 +425,9 @@ class GameInstance:
                 ("WINEARCH", "win32"),
             ],
             uid=self.game_uid,
-            compose_files=["docker-compose.instance.yml"],
+            compose_files=[self.compose_file],
             volumes=[(self.mcfg.game_data_directory.absolute(), "/home/user/RA2")],
+            project=self.project,
         )
         return popen(cmd_full)
 
@@ -439,38 +451,66 @@ class GameInstance:
 
 
 class Game:
-    def __init__(self, cfg: MultiGameInstanceConfig):
+    def __init__(self, cfg: MultiGameInstanceConfig, project: str = None):
+        """
+        Parameters
+        ----------
+        cfg : MultiGameInstanceConfig
+            Game configuration
+        project : str, optional
+            Docker compose project name. Needed to run several games at once,
+            each with distinct ports (see env_configs). By default None, i.e.
+            use the default project.
+        """
         self.cfg = cfg
+        self.project = project
+        # This needs to be generated dynamically to properly set port numbers.
+        # Per project files are removed in stop(). They stay in the working
+        # directory, since volumes in them are relative to it.
+        self.compose_file = (
+            f"docker-compose.{project}.yml"
+            if project
+            else "docker-compose.instance.yml"
+        )
         self.uid = get_game_uid()
         self.human_players = [p for p in cfg.players if p.ai_difficulty < 0]
         self.games = [
-            GameInstance(cfg, c.index, game_uid=self.uid) for c in self.human_players
+            GameInstance(
+                cfg,
+                c.index,
+                game_uid=self.uid,
+                compose_file=self.compose_file,
+                project=project,
+            )
+            for c in self.human_players
         ]
         self._proc: subprocess.Popen = None
 
     def start(self):
         """Start the main game."""
-        # This needs to be generated dynamically to properly set port numbers
-        c = "docker-compose.instance.yml"
+        c = self.compose_file
         ws_ports = [p.ws_port for p in self.human_players]
         D = get_compose_dict(
             ws_ports,
             container_image=self.cfg.container_image,
+            vnc_port=self.cfg.vnc_port,
+            novnc_port=self.cfg.novnc_port,
+            tunnel_port=self.cfg.tunnel_port,
             x11_socket=self.cfg.x11_socket,
         )
         write_file(c, dump(D, Dumper=Dumper))
         base_services = [k for k in D["services"] if k != "game"]
         # TODO(shmocz): monitor in separate thread for errors
         self._proc = popen(
-            Docker.up(
-                base_services,
-                compose_files=[c],
-            )
+            Docker.up(base_services, compose_files=[c], project=self.project)
         )
         # hack to wait until tunnel service has started
         try_fn(
             lambda: prun(
-                ["docker", "compose", "-f", c, "exec", "tunnel", "ls", "-l"], check=True
+                Docker.exec(
+                    ["ls", "-l"], "tunnel", compose_files=[c], project=self.project
+                ),
+                check=True,
             )
         )
         for g in self.games:
@@ -478,12 +518,14 @@ class Game:
 
     def stop(self):
         """Stop all game instances."""
-        prun(["docker", "compose", "down", "--remove-orphans", "-t", "1"])
+        prun(Docker.down(compose_files=[self.compose_file], project=self.project))
         self._proc.kill()
         self._proc.wait()
         for g in self.games:
             g.stop()
         self.wait()
+        if self.project:
+            Path(self.compose_file).unlink(missing_ok=True)
 
     def wait(self):
         """Wait for game to exit."""
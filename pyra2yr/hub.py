@@ -0,0 +1,210 @@
+import asyncio
+import logging as lg
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator
+
+from google.protobuf.internal.encoder import _VarintBytes
+from ra2yrproto import ra2yr
+
+from pyra2yr.subscription import Subscription, SubscriptionPolicy
+
+
+class _SocketClient:
+    """Connection to a hub client with a bounded queue of outgoing states."""
+
+    def __init__(self, writer: asyncio.StreamWriter, maxsize: int):
+        self.writer = writer
+        self.maxsize = maxsize
+        self.pending: deque[tuple[bytes, bytes]] = deque()
+        self.has_data = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, prefix: bytes, raw: bytes):
+        if len(self.pending) >= self.maxsize:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append((prefix, raw))
+        self.has_data.set()
+
+    async def run(self):
+        while True:
+            await self.has_data.wait()
+            self.has_data.clear()
+            while self.pending:
+                self.writer.writelines(self.pending.popleft())
+                await self.writer.drain()
+                self.sent += 1
+
+
+class StateHub:
+    """Fan out states fetched by a single Manager to local consumers.
+
+    Asyncio consumers in the same process subscribe with :meth:`states` and
+    receive the decoded state objects. Other processes connect to the Unix
+    socket at ``path`` and receive serialized GameState messages, each
+    prefixed with its varint encoded length (the same framing as in replay
+    files), see :func:`read_hub_states`. The serialized bytes from the game
+    are forwarded as such, without re-encoding.
+
+    Publishing never blocks: each consumer has a bounded queue, and the oldest
+    states are dropped for consumers that can't keep up.
+
+    Example
+    -------
+    >>> async with StateHub("/tmp/pyra2yr.sock") as hub:
+    ...     M = Manager(port=14521, hub=hub)
+    ...     M.start()
+    """
+
+    def __init__(self, path: str | Path = None, client_queue_size: int = 8):
+        """
+        Parameters
+        ----------
+        path : str | Path, optional
+            Unix socket path. By default None, i.e. serve only subscribers in
+            this process.
+        client_queue_size : int, optional
+            Maximum number of unsent states per socket client, by default 8
+        """
+        self.path = path
+        self.client_queue_size = max(client_queue_size, 1)
+        self.subscriptions: list[Subscription] = []
+        self.published = 0
+        self._clients: dict[_SocketClient, asyncio.Task] = {}
+        self._server: asyncio.AbstractServer = None
+
+    @property
+    def num_clients(self) -> int:
+        return len(self._clients)
+
+    @property
+    def dropped(self) -> int:
+        """States dropped for currently connected socket clients."""
+        return sum(c.dropped for c in self._clients)
+
+    async def start(self):
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, path=self.path
+            )
+
+    async def stop(self):
+        for sub in list(self.subscriptions):
+            sub.close()
+        if self._server:
+            self._server.close()
+        for c, t in list(self._clients.items()):
+            t.cancel()
+            c.writer.close()
+        if self._server:
+            await self._server.wait_closed()
+            self._server = None
+            Path(self.path).unlink(missing_ok=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        c = _SocketClient(writer, self.client_queue_size)
+        t = asyncio.create_task(c.run())
+        # Clients don't send anything, so this completes once they disconnect
+        eof = asyncio.create_task(reader.read())
+        self._clients[c] = t
+        try:
+            await asyncio.wait([t, eof], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            del self._clients[c]
+            t.cancel()
+            eof.cancel()
+            if t.done() and not t.cancelled() and t.exception():
+                lg.debug("hub client disconnected: %s", t.exception())
+            writer.close()
+
+    def states(
+        self,
+        policy: SubscriptionPolicy = SubscriptionPolicy.LATEST,
+        every: int = 1,
+        maxsize: int = 64,
+    ) -> Subscription:
+        """Subscribe to published states. See Manager.states."""
+        sub = Subscription(policy, every=every, maxsize=maxsize)
+        sub.on_close = self.subscriptions.remove
+        self.subscriptions.append(sub)
+        return sub
+
+    def publish(self, s: ra2yr.GameState, raw: bytes = None):
+        """Publish a state without blocking.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state. Must not be modified afterwards.
+        raw : bytes, optional
+            Serialized form of s. If not given and there are socket clients,
+            s is serialized.
+        """
+        self.published += 1
+        for sub in self.subscriptions:
+            sub.publish(s)
+        if not self._clients:
+            return
+        if raw is None:
+            raw = s.SerializeToString()
+        prefix = _VarintBytes(len(raw))
+        for c in self._clients:
+            c.push(prefix, raw)
+
+
+async def _read_varint(reader: asyncio.StreamReader) -> int:
+    res = 0
+    for shift in range(0, 64, 7):
+        b = await reader.read(1)
+        if not b:
+            if shift > 0:
+                raise asyncio.IncompleteReadError(b"", None)
+            return None
+        res |= (b[0] & 0x7F) << shift
+        if not b[0] & 0x80:
+            return res
+    raise RuntimeError("invalid varint")
+
+
+async def read_hub_states(
+    path: str | Path, raw: bool = False
+) -> AsyncIterator[ra2yr.GameState | bytes]:
+    """Read states from a StateHub socket until the hub closes the connection.
+
+    Parameters
+    ----------
+    path : str | Path
+        Hub socket path
+    raw : bool, optional
+        Yield serialized states instead of parsed ones, by default False
+
+    Yields
+    ------
+    Iterator[ra2yr.GameState | bytes]
+        States
+    """
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        while True:
+            try:
+                size = await _read_varint(reader)
+                if size is None:
+                    break
+                buf = await reader.readexactly(size)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            yield buf if raw else ra2yr.GameState.FromString(buf)
+    finally:
+        writer.close()
+        await writer.wait_closed()
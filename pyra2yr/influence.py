@@ -0,0 +1,181 @@
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.columnar import object_columns
+from pyra2yr.state_objects import MapData, ObservationEncoder, lookup, object_changes
+from pyra2yr.wire_columns import ObjectDecoder
+
+
+def disk_kernel(radius: int) -> np.ndarray:
+    """Weights decreasing linearly from 1 at the center to 0 just outside
+    radius (in cells)."""
+    d = np.arange(-radius, radius + 1)
+    dist = np.sqrt(d[:, None] ** 2 + d[None, :] ** 2)
+    return np.clip(1.0 - dist / (radius + 1), 0.0, None)
+
+
+class InfluenceMap:
+    """Per-house strength maps on the MapData grid.
+
+    Each object adds its strength (by default, its health), weighted by
+    :func:`disk_kernel` around its cell, to the map of its house. The range of
+    an object depends on its type class, and is supplied by the caller since
+    weapon ranges aren't part of the game state. Maps have shape
+    ``(num_houses, width, height)`` and are indexed like ``MapData.ind2sub``.
+
+    On update, only added, removed and changed objects are stamped. If
+    more than ``recompute_fraction`` of objects changed, maps are recomputed
+    with FFT convolution instead.
+    """
+
+    COLUMNS = {**ObservationEncoder.COLUMNS, "health": np.int32}
+
+    def __init__(
+        self,
+        map_data: MapData,
+        houses: list[int],
+        ranges: dict[int, float] = None,
+        default_range: float = 5,
+        cell_size: int = 256,
+        recompute_fraction: float = 0.5,
+    ):
+        """
+        Parameters
+        ----------
+        map_data : MapData
+            The map
+        houses : list[int]
+            Pointers of houses, in map order
+        ranges : dict[int, float], optional
+            Range in cells for each type class pointer, by default empty
+        default_range : float, optional
+            Range for other type classes, by default 5
+        cell_size : int, optional
+            Cell size in coordinate units, by default 256
+        recompute_fraction : float, optional
+            Fraction of changed objects above which maps are recomputed, by
+            default 0.5
+        """
+        self.shape = (map_data.m.width, map_data.m.height)
+        self.cell_size = cell_size
+        self.recompute_fraction = recompute_fraction
+        self.houses = np.asarray(houses, dtype=np.int64)
+        self._h_order = np.argsort(self.houses)
+        ranges = ranges or {}
+        self._types = np.fromiter(ranges.keys(), dtype=np.int64, count=len(ranges))
+        self._t_order = np.argsort(self._types)
+        self._radii = np.ceil(
+            np.fromiter(ranges.values(), dtype=np.float64, count=len(ranges))
+        ).astype(np.int64)
+        self.default_radius = int(np.ceil(default_range))
+        self._kernels: dict[int, np.ndarray] = {}
+        self.maps = np.zeros((len(self.houses),) + self.shape, dtype=np.float64)
+        self.recomputes = 0
+        self._decoder = ObjectDecoder(self.COLUMNS)
+        self.reset()
+
+    def reset(self):
+        self.maps[:] = 0
+        self._ptr = np.empty(0, dtype=np.int64)
+        # house index, y, x, radius, strength
+        self._rows = np.empty((0, 5), dtype=np.float64)
+
+    def kernel(self, radius: int) -> np.ndarray:
+        if radius not in self._kernels:
+            self._kernels[radius] = disk_kernel(radius)
+        return self._kernels[radius]
+
+    def strength(self, s: ra2yr.GameState, health: np.ndarray) -> np.ndarray:
+        """Strength of objects. Override to weigh e.g. by type class."""
+        # pylint: disable=unused-argument
+        return health.astype(np.float64)
+
+    def _rows_of(
+        self, s: ra2yr.GameState, raw: bytes = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        cols = object_columns(s, raw, self._decoder)
+        n = len(s.objects)
+        rows = np.empty((n, 5), dtype=np.float64)
+        rows[:, 0] = lookup(self.houses, self._h_order, cols["pointer_house"])
+        rows[:, 1] = cols["coordinates.y"].astype(np.int64) // self.cell_size
+        rows[:, 2] = cols["coordinates.x"].astype(np.int64) // self.cell_size
+        t = lookup(self._types, self._t_order, cols["pointer_technotypeclass"])
+        rows[:, 3] = self.default_radius
+        rows[t >= 0, 3] = self._radii[t[t >= 0]]
+        rows[:, 4] = self.strength(s, cols["health"])
+        # Skip objects of other houses, outside the map, or without strength
+        valid = (
+            (rows[:, 0] >= 0)
+            & (rows[:, 1] >= 0)
+            & (rows[:, 1] < self.shape[0])
+            & (rows[:, 2] >= 0)
+            & (rows[:, 2] < self.shape[1])
+            & (rows[:, 4] != 0)
+        )
+        ptr = cols["pointer_self"][valid].astype(np.int64)
+        rows = rows[valid]
+        o = np.argsort(ptr, kind="stable")
+        return ptr[o], rows[o]
+
+    def _stamp(self, rows: np.ndarray, sign: float):
+        for r in np.unique(rows[:, 3]).astype(np.int64):
+            sel = rows[rows[:, 3] == r]
+            K = self.kernel(r)
+            dy, dx = np.nonzero(K)
+            k = K[dy, dx]
+            h = np.repeat(sel[:, 0].astype(np.int64), k.size)
+            y = (sel[:, 1, None].astype(np.int64) + (dy - r)).ravel()
+            x = (sel[:, 2, None].astype(np.int64) + (dx - r)).ravel()
+            w = (sign * sel[:, 4, None] * k).ravel()
+            m = (y >= 0) & (y < self.shape[0]) & (x >= 0) & (x < self.shape[1])
+            np.add.at(self.maps, (h[m], y[m], x[m]), w[m])
+
+    def _recompute(self, rows: np.ndarray):
+        self.maps[:] = 0
+        W, H = self.shape
+        for r in np.unique(rows[:, 3]).astype(np.int64):
+            sel = rows[rows[:, 3] == r]
+            size = (W + 2 * r, H + 2 * r)
+            K = np.fft.rfft2(self.kernel(r), s=size)
+            for h in np.unique(sel[:, 0]).astype(np.int64):
+                P = np.zeros(self.shape)
+                q = sel[sel[:, 0] == h]
+                np.add.at(
+                    P, (q[:, 1].astype(np.int64), q[:, 2].astype(np.int64)), q[:, 4]
+                )
+                C = np.fft.irfft2(np.fft.rfft2(P, s=size) * K, s=size)
+                self.maps[h] += C[r : r + W, r : r + H]
+        self.recomputes += 1
+
+    def update(self, s: ra2yr.GameState, raw: bytes = None):
+        """Update maps to match the state.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state
+        raw : bytes, optional
+            Serialized form of s, see object_columns
+        """
+        ptr, rows = self._rows_of(s, raw)
+        removed, added = object_changes(self._ptr, self._rows, ptr, rows)
+        if added.sum() > self.recompute_fraction * max(ptr.size, 1):
+            self._recompute(rows)
+        else:
+            self._stamp(self._rows[removed], -1.0)
+            self._stamp(rows[added], 1.0)
+        self._ptr, self._rows = ptr, rows
+
+    def _index(self, house: int) -> int:
+        return int(lookup(self.houses, self._h_order, np.array([house]))[0])
+
+    def threat(self, house: int) -> np.ndarray:
+        """Summed strength of houses other than house."""
+        i = self._index(house)
+        return self.maps.sum(axis=0) - (self.maps[i] if i >= 0 else 0)
+
+    def influence(self, house: int, allies: list[int] = None) -> np.ndarray:
+        """Strength of house and its allies minus that of other houses."""
+        idx = [i for i in (self._index(h) for h in [house] + (allies or [])) if i >= 0]
+        own = self.maps[idx].sum(axis=0)
+        return 2 * own - self.maps.sum(axis=0)
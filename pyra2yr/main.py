@@ -1,9 +1,27 @@
 import argparse
 import gzip
+import json
+import sys
 
-from google.protobuf.json_format import MessageToJson
+from google.protobuf.json_format import MessageToDict
+from ra2yrproto import ra2yr
 
-from pyra2yr.util import read_protobuf_messages
+from pyra2yr.columnar import ColumnarTables
+from pyra2yr.delta import (
+    benchmark_formats,
+    convert_to_delta,
+    is_delta_replay,
+    read_delta_messages,
+)
+from pyra2yr.replay import (
+    check_field_path,
+    diff_states,
+    filter_frames,
+    first_divergent_frame,
+    read_state_at,
+    select_field,
+)
+from pyra2yr.util import read_raw_messages
 
 
 def parse_args():
@@ -12,22 +30,179 @@ def parse_args():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     a.add_argument("-d", "--dump-replay", action="store_true")
-    a.add_argument("-i", "--input-path", help="input path if applicable", type=str)
-    return a.parse_args()
+    a.add_argument(
+        "-e",
+        "--export-columnar",
+        action="store_true",
+        help="export replay to columnar .npz archive or .npy directory",
+    )
+    a.add_argument(
+        "--convert-delta",
+        action="store_true",
+        help="convert replay to delta format and compare size and decode time",
+    )
+    a.add_argument(
+        "--keyframe-interval",
+        help="number of states between keyframes in delta format",
+        type=int,
+        default=30,
+    )
+    a.add_argument(
+        "-c",
+        "--compare-replays",
+        action="store_true",
+        help="find first frame where CRCs of the input replays differ and diff them",
+    )
+    a.add_argument(
+        "-i",
+        "--input-path",
+        help="input path(s) if applicable",
+        type=str,
+        nargs="+",
+    )
+    a.add_argument("-o", "--output-path", help="output path if applicable", type=str)
+    a.add_argument("--from-frame", help="first frame to dump", type=int, default=0)
+    a.add_argument("--to-frame", help="last frame to dump", type=int)
+    a.add_argument(
+        "--every", help="minimum frame interval between dumps", type=int, default=1
+    )
+    a.add_argument(
+        "--fields",
+        help="field paths to dump, e.g. objects.health houses.money",
+        nargs="+",
+        type=str,
+    )
+    args = a.parse_args()
+    if args.export_columnar and not args.output_path:
+        a.error("--export-columnar requires -o/--output-path")
+    if args.convert_delta and not args.output_path:
+        a.error("--convert-delta requires -o/--output-path")
+    for p in args.fields or []:
+        try:
+            check_field_path(p)
+        except ValueError as e:
+            a.error(f"--fields: {e}")
+    return args
 
 
-def dump_replay(path: str):
+def _open_output(output_path: str = None):
+    buffering = 1 << 20
+    if output_path:
+        return open(output_path, "w", encoding="utf8", buffering=buffering)
+    return open(
+        sys.stdout.fileno(), "w", encoding="utf8", buffering=buffering, closefd=False
+    )
+
+
+def dump_replay(
+    path: str,
+    output_path: str = None,
+    from_frame: int = 0,
+    to_frame: int = None,
+    every: int = 1,
+    fields: list[str] = None,
+):
+    """Dump replay as newline delimited JSON.
+
+    Parameters
+    ----------
+    path : str
+        Replay path
+    output_path : str, optional
+        Output path, by default stdout
+    from_frame : int, optional
+        First frame to dump, by default 0
+    to_frame : int, optional
+        Last frame to dump, by default None (no limit)
+    every : int, optional
+        Minimum frame interval between dumped states, by default 1
+    fields : list[str], optional
+        Field paths to dump, e.g. "objects.health". By default dump everything.
+    """
+    for p in fields or []:
+        check_field_path(p)
+    paths = [p.split(".") for p in fields or []]
+    with _open_output(output_path) as out, gzip.open(path, "rb") as f:
+        if is_delta_replay(f):
+            # Deltas need to be decoded in sequence anyway
+            states = filter_frames(
+                read_delta_messages(f),
+                from_frame,
+                to_frame,
+                every,
+                frame_of=lambda x: x.current_frame,
+            )
+        else:
+            states = (
+                ra2yr.GameState.FromString(m)
+                for m in filter_frames(
+                    read_raw_messages(f), from_frame, to_frame, every
+                )
+            )
+        for s in states:
+            if paths:
+                d = {"current_frame": s.current_frame}
+                d.update({".".join(p): select_field(s, p) for p in paths})
+            else:
+                d = MessageToDict(s, preserving_proto_field_name=True)
+            out.write(json.dumps(d, separators=(",", ":")))
+            out.write("\n")
+
+
+def export_columnar(path: str, output_path: str):
+    T = ColumnarTables()
     with gzip.open(path, "rb") as f:
-        m = read_protobuf_messages(f)
-        for _, m0 in enumerate(m):
-            print(MessageToJson(m0))
+        if is_delta_replay(f):
+            for s in read_delta_messages(f):
+                T.append(s)
+        else:
+            for m in read_raw_messages(f):
+                T.append(ra2yr.GameState.FromString(m), m)
+    T.save(output_path)
+
+
+def convert_delta(path: str, output_path: str, keyframe_interval: int):
+    convert_to_delta(path, output_path, keyframe_interval)
+    for k, v in benchmark_formats(path, output_path).items():
+        print(
+            f"{k}: size={v['size']} states={v['states']} "
+            f"decode_time={v['decode_time']:.3f}s "
+            f"states_per_second={v['states'] / max(v['decode_time'], 1e-9):.1f}"
+        )
+
+
+def compare_replays(paths: list[str]):
+    frame = first_divergent_frame(paths)
+    if frame is None:
+        print(json.dumps({"divergent_frame": None}))
+        return
+    states = [read_state_at(p, frame) for p in paths]
+    res = {
+        "divergent_frame": frame,
+        "crcs": {p: s.crc for p, s in zip(paths, states)},
+        "diffs": {p: diff_states(states[0], s) for p, s in zip(paths[1:], states[1:])},
+    }
+    print(json.dumps(res, indent=2))
 
 
 def main():
     # pylint: disable=unused-variable
     args = parse_args()
     if args.dump_replay:
-        dump_replay(args.input_path)
+        dump_replay(
+            args.input_path[0],
+            output_path=args.output_path,
+            from_frame=args.from_frame,
+            to_frame=args.to_frame,
+            every=args.every,
+            fields=args.fields,
+        )
+    elif args.export_columnar:
+        export_columnar(args.input_path[0], args.output_path)
+    elif args.convert_delta:
+        convert_delta(args.input_path[0], args.output_path, args.keyframe_interval)
+    elif args.compare_replays:
+        compare_replays(args.input_path)
 
 
 if __name__ == "__main__":
@@ -1,15 +1,38 @@
 import asyncio
 import logging as lg
+import time
 import traceback
-from datetime import datetime as dt
 from enum import Enum
-from typing import Any, Iterable
+from typing import Any, AsyncIterator, Awaitable, Iterable
 
+from google.protobuf import any_pb2
 from ra2yrproto import commands_game, commands_yr, core, ra2yr
 
+from pyra2yr.hub import StateHub
+from pyra2yr.memory import MemoryMonitor
+from pyra2yr.metrics import Registry
 from pyra2yr.network import DualClient, logged_task
+from pyra2yr.offload import StepOffload
+from pyra2yr.polling import FixedPoller, Poller
+from pyra2yr.profiling import SlowFrameProfiler
+from pyra2yr.replay import ReplayRecorder
+from pyra2yr.scheduler import FrameScheduler
+from pyra2yr.shm import SharedStateWriter
 from pyra2yr.state_manager import StateManager
+from pyra2yr.subscription import Subscription, SubscriptionPolicy
+from pyra2yr.tracing import Tracer
 from pyra2yr.util import Clock
+from pyra2yr.wire import find_path, state_header, varint_field
+
+# Path to the serialized GameState in a CommandResult of GetGameState
+_STATE_PATH = [
+    core.CommandResult.DESCRIPTOR.fields_by_name["result"].number,
+    # Members of generated modules are created at runtime
+    # pylint: disable-next=no-member
+    any_pb2.Any.DESCRIPTOR.fields_by_name["value"].number,
+    commands_yr.GetGameState.DESCRIPTOR.fields_by_name["state"].number,
+]
+_RESULT_CODE = core.CommandResult.DESCRIPTOR.fields_by_name["result_code"].number
 
 
 class PlaceStrategy(Enum):
@@ -18,15 +41,38 @@ class PlaceStrategy(Enum):
     ABSOLUTE = 2
 
 
+class PipelinePolicy(Enum):
+    """How states fetched while the previous one is being processed are
+    handled."""
+
+    # Process only the most recent state, discarding older unprocessed ones.
+    LATEST = 0
+    # Process every fetched state in order. Fetching pauses when the queue of
+    # unprocessed states is full.
+    EVERY = 1
+
+
 class Manager:
     """Manages connections and state updates for an active game process."""
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-locals
         self,
         address: str = "0.0.0.0",
         port: int = 14521,
         poll_frequency=20,
         fetch_state_timeout=5.0,
+        recorder: ReplayRecorder = None,
+        pipeline: PipelinePolicy = None,
+        pipeline_depth: int = 4,
+        poller: Poller = None,
+        lockstep: bool = False,
+        hub: StateHub = None,
+        shm: SharedStateWriter = None,
+        offload: StepOffload = None,
+        metrics: Registry = None,
+        tracer: Tracer = None,
+        profiler: SlowFrameProfiler = None,
+        memory: MemoryMonitor = None,
     ):
         """
         Parameters
@@ -39,31 +85,201 @@ class Manager:
             Frequency for polling the game state in Hz, by default 20
         fetch_state_timeout : float, optional
             Timeout (seconds) for state fetching (default: 5.0)
+        recorder : ReplayRecorder, optional
+            If set, record every accepted state, by default None
+        pipeline : PipelinePolicy, optional
+            If set, fetch the next state while the current one is being
+            processed. By default None, i.e. fetch and process sequentially.
+            Not meaningful in single step mode, where fetching a state
+            advances the game.
+        pipeline_depth : int, optional
+            Maximum number of unprocessed states with PipelinePolicy.EVERY,
+            by default 4
+        poller : Poller, optional
+            Decides when to fetch states, e.g. AdaptivePoller. By default,
+            poll at poll_frequency.
+        lockstep : bool, optional
+            Fetch the next state as soon as step() has returned and commands
+            it issued have been acknowledged, ignoring poller. Intended for
+            single step mode (see ManagerUtil.set_single_step), where the game
+            then runs as fast as it can simulate. By default False.
+        hub : StateHub, optional
+            If set, publish processed states to the hub, by default None
+        shm : SharedStateWriter, optional
+            If set, write processed states to the shared memory ring, so that
+            worker processes can read them with SharedStateReader. By default
+            None
+        offload : StepOffload, optional
+            If set, run its decision function in a process pool for every
+            processed state, in addition to step(). By default None
+        metrics : Registry, optional
+            Registry for latency and throughput metrics of this manager and
+            its client, by default a new one
+        tracer : Tracer, optional
+            Record spans of fetching and processing states, and of commands,
+            e.g. with ChromeTracer. Use one tracer per manager. By default,
+            nothing is recorded.
+        profiler : SlowFrameProfiler, optional
+            If set, profile process_state() and step() of frames following
+            one that exceeded the profiler's latency budget. By default None
+        memory : MemoryMonitor, optional
+            If set, export sizes of internal containers to metrics, and
+            report allocation sites with the largest growth periodically. By
+            default None
         """
         self.address = address
         self.port = port
         self.poll_frequency = min(max(1, poll_frequency), 60)
         self.fetch_state_timeout = fetch_state_timeout
         self.state = StateManager()
-        self.client: DualClient = DualClient(self.address, self.port)
+        self.metrics = metrics or Registry()
+        self.tracer = tracer or Tracer()
+        self.client: DualClient = DualClient(
+            self.address, self.port, metrics=self.metrics, tracer=self.tracer
+        )
         self.t = Clock()
         self.iters = 0
         self.show_stats_every = 30
         self.M = ManagerUtil(self)
+        self.recorder = recorder
+        self.pipeline = pipeline
+        self.pipeline_depth = pipeline_depth
+        self.poller = poller or FixedPoller(self.poll_frequency)
+        self.lockstep = lockstep
+        self.scheduler = FrameScheduler()
+        self.subscriptions: list[Subscription] = []
+        self.hub = hub
+        self.shm = shm
+        self.offload = offload
+        self.profiler = profiler
+        self.memory = memory
+        if lockstep and pipeline is not None:
+            raise ValueError("lockstep and pipeline are mutually exclusive")
+        # Game frames that were never seen, and fetched states that were
+        # discarded without processing.
+        self.dropped_frames = 0
+        self.discarded_states = 0
         self._stop = asyncio.Event()
         self._main_task = None
+        R = self.metrics
+        self._m_decode = R.histogram(
+            "pyra2yr_state_decode_seconds", "Time to decode fetched state"
+        )
+        self._m_step = R.histogram("pyra2yr_step_seconds", "Duration of step()")
+        self._m_process = R.histogram(
+            "pyra2yr_process_state_seconds", "Duration of process_state()"
+        )
+        self._m_dropped = R.counter(
+            "pyra2yr_dropped_frames_total", "Game frames that were never seen"
+        )
+        self._m_duplicate = R.counter(
+            "pyra2yr_duplicate_states_total", "Fetched states of an already seen frame"
+        )
+        self._m_discarded = R.counter(
+            "pyra2yr_discarded_states_total", "Fetched states discarded unprocessed"
+        )
+        self._m_processed = R.counter(
+            "pyra2yr_processed_states_total", "Processed states"
+        )
+        self._m_frame = R.gauge("pyra2yr_current_frame", "Frame of current state")
+        self._m_queue = R.gauge(
+            "pyra2yr_pipeline_queue_depth", "Fetched states waiting for processing"
+        )
+        self._m_subscriptions = R.gauge(
+            "pyra2yr_subscriptions", "Number of state subscriptions"
+        )
+
+    def start(self, run_mainloop: bool = True):
+        """Connect to the game and start processing states.
 
-    def start(self):
-        self._main_task = logged_task(self.mainloop())
+        Parameters
+        ----------
+        run_mainloop : bool, optional
+            Fetch states in the background. If False, the caller drives the
+            manager with fetch_state_raw() and process_raw(), e.g. VecEnv. By
+            default True
+        """
+        self.start_subsystems()
+        if run_mainloop:
+            self._main_task = logged_task(self.mainloop())
         self.client.connect()
 
+    def start_subsystems(self):
+        """Start recorder, offload and memory monitor, if set. Called by
+        start(), or directly when states are fed without a game, e.g. by
+        ReplayDriver."""
+        if self.recorder:
+            self.recorder.start()
+        if self.offload:
+            self.offload.start(self)
+        if self.memory:
+            self.memory.start(self.metrics)
+
+    async def stop_subsystems(self):
+        """Stop what start_subsystems() started, and close the profiler."""
+        if self.offload:
+            await self.offload.stop()
+        if self.profiler:
+            self.profiler.close()
+        if self.memory:
+            self.memory.stop()
+        if self.recorder:
+            await asyncio.to_thread(self.recorder.stop)
+
     async def stop(self):
         self._stop.set()
-        await self._main_task
+        if self._main_task:
+            await self._main_task
+        self.scheduler.cancel_all()
+        await self.stop_subsystems()
+        for sub in list(self.subscriptions):
+            sub.close()
         await self.client.stop()
 
     async def step(self, s: ra2yr.GameState):
-        pass
+        """Called for every processed state.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The current state. With process_raw() (and thus in mainloop),
+            this is the reused ``self.state.s``, which is overwritten by the
+            next state. Copy it to keep it past the next state, or use
+            states() to get states that aren't modified.
+        """
+
+    def states(
+        self,
+        policy: SubscriptionPolicy = SubscriptionPolicy.LATEST,
+        every: int = 1,
+        maxsize: int = 64,
+    ) -> Subscription:
+        """Subscribe to processed states.
+
+        The subscription is an async iterator, that ends when it's closed or
+        the manager is stopped. States are published without waiting for
+        subscribers, so a slow subscriber only loses states of its own (see
+        Subscription.dropped). Published states are shared between
+        subscribers and must not be modified.
+
+        Parameters
+        ----------
+        policy : SubscriptionPolicy, optional
+            By default SubscriptionPolicy.LATEST
+        every : int, optional
+            Minimum number of frames between received states, by default 1
+        maxsize : int, optional
+            Queue size with SubscriptionPolicy.EVERY, by default 64
+
+        Returns
+        -------
+        Subscription
+            Use as async context manager to unsubscribe on exit.
+        """
+        sub = Subscription(policy, every=every, maxsize=maxsize)
+        sub.on_close = self.subscriptions.remove
+        self.subscriptions.append(sub)
+        return sub
 
     async def update_initials(self):
         res_istate = await self.M.read_value(initial_game_state=ra2yr.GameState())
@@ -74,26 +290,33 @@ class Manager:
         if self.iters % self.show_stats_every == 0:
             delta = self.t.toc()
             lg.debug(
-                "step=%d interval=%d avg_duration=%f avg_fps=%f",
+                "step=%d interval=%d avg_duration=%f avg_fps=%f dropped_frames=%d "
+                "discarded_states=%d",
                 self.iters,
                 self.show_stats_every,
                 delta / self.show_stats_every,
                 self.show_stats_every / delta,
+                self.dropped_frames,
+                self.discarded_states,
             )
             self.t.tic()
         if s.current_frame > 0:
             if not self.state.sc.has_initials():
                 await self.update_initials()
+            t = time.perf_counter()
             try:
-                fn = await self.step(s)
-                if fn:
-                    # await asyncio.create_task(fn)
-                    await fn()
+                with self.tracer.span("step", track="process"):
+                    fn = await self.step(s)
+                    if fn:
+                        # await asyncio.create_task(fn)
+                        await fn()
                 # Execute callbacks if necessary
             except AssertionError:
                 raise
             except Exception:
                 lg.error("exception on step: %s", traceback.format_exc())
+            finally:
+                self._m_step.observe(time.perf_counter() - t)
         self.iters += 1
 
     async def get_state(self) -> ra2yr.GameState:
@@ -111,11 +334,40 @@ class Manager:
         asyncio.exceptions.TimeoutError
             If the retrieval timed out.
         """
-        cmd = commands_yr.GetGameState()
-        state = await self.client.exec_command(cmd, timeout=self.fetch_state_timeout)
-        if not state.result.Unpack(cmd):
-            raise RuntimeError(f"failed to unpack state: {state}")
-        return cmd.state
+        raw = await self.fetch_state_raw()
+        with self._m_decode.time():
+            return ra2yr.GameState.FromString(raw)
+
+    async def fetch_state_raw(self) -> memoryview:
+        """Fetch latest serialized state without decoding it.
+
+        The GameState is located in the received message by scanning the wire
+        format, so it's neither decoded nor copied. Use with process_raw().
+
+        Returns
+        -------
+        memoryview
+            Serialized GameState.
+
+        Raises
+        ------
+        RuntimeError
+            If received data was invalid.
+        asyncio.exceptions.TimeoutError
+            If the retrieval timed out.
+        """
+        res = await self.client.exec_command_raw(
+            commands_yr.GetGameState(), timeout=self.fetch_state_timeout
+        )
+        if varint_field(res, _RESULT_CODE) == core.ResponseCode.ERROR:
+            raise RuntimeError(
+                f"failed to get state: {core.CommandResult.FromString(res)}"
+            )
+        loc = find_path(res, _STATE_PATH[:2])
+        if loc is None:
+            raise RuntimeError(f"failed to unpack state: {bytes(res[:64])!r}")
+        loc = find_path(res, _STATE_PATH[2:], *loc)
+        return memoryview(res)[loc[0] : loc[1]] if loc else memoryview(b"")
 
     async def run_command(self, c: Any) -> core.CommandResult:
         """This blocks until result available
@@ -149,24 +401,186 @@ class Manager:
         res.result.Unpack(res_o)
         return res_o
 
-    async def mainloop(self):
-        d = 1 / self.poll_frequency
-        deadline = dt.now().timestamp()
+    async def process_state(self, s: ra2yr.GameState, raw: bytes = None) -> bool:
+        """Update the current state and run step logic, unless the state is
+        for the same frame and stage as the current one.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            Fetched state
+        raw : bytes, optional
+            Serialized form of s, forwarded to hub and shm if available
+
+        Returns
+        -------
+        bool
+            True if the state was processed.
+        """
+        if not self.state.should_update(s):
+            self._m_duplicate.inc()
+            return False
+        return await self._process(s.current_frame, s, raw)
+
+    async def process_raw(self, raw: bytes | memoryview, header=None) -> bool:
+        """Like process_state, but for a serialized state, e.g. from
+        fetch_state_raw().
+
+        Frame and stage are read from the wire format first, so duplicate
+        states aren't decoded at all. Otherwise the state is decoded once,
+        directly into the current state. Subscribers get a copy, since the
+        current state is overwritten by the next one.
+
+        Parameters
+        ----------
+        raw : bytes | memoryview
+            Serialized GameState
+        header : optional
+            ``wire.state_header(raw)`` if already parsed, by default parse it
+
+        Returns
+        -------
+        bool
+            True if the state was processed.
+        """
+        h = header or state_header(raw)
+        cur = self.state.s
+        if h.current_frame == cur.current_frame and h.stage == cur.stage:
+            self._m_duplicate.inc()
+            return False
+        if isinstance(raw, memoryview) and (
+            self.recorder or self.hub or self.shm or self.offload
+        ):
+            # Consumers may keep the bytes or pickle them
+            raw = bytes(raw)
+        return await self._process(h.current_frame, None, raw)
+
+    async def _process(
+        self, frame: int, s: ra2yr.GameState | None, raw: bytes | None
+    ) -> bool:
+        self.tracer.frame = frame
+        if not self.profiler:
+            with self.tracer.span("process_state", track="process"):
+                return await self._process_state(frame, s, raw)
+        self.profiler.start(frame)
+        t = time.perf_counter()
+        try:
+            with self.tracer.span("process_state", track="process"):
+                return await self._process_state(frame, s, raw)
+        finally:
+            self.profiler.finish(frame, time.perf_counter() - t)
+
+    async def _process_state(
+        self, frame: int, s: ra2yr.GameState | None, raw: bytes | None
+    ) -> bool:
+        t = time.perf_counter()
+        prev_frame = self.state.s.current_frame
+        if prev_frame > 0 and frame > prev_frame + 1:
+            self.dropped_frames += frame - prev_frame - 1
+            self._m_dropped.inc(frame - prev_frame - 1)
+        with self.tracer.span("set_state", track="process"):
+            if s is None:
+                with self._m_decode.time():
+                    self.state.sc.parse_state(raw)
+            else:
+                self.state.sc.set_state(s)
+        self._m_frame.set(frame)
+        # Published states must not change afterwards
+        pub = s
+        if s is None:
+            pub = self.state.s
+            if self.subscriptions or (self.hub and self.hub.subscriptions):
+                pub = ra2yr.GameState()
+                pub.CopyFrom(self.state.s)
+        if self.recorder:
+            self.recorder.write(pub if raw is None else raw)
+        for sub in self.subscriptions:
+            sub.publish(pub)
+        if self.hub:
+            self.hub.publish(pub, raw)
+        if self.shm:
+            self.shm.write(pub, raw)
+        if self.offload and frame > 0:
+            self.offload.submit(pub, raw)
+        if s is None:
+            s = self.state.s
+
+        self._m_subscriptions.set(len(self.subscriptions))
+
+        await self._on_state_update(s)
+        self.scheduler.flush(s.current_frame)
+        await self.state.state_updated()
+        self._m_processed.inc()
+        self._m_process.observe(time.perf_counter() - t)
+        if self.memory:
+            self.memory.update(self, s.current_frame)
+        return True
+
+    async def _poll_states(self) -> AsyncIterator[tuple[memoryview, Any]]:
+        """Yield fetched states, with their header if it was parsed for the
+        poller."""
         while not self._stop.is_set():
-            s = None
-            await asyncio.sleep(min(d, max(deadline - dt.now().timestamp(), 0.0)))
-            deadline = dt.now().timestamp() + d
-            try:
-                s = await self.get_state()
-                # Await pending tasks
-            except asyncio.exceptions.TimeoutError:
-                lg.error("Couldn't fetch result")
-            if not self.state.should_update(s):
-                continue
-            self.state.sc.set_state(s)
+            # Without pipelining, the iteration also covers processing of the
+            # yielded state.
+            with self.tracer.span("iteration", track="fetch"):
+                with self.tracer.span("wait", track="fetch"):
+                    if self.lockstep:
+                        # Let tasks spawned by step() issue their commands
+                        await asyncio.sleep(0)
+                        await self.client.wait_submitted()
+                    else:
+                        await asyncio.sleep(self.poller.delay())
+                self.poller.fetch_started()
+                try:
+                    with self.tracer.span("get_state", track="fetch"):
+                        raw = await self.fetch_state_raw()
+                except asyncio.exceptions.TimeoutError:
+                    lg.error("Couldn't fetch result")
+                    self.poller.observe(None)
+                    continue
+                h = None
+                if self.poller.observes_state:
+                    h = state_header(raw)
+                    self.poller.observe(h)
+                yield raw, h
+
+    async def _fetch_loop(self, q: asyncio.Queue):
+        try:
+            async for item in self._poll_states():
+                if self.pipeline == PipelinePolicy.LATEST and q.full():
+                    q.get_nowait()
+                    self.discarded_states += 1
+                    self._m_discarded.inc()
+                await q.put(item)
+                self._m_queue.set(q.qsize())
+        except BaseException:
+            # Wake up the processing loop, which then raises the error
+            while q.full():
+                q.get_nowait()
+            q.put_nowait(None)
+            raise
+        await q.put(None)
+
+    async def _pipelined_mainloop(self):
+        maxsize = 1 if self.pipeline == PipelinePolicy.LATEST else self.pipeline_depth
+        q = asyncio.Queue(maxsize=max(maxsize, 1))
+        fetch_task = asyncio.create_task(self._fetch_loop(q))
+        try:
+            while (item := await q.get()) is not None:
+                self._m_queue.set(q.qsize())
+                await self.process_raw(*item)
+            # Raise the error if fetching failed
+            await fetch_task
+        finally:
+            fetch_task.cancel()
+            await asyncio.gather(fetch_task, return_exceptions=True)
 
-            await self._on_state_update(s)
-            await self.state.state_updated()
+    async def mainloop(self):
+        if self.pipeline is not None:
+            await self._pipelined_mainloop()
+            return
+        async for raw, h in self._poll_states():
+            await self.process_raw(raw, h)
 
     async def wait_state(self, cond, timeout=30, err=None):
         await self.state.wait_state(lambda x: cond(), timeout=timeout, err=err)
@@ -444,24 +858,38 @@ class ManagerUtil:
             config=commands_yr.Configuration(debug_log=v)
         )
 
-    async def execute_at(self, aw, frame: int):
-        """Execute awaitable at specific frame. Implies single step mode.
+    def execute_at(self, aw: Awaitable, frame: int = None) -> asyncio.Future:
+        """Execute awaitable once state for a specific frame has been processed.
+
+        This doesn't block, so it's safe to use inside step() also in single
+        step mode, where awaiting a command would block the game loop until
+        the next state fetch. All awaitables due at a frame are started
+        together right after step() returns, and their results are typically
+        available after the next state fetch.
 
         Parameters
         ----------
-        aw : _type_
-        frame : int
+        aw : Awaitable
+            Awaitable to execute, e.g. ``self.attack(...)``
+        frame : int, optional
+            Target frame. By default, execute after current step.
+
+        Returns
+        -------
+        asyncio.Future
+            Future for the result of the awaitable. In single step mode, don't
+            await it inside step().
 
         Raises
         ------
         RuntimeError
-            If frame is less than current frame or if single step mode isn't active.
+            If frame is less than current frame.
         """
-        # TODO: This is non-trivial.
-        # Calling blocking functions (basically any command) insisde step()
-        # blocks the event loop with single step mode, because game loop remains blocked
-        # until next call to GetGameState.
-        #
-        # Possible workaround:
-        # Wrap command(s) inside asyncio tasks and await them after next state fetch
-        raise NotImplementedError()
+        cur = self.manager.state.s.current_frame
+        if frame is None:
+            frame = cur
+        if frame < cur:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            raise RuntimeError(f"frame {frame} is in the past (current: {cur})")
+        return self.manager.scheduler.schedule(aw, frame)
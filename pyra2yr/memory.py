@@ -0,0 +1,147 @@
+import logging as lg
+import tracemalloc
+
+from pyra2yr.metrics import Registry
+from pyra2yr.network import DualClient
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def container_sizes(manager) -> dict[str, int]:
+    """Get sizes of internal containers of a Manager that grow if results,
+    states or commands aren't consumed."""
+    sizes = {
+        "subscriptions": len(manager.subscriptions),
+        "subscription_queues": sum(sub.lag for sub in manager.subscriptions),
+        "scheduled": len(manager.scheduler),
+    }
+    c = manager.client
+    if isinstance(c, DualClient):
+        sizes["results"] = len(c.results)
+        for k, conn in c.conns.items():
+            # Queues are removed once the connection is closed
+            for q in ("in_queue", "out_queue"):
+                if getattr(conn, q) is not None:
+                    sizes[f"{k}_{q}"] = getattr(conn, q).qsize()
+    if manager.recorder:
+        sizes["recorder_queue"] = manager.recorder.qsize()
+    if manager.offload:
+        sizes["offload_pending"] = manager.offload.pending
+    return sizes
+
+
+class MemoryMonitor:
+    """Track memory growth of a Manager.
+
+    Container sizes (see container_sizes) are exported as gauges on every
+    update. Every ``every`` frames, a tracemalloc snapshot is taken and
+    compared to the previous one, and the ``top_n`` allocation sites with
+    the largest growth are logged and stored in ``growth``.
+
+    Tracing allocations slows down the whole process. Snapshots are taken
+    in update(), which Manager calls from the event loop after step(), so
+    the loop is blocked until the snapshot is taken and compared. This may
+    take a while with a large heap, so use a large interval. Running it in a
+    thread wouldn't help much, since tracemalloc holds the GIL while copying
+    the traces.
+    """
+
+    def __init__(
+        self,
+        every: int = 1800,
+        top_n: int = 10,
+        nframes: int = 1,
+        key_type: str = "lineno",
+    ):
+        """
+        Parameters
+        ----------
+        every : int, optional
+            Frames between snapshots, by default 1800 (two minutes at normal
+            game speed). If 0, only container sizes are tracked.
+        top_n : int, optional
+            Number of allocation sites to report, by default 10
+        nframes : int, optional
+            Traceback depth recorded by tracemalloc, by default 1
+        key_type : str, optional
+            Grouping of allocations, see tracemalloc.Snapshot.statistics, by
+            default "lineno"
+        """
+        self.every = every
+        self.top_n = top_n
+        self.nframes = nframes
+        self.key_type = key_type
+        self.growth: list[tracemalloc.StatisticDiff] = []
+        self.snapshots = 0
+        self._prev: tracemalloc.Snapshot = None
+        self._last_frame = None
+        self._started = False
+        self._sizes = {}
+        self.metrics: Registry = None
+
+    def start(self, metrics: Registry):
+        self.metrics = metrics
+        if self.every > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started = True
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._prev = None
+
+    def snapshot(self) -> list[tracemalloc.StatisticDiff]:
+        """Take snapshot and compare to the previous one.
+
+        Returns
+        -------
+        list[tracemalloc.StatisticDiff]
+            Allocation sites that grew the most, empty for the first snapshot.
+        """
+        snap = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        self.snapshots += 1
+        res = []
+        if self._prev is not None:
+            res = [
+                x for x in snap.compare_to(self._prev, self.key_type) if x.size_diff > 0
+            ][: self.top_n]
+        self._prev = snap
+        return res
+
+    def update(self, manager, frame: int):
+        """Update gauges, and take a snapshot if it's due. Blocks while the
+        snapshot is taken."""
+        if self.metrics is None:
+            return
+        for k, v in container_sizes(manager).items():
+            if k not in self._sizes:
+                self._sizes[k] = self.metrics.gauge(
+                    "pyra2yr_container_size", "Size of internal container", container=k
+                )
+            self._sizes[k].set(v)
+        if self.every <= 0 or not tracemalloc.is_tracing():
+            return
+        if self._last_frame is not None and frame - self._last_frame < self.every:
+            return
+        self._last_frame = frame
+        self.growth = self.snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        self.metrics.gauge(
+            "pyra2yr_traced_memory_bytes", "Memory traced by tracemalloc"
+        ).set(current)
+        self.metrics.gauge(
+            "pyra2yr_traced_memory_peak_bytes", "Peak memory traced by tracemalloc"
+        ).set(peak)
+        if self.growth:
+            lg.info(
+                "frame=%d traced=%d top memory growth:\n%s",
+                frame,
+                current,
+                "\n".join(str(x) for x in self.growth),
+            )
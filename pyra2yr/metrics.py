@@ -0,0 +1,268 @@
+import asyncio
+import bisect
+import logging as lg
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Seconds, from 100us to 10s
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Counter:  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+
+class Gauge:  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.value = 0
+
+    def set(self, v: float):
+        self.value = v
+
+
+class Histogram:
+    """Histogram with fixed buckets. Observing a value is a binary search and
+    two additions."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Last bucket is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe duration of the with block."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t)
+
+    def quantile(self, q: float) -> float:
+        """Estimate quantile by linear interpolation within the bucket.
+
+        Returns
+        -------
+        float
+            The estimate, nan if nothing was observed. Values in the +Inf
+            bucket are estimated as the largest finite bound.
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            if c and acc + c >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - acc) / c
+            acc += c
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+
+def _labels_str(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    items = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Registry:
+    """Collection of named metrics.
+
+    Metrics are identified by name and labels. Getting a metric creates it
+    on first use, so instrumented code can hold on to the returned object to
+    skip the lookup in hot paths.
+
+    Example
+    -------
+    >>> R = Registry(game="0")
+    >>> R.histogram("pyra2yr_step_seconds", "step() duration").observe(0.01)
+    >>> print(R.to_prometheus())
+    """
+
+    def __init__(self, **labels: str):
+        """
+        Parameters
+        ----------
+        **labels : str
+            Constant labels added to every metric, e.g. game instance.
+        """
+        self.labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        self._metrics: dict[str, tuple[str, str, dict]] = {}
+
+    def _get(self, kind: str, name: str, doc: str, labels: dict, factory):
+        if name not in self._metrics:
+            self._metrics[name] = (kind, doc, {})
+        m_kind, _, series = self._metrics[name]
+        if m_kind != kind:
+            raise ValueError(f"{name} is a {m_kind}, not {kind}")
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        if key not in series:
+            series[key] = factory()
+        return series[key]
+
+    def counter(self, name: str, doc: str = "", **labels) -> Counter:
+        return self._get("counter", name, doc, labels, Counter)
+
+    def gauge(self, name: str, doc: str = "", **labels) -> Gauge:
+        return self._get("gauge", name, doc, labels, Gauge)
+
+    def histogram(
+        self,
+        name: str,
+        doc: str = "",
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        **labels,
+    ) -> Histogram:
+        return self._get("histogram", name, doc, labels, lambda: Histogram(buckets))
+
+    def get(self, name: str, **labels) -> Counter | Gauge | Histogram | None:
+        """Get existing metric, or None."""
+        if name not in self._metrics:
+            return None
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        return self._metrics[name][2].get(key)
+
+    def snapshot(self) -> dict[str, dict[tuple, dict]]:
+        """Get current values.
+
+        Returns
+        -------
+        dict[str, dict[tuple, dict]]
+            For each metric name, map of label tuples to values. Histograms
+            have count, sum, mean, p50, p90 and p99.
+        """
+        res = {}
+        for name, (kind, _, series) in self._metrics.items():
+            res[name] = {}
+            for key, m in series.items():
+                if kind == "histogram":
+                    v = {
+                        "count": m.count,
+                        "sum": m.sum,
+                        "mean": m.mean,
+                        "p50": m.quantile(0.5),
+                        "p90": m.quantile(0.9),
+                        "p99": m.quantile(0.99),
+                    }
+                else:
+                    v = {"value": m.value}
+                res[name][key] = v
+        return res
+
+    def to_prometheus(self) -> str:
+        """Format metrics in Prometheus text exposition format."""
+        lines = []
+        for name, (kind, doc, series) in sorted(self._metrics.items()):
+            if doc:
+                lines.append(f"# HELP {name} {doc}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, m in series.items():
+                labels = self.labels + key
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels_str(labels)} {_fmt(m.value)}")
+                    continue
+                acc = 0
+                for b, c in zip(m.buckets + (math.inf,), m.counts):
+                    acc += c
+                    le = _labels_str(labels, f'le="{_fmt(b)}"')
+                    lines.append(f"{name}_bucket{le} {acc}")
+                lines.append(f"{name}_sum{_labels_str(labels)} {_fmt(m.sum)}")
+                lines.append(f"{name}_count{_labels_str(labels)} {m.count}")
+        return "\n".join(lines) + "\n"
+
+
+def write_prometheus(registries: list[Registry], path: str):
+    """Atomically write metrics of registries to a file, e.g. for the textfile
+    collector of node_exporter."""
+    text = "".join(r.to_prometheus() for r in registries)
+    d = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".metrics")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class PrometheusFileExporter:
+    """Periodically write registries to a Prometheus text file."""
+
+    def __init__(self, registries: list[Registry], path: str, interval: float = 5.0):
+        self.registries = registries
+        self.path = path
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.write()
+
+    def write(self):
+        write_prometheus(self.registries, self.path)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                lg.error("failed to write metrics to %s: %s", self.path, e)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
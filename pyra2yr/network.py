@@ -1,12 +1,28 @@
 import asyncio
 import logging
+import time
 import traceback
 from typing import Any, Dict
 
 import aiohttp
+from google.protobuf import any_pb2
 from ra2yrproto import core
 
 from .async_container import AsyncDict
+from .metrics import Histogram, Registry
+from .tracing import Tracer
+from .wire import find_path, iter_fields, varint_field
+
+# Members of generated modules are created at runtime
+# pylint: disable=no-member
+_ANY_TYPE_URL = any_pb2.Any.DESCRIPTOR.fields_by_name["type_url"].number
+_ANY_VALUE = any_pb2.Any.DESCRIPTOR.fields_by_name["value"].number
+# pylint: enable=no-member
+_POLL_RESULTS_TYPE = f"/{core.PollResults.DESCRIPTOR.full_name}".encode()
+_RESPONSE_BODY = core.Response.DESCRIPTOR.fields_by_name["body"].number
+_POLL_RESULT = core.PollResults.DESCRIPTOR.fields_by_name["result"]
+_POLL_RESULTS = _POLL_RESULT.message_type.fields_by_name["results"].number
+_COMMAND_ID = core.CommandResult.DESCRIPTOR.fields_by_name["command_id"].number
 
 debug = logging.debug
 
@@ -80,8 +96,19 @@ class WebSocketClient:
             debug("close _main_session")
 
 
+# Number of results per poll
+_BATCH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
 class DualClient:
-    def __init__(self, host: str, port: int, timeout: float = 5.0):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout: float = 5.0,
+        metrics: Registry = None,
+        tracer: Tracer = None,
+    ):
         self.host = host
         self.port = port
         self.conns: Dict[str, WebSocketClient] = {}
@@ -92,8 +119,25 @@ class DualClient:
         self.in_queue = asyncio.Queue()
         self._poll_task = None
         self._stop = asyncio.Event()
+        self._submitting = 0
+        self._cond_submitted = asyncio.Condition()
         # FIXME: ugly
         self._queue_set = asyncio.Event()
+        self.metrics = metrics or Registry()
+        self.tracer = tracer or Tracer()
+        self._cmd_metrics: Dict[str, tuple[Histogram, Histogram, Histogram]] = {}
+        self._m_timeouts = self.metrics.counter(
+            "pyra2yr_command_timeouts_total", "Commands whose result timed out"
+        )
+        self._m_pending = self.metrics.gauge(
+            "pyra2yr_pending_results", "Polled results not yet consumed"
+        )
+        self._m_submitting = self.metrics.gauge(
+            "pyra2yr_submitting_commands", "Commands waiting for acknowledgement"
+        )
+        self._m_batch = self.metrics.histogram(
+            "pyra2yr_poll_batch_size", "Results per poll", buckets=_BATCH_BUCKETS
+        )
 
     def connect(self):
         for k in ["command", "poll"]:
@@ -119,10 +163,61 @@ class DualClient:
         res.ParseFromString(msg)
         return res
 
+    def command_metrics(self, name: str) -> tuple[Histogram, Histogram, Histogram]:
+        """Get histograms of acknowledgement, result and round-trip time of a
+        command type."""
+        if name not in self._cmd_metrics:
+            self._cmd_metrics[name] = tuple(
+                self.metrics.histogram(
+                    f"pyra2yr_command_{k}_seconds", doc, command=name
+                )
+                for k, doc in (
+                    ("ack", "Time until command was acknowledged"),
+                    ("result", "Time from acknowledgement until result was polled"),
+                    ("roundtrip", "Time until command result was available"),
+                )
+            )
+        return self._cmd_metrics[name]
+
+    def scan_poll_results(self, buf: bytes) -> list[tuple[int, int]]:
+        """Locate serialized CommandResults in a PollResults response without
+        decoding them.
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            (start, stop) offsets of each result in buf.
+
+        Raises
+        ------
+        RuntimeError
+            If buf isn't a PollResults response.
+        """
+        body = find_path(buf, [_RESPONSE_BODY])
+        url = body and find_path(buf, [_ANY_TYPE_URL], *body)
+        if not url or not buf[url[0] : url[1]].endswith(_POLL_RESULTS_TYPE):
+            raise RuntimeError(f"failed to unpack poll results {buf[:64]!r}")
+        loc = find_path(buf, [_ANY_VALUE, _POLL_RESULT.number], *body)
+        if loc is None:
+            return []
+        return [
+            (start, stop)
+            for num, _, start, stop in iter_fields(buf, *loc)
+            if num == _POLL_RESULTS
+        ]
+
     async def run_client_command(self, c: Any) -> core.RunCommandAck:
-        msg = await self.conns["command"].send_message(
-            self.make_command(c, core.CLIENT_COMMAND).SerializeToString()
-        )
+        self._submitting += 1
+        self._m_submitting.set(self._submitting)
+        try:
+            msg = await self.conns["command"].send_message(
+                self.make_command(c, core.CLIENT_COMMAND).SerializeToString()
+            )
+        finally:
+            self._submitting -= 1
+            self._m_submitting.set(self._submitting)
+            async with self._cond_submitted:
+                self._cond_submitted.notify_all()
 
         res = self.parse_response(msg.data)
         ack = core.RunCommandAck()
@@ -130,8 +225,13 @@ class DualClient:
             raise RuntimeError(f"failed to unpack ack: {res}")
         return ack
 
+    async def wait_submitted(self):
+        """Wait until all commands being sent have been acknowledged."""
+        async with self._cond_submitted:
+            await self._cond_submitted.wait_for(lambda: self._submitting == 0)
+
     # TODO: could wrap this into task and cancel at exit
-    async def exec_command(self, c: Any, timeout: float = None):
+    async def exec_command(self, c: Any, timeout: float = None) -> core.CommandResult:
         """Execute command and return the result when it's polled back.
 
         Parameters
@@ -143,7 +243,7 @@ class DualClient:
 
         Returns
         -------
-        Any
+        core.CommandResult
             Command result protobuf object.
 
         Raises
@@ -151,12 +251,44 @@ class DualClient:
         asyncio.exceptions.TimeoutError
             If results were not available within timeout.
         """
-        msg = await self.run_client_command(c)
+        res = core.CommandResult()
+        res.ParseFromString(await self.exec_command_raw(c, timeout))
+        return res
+
+    async def exec_command_raw(
+        self, c: Any, timeout: float = None
+    ) -> memoryview | bytes:
+        """Like exec_command, but return the serialized CommandResult without
+        decoding it. If it was the only result of its poll message, it's a
+        view to the message, otherwise a copy."""
+        name = c.__class__.__name__
+        m_ack, m_result, m_roundtrip = self.command_metrics(name)
+        sid = self.tracer.begin(name)
+        t0 = time.perf_counter()
+        try:
+            msg = await self.run_client_command(c)
+        except BaseException:
+            self.tracer.end(sid, name, error="submit")
+            raise
+        t1 = time.perf_counter()
+        m_ack.observe(t1 - t0)
+        self.tracer.mark(sid, "ack", command_id=msg.id)
         if self.queue_id < 0:
             self.queue_id = msg.queue_id
             self._queue_set.set()
         # wait until results polled
-        return await self.results.get_item(msg.id, timeout=timeout, remove=True)
+        try:
+            res = await self.results.get_item(msg.id, timeout=timeout, remove=True)
+        except asyncio.exceptions.TimeoutError:
+            self._m_timeouts.inc()
+            self.tracer.end(sid, name, error="timeout")
+            raise
+        self.tracer.end(sid, name)
+        t2 = time.perf_counter()
+        m_result.observe(t2 - t1)
+        m_roundtrip.observe(t2 - t0)
+        self._m_pending.set(len(self.results))
+        return res
 
     async def _poll_loop(self):
         await self._queue_set.wait()
@@ -166,12 +298,17 @@ class DualClient:
                     self.queue_id, int(self.timeout * 1000)
                 ).SerializeToString()
             )
-            res = self.parse_response(msg.data)
-            cc = core.PollResults()
-            if not res.body.Unpack(cc):
-                raise RuntimeError(f"failed to unpack poll results {cc}")
-            for x in cc.result.results:
-                await self.results.put_item(x.command_id, x)
+            locs = self.scan_poll_results(msg.data)
+            for start, stop in locs:
+                # A view keeps the whole message alive until every result in
+                # it is released, so only a lone result isn't copied.
+                res = memoryview(msg.data)[start:stop]
+                await self.results.put_item(
+                    varint_field(msg.data, _COMMAND_ID, start, stop),
+                    res if len(locs) == 1 else bytes(res),
+                )
+            self._m_batch.observe(len(locs))
+            self._m_pending.set(len(self.results))
 
     async def stop(self):
         self._stop.set()
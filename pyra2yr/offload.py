@@ -0,0 +1,169 @@
+import asyncio
+import logging as lg
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable
+
+from ra2yrproto import ra2yr
+
+
+def _run_step(fn: Callable[[ra2yr.GameState], list[Any]], raw: bytes) -> list[Any]:
+    return list(fn(ra2yr.GameState.FromString(raw)) or [])
+
+
+class StepOffload:
+    """Run a decision function in a process pool.
+
+    The function receives a GameState and returns commands (e.g.
+    ``commands_yr.ClickEvent`` messages), which are then run by the manager
+    concurrently. The function and commands must be picklable, so the function
+    should be defined at module level. State is passed to workers in
+    serialized form.
+
+    Processing a state never blocks the manager. If ``max_in_flight`` states
+    are already being processed, new states wait, and with ``skip_stale``
+    only the latest waiting state is kept. Note that in lockstep mode, the
+    game doesn't wait for offloaded decisions.
+
+    Example
+    -------
+    >>> def decide(s: ra2yr.GameState) -> list:
+    ...     return [commands_yr.AddMessage(message=f"frame {s.current_frame}")]
+    >>> M = Manager(offload=StepOffload(decide, max_workers=2))
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[ra2yr.GameState], list[Any]],
+        max_workers: int = 1,
+        max_in_flight: int = 1,
+        skip_stale: bool = True,
+        max_age: int = None,
+        executor: Executor = None,
+    ):
+        """
+        Parameters
+        ----------
+        fn : Callable[[ra2yr.GameState], list[Any]]
+            Decision function
+        max_workers : int, optional
+            Process pool size, by default 1
+        max_in_flight : int, optional
+            Maximum number of states being processed at once, by default 1
+        skip_stale : bool, optional
+            Keep only the latest state waiting for processing, by default True
+        max_age : int, optional
+            Discard commands if the current state is more than this many
+            frames newer than the one they were computed from. By default,
+            always run the commands.
+        executor : Executor, optional
+            Use this executor instead of creating a process pool. It won't be
+            shut down on stop.
+        """
+        self.fn = fn
+        self.max_workers = max_workers
+        self.max_in_flight = max(max_in_flight, 1)
+        self.skip_stale = skip_stale
+        self.max_age = max_age
+        self.executor = executor
+        self._own_executor = executor is None
+        self.manager = None
+        self._pending: deque[tuple[int, bytes]] = deque()
+        self._tasks: set[asyncio.Task] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # Counters for states and commands
+        self.submitted = 0
+        self.completed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.discarded_commands = 0
+        self.commands = 0
+        self.total_latency = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self, manager):
+        """Start the executor. Commands are run with manager."""
+        self.manager = manager
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    async def join(self):
+        """Wait until all submitted states have been processed."""
+        await self._idle.wait()
+
+    async def stop(self):
+        self._pending.clear()
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_executor and self.executor:
+            await asyncio.to_thread(
+                self.executor.shutdown, wait=True, cancel_futures=True
+            )
+            self.executor = None
+
+    def submit(self, s: ra2yr.GameState, raw: bytes = None):
+        """Queue state for processing without blocking.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state
+        raw : bytes, optional
+            Serialized form of s, by default serialize s
+        """
+        if raw is None:
+            raw = s.SerializeToString()
+        if self.skip_stale and self._pending:
+            self._pending.clear()
+            self.skipped += 1
+        self._pending.append((s.current_frame, raw))
+        self._idle.clear()
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._pending and len(self._tasks) < self.max_in_flight:
+            frame, raw = self._pending.popleft()
+            t = asyncio.create_task(self._process(frame, raw))
+            self._tasks.add(t)
+            t.add_done_callback(self._done)
+            self.submitted += 1
+
+    def _done(self, t: asyncio.Task):
+        self._tasks.discard(t)
+        self._dispatch()
+        if not self._tasks and not self._pending:
+            self._idle.set()
+
+    async def _process(self, frame: int, raw: bytes):
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            cmds = await loop.run_in_executor(self.executor, _run_step, self.fn, raw)
+        except Exception:
+            self.errors += 1
+            lg.error("exception in offloaded step: %s", traceback.format_exc())
+            return
+        self.completed += 1
+        self.total_latency += time.perf_counter() - t0
+        cur = self.manager.state.s.current_frame
+        if self.max_age is not None and cur - frame > self.max_age:
+            self.discarded_commands += len(cmds)
+            return
+        self.commands += len(cmds)
+        res = await asyncio.gather(
+            *(self.manager.run(c) for c in cmds), return_exceptions=True
+        )
+        for r in res:
+            if isinstance(r, Exception):
+                lg.error("failed to run offloaded command: %s", r)
@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.state_objects import MapData
+
+_OFFSETS_4 = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+_OFFSETS_8 = np.array(
+    [[-1, 0], [1, 0], [0, -1], [0, 1], [-1, -1], [-1, 1], [1, -1], [1, 1]]
+)
+
+
+def _impassable(c: ra2yr.Cell) -> bool:
+    return c.passability != 0
+
+
+def blocked_mask(
+    map_data: MapData, predicate: Callable[[ra2yr.Cell], bool] = None
+) -> np.ndarray:
+    """Get mask of impassable cells.
+
+    Parameters
+    ----------
+    map_data : MapData
+        The map
+    predicate : Callable[[ra2yr.Cell], bool], optional
+        Whether a cell is blocked, by default nonzero passability. Cells
+        missing from map data are blocked.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array of shape (width, height), indexed like MapData.ind2sub,
+        i.e. ``mask[y, x]``.
+    """
+    predicate = predicate or _impassable
+    m = map_data.m
+    mask = np.ones(m.width * m.height, dtype=bool)
+    cells = m.cells
+    idx = np.fromiter((c.index for c in cells), dtype=np.int64, count=len(cells))
+    val = np.fromiter((predicate(c) for c in cells), dtype=bool, count=len(cells))
+    mask[idx] = val
+    return mask.reshape((m.width, m.height))
+
+
+def coord2cell(coords: np.ndarray, cell_size: int = 256) -> np.ndarray:
+    """Convert coordinates to [x, y] cells."""
+    return np.asarray(coords)[..., :2].astype(np.int64) // cell_size
+
+
+def _cells_inside(cells: np.ndarray, shape: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """Get y and x of [x, y] cells that are inside the map."""
+    c = np.asarray(cells, dtype=np.int64).reshape((-1, 2))
+    m = (c[:, 1] >= 0) & (c[:, 1] < shape[0]) & (c[:, 0] >= 0) & (c[:, 0] < shape[1])
+    return c[m, 1], c[m, 0]
+
+
+def _neighbors(
+    blocked: np.ndarray, fy: np.ndarray, fx: np.ndarray, offsets: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get cells one step from cells (fy, fx) inside the map. Diagonal steps
+    between two blocked cells are excluded."""
+    k = len(offsets)
+    ny = (fy[:, None] + offsets[:, 0]).ravel()
+    nx = (fx[:, None] + offsets[:, 1]).ravel()
+    m = (ny >= 0) & (ny < blocked.shape[0]) & (nx >= 0) & (nx < blocked.shape[1])
+    # If a diagonal step is inside the map, so are both orthogonal cells
+    d = m & np.tile(np.all(offsets != 0, axis=1), fy.size)
+    m[d] = ~(blocked[ny[d], np.repeat(fx, k)[d]] & blocked[np.repeat(fy, k)[d], nx[d]])
+    return ny[m], nx[m]
+
+
+def distance_field(
+    blocked: np.ndarray, sources: np.ndarray, diagonal: bool = True
+) -> np.ndarray:
+    """Compute ground distance in cell steps from sources to every cell with
+    breadth-first search. Each BFS layer is expanded with array operations.
+
+    Parameters
+    ----------
+    blocked : np.ndarray
+        Mask of impassable cells, see blocked_mask
+    sources : np.ndarray
+        Source cells as [x, y] rows, e.g. from MapData.ind2sub
+    diagonal : bool, optional
+        Allow diagonal steps, by default True. A diagonal step can't pass
+        between two blocked cells.
+
+    Returns
+    -------
+    np.ndarray
+        Distances, np.inf for unreachable cells.
+    """
+    shape = blocked.shape
+    dist = np.full(shape, np.inf, dtype=np.float32)
+    fy, fx = _cells_inside(sources, shape)
+    dist[fy, fx] = 0
+    visited = blocked.copy()
+    visited[fy, fx] = True
+    offsets = _OFFSETS_8 if diagonal else _OFFSETS_4
+    d = 0
+    while fy.size:
+        d += 1
+        ny, nx = _neighbors(blocked, fy, fx, offsets)
+        m = ~visited[ny, nx]
+        flat = np.unique(ny[m] * shape[1] + nx[m])
+        fy, fx = np.divmod(flat, shape[1])
+        visited[fy, fx] = True
+        dist[fy, fx] = d
+    return dist
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    res = mask.copy()
+    res[1:, :] |= mask[:-1, :]
+    res[:-1, :] |= mask[1:, :]
+    res[:, 1:] |= res[:, :-1]
+    res[:, :-1] |= res[:, 1:]
+    return res
+
+
+class DistanceFields:
+    """Cache of distance fields keyed by source cells.
+
+    When the blocked mask changes (e.g. walls or buildings were placed or
+    destroyed), only fields whose reached region touches a changed cell are
+    dropped.
+
+    Example
+    -------
+    >>> D = DistanceFields(blocked_mask(map_data))
+    >>> dist = D.get(coord2cell(base_coords))
+    >>> target = candidates[np.argmax(dist[candidates[:, 1], candidates[:, 0]])]
+    """
+
+    def __init__(self, blocked: np.ndarray, diagonal: bool = True, max_size: int = 64):
+        """
+        Parameters
+        ----------
+        blocked : np.ndarray
+            Mask of impassable cells
+        diagonal : bool, optional
+            Allow diagonal steps, by default True
+        max_size : int, optional
+            Maximum number of cached fields, by default 64
+        """
+        self.blocked = blocked.copy()
+        self.diagonal = diagonal
+        self.max_size = max_size
+        self._cache: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @staticmethod
+    def key(sources: np.ndarray) -> tuple:
+        src = np.asarray(sources, dtype=np.int64).reshape((-1, 2))
+        return tuple(sorted(map(tuple, src.tolist())))
+
+    def get(self, sources: np.ndarray) -> np.ndarray:
+        """Get distance field from sources. The returned array is shared and
+        read-only."""
+        k = self.key(sources)
+        if k in self._cache:
+            self._cache.move_to_end(k)
+            self.hits += 1
+            return self._cache[k]
+        self.misses += 1
+        dist = distance_field(self.blocked, np.array(k), self.diagonal)
+        dist.flags.writeable = False
+        self._cache[k] = dist
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return dist
+
+    def update_blocked(self, blocked: np.ndarray) -> int:
+        """Set new blocked mask and drop affected fields.
+
+        Returns
+        -------
+        int
+            Number of dropped fields.
+        """
+        changed = blocked != self.blocked
+        self.blocked = blocked.copy()
+        if not changed.any():
+            return 0
+        # A cell that became passable next to the reached region can open new
+        # paths, so compare against the region grown by one cell.
+        stale = [
+            k
+            for k, dist in self._cache.items()
+            if (changed & _dilate(np.isfinite(dist))).any()
+        ]
+        for k in stale:
+            del self._cache[k]
+        return len(stale)
@@ -0,0 +1,172 @@
+import math
+import time
+from collections import deque
+
+from ra2yrproto import ra2yr
+
+
+class Poller:
+    """Decides when Manager fetches the next state."""
+
+    # Whether observe() uses the state. If not, Manager skips parsing the
+    # header of fetched states for it.
+    observes_state = True
+
+    def delay(self) -> float:
+        """Seconds to wait before the next fetch."""
+        return 0.0
+
+    def fetch_started(self):
+        pass
+
+    def observe(self, s: ra2yr.GameState | None):
+        """Called with the fetched state, or None if the fetch failed. Only
+        current_frame, stage and crc of the state are set, see
+        wire.state_header."""
+
+
+class FixedPoller(Poller):
+    """Poll at a fixed frequency."""
+
+    observes_state = False
+
+    def __init__(self, frequency: float):
+        self.interval = 1 / frequency
+        self._deadline = time.monotonic()
+
+    def delay(self) -> float:
+        return min(self.interval, max(self._deadline - time.monotonic(), 0.0))
+
+    def fetch_started(self):
+        self._deadline = time.monotonic() + self.interval
+
+
+class AdaptivePoller(Poller):
+    """Schedule fetches just after the expected next game frame.
+
+    The game frame rate and the time of the latest frame change are estimated
+    from observed ``current_frame`` values. A frame changed somewhere between
+    the last two captures, and the frame rate is measured from such changes
+    over a sliding time window. Fetches are aligned to estimated frame
+    boundaries, but not done more often than ``max_frequency``. If the frame
+    hasn't changed, the boundary estimate is pushed forward and the fetch
+    retried shortly. If the frame is overdue (e.g. game paused), repeated
+    duplicates back off exponentially. Outside STAGE_INGAME, or if fetch
+    fails, polling slows down to ``idle_interval``. A frame going backwards
+    (e.g. the game was restarted) resets the frame estimate.
+    """
+
+    def __init__(
+        self,
+        max_frequency: float = 60.0,
+        idle_interval: float = 0.5,
+        initial_fps: float = 30.0,
+        margin: float = 0.1,
+        smoothing: float = 0.2,
+        window: float = 2.0,
+    ):
+        """
+        Parameters
+        ----------
+        max_frequency : float, optional
+            Maximum fetch frequency in Hz, by default 60.0
+        idle_interval : float, optional
+            Fetch interval (seconds) outside game, by default 0.5
+        initial_fps : float, optional
+            Initial frame rate estimate, by default 30.0
+        margin : float, optional
+            Fraction of frame period to wait after expected frame change, by
+            default 0.1
+        smoothing : float, optional
+            Weight of new samples in the latency estimate, by default 0.2
+        window : float, optional
+            Seconds of frame changes to measure the frame rate over, by
+            default 2.0
+        """
+        self.min_interval = 1 / max_frequency
+        self.idle_interval = idle_interval
+        self.fps = initial_fps
+        self.margin = margin
+        self.smoothing = smoothing
+        self.window = window
+        self.latency = 0.0
+        self.duplicates = 0
+        self._next = time.monotonic()
+        self._fetch_start = self._next
+        self._prev_capture = None
+        self._frame = None
+        self._boundary = None
+        self._frame_start = None
+        # (frame, time) of observed frame changes within window
+        self._changes: deque[tuple[int, float]] = deque()
+
+    def delay(self) -> float:
+        return max(self._next - time.monotonic(), 0.0)
+
+    def fetch_started(self):
+        self._fetch_start = time.monotonic()
+
+    def _reset(self, now: float, interval: float):
+        self._frame = None
+        self._prev_capture = None
+        self._changes.clear()
+        self.duplicates = 0
+        self._next = now + interval
+
+    def _update_fps(self, frame: int, t: float):
+        """Add observed change to frame at time t."""
+        self._changes.append((frame, t))
+        while len(self._changes) > 2 and t - self._changes[1][1] > self.window:
+            self._changes.popleft()
+        (f0, t0), (f1, t1) = self._changes[0], self._changes[-1]
+        if t1 > t0:
+            self.fps = (f1 - f0) / (t1 - t0)
+
+    def observe(self, s: ra2yr.GameState | None):
+        now = time.monotonic()
+        if s is None or s.stage != ra2yr.STAGE_INGAME:
+            self._reset(now, self.idle_interval)
+            return
+        fetch_time = now - self._fetch_start
+        self.latency += self.smoothing * (fetch_time - self.latency)
+        # Approximate the moment the state was captured
+        capture = self._fetch_start + fetch_time / 2
+        f = s.current_frame
+        period = 1 / self.fps
+        if self._frame is None or f < self._frame:
+            # First state, or the game was restarted
+            self.duplicates = 0
+            self._frame = f
+            self._boundary = capture
+            self._frame_start = capture
+            self._changes.clear()
+        elif f > self._frame:
+            self._update_fps(f, (self._prev_capture + capture) / 2)
+            period = 1 / self.fps
+            # The frame changed between previous and current capture
+            # Lean early, so that the estimate can't drift late unnoticed: an
+            # early fetch gets a duplicate, which corrects the estimate.
+            predicted = (
+                self._boundary + (f - self._frame) * period - self.margin * period / 4
+            )
+            self._boundary = min(max(predicted, self._prev_capture), capture)
+            self._frame_start = self._boundary
+            self._frame = f
+            self.duplicates = 0
+        else:
+            # Next frame wasn't reached yet
+            self._boundary = max(self._boundary, capture - period)
+            self.duplicates += 1
+        self._prev_capture = capture
+
+        if self.duplicates > 2 and capture - self._frame_start > 2 * period:
+            # Paused, or much slower than estimated
+            backoff = period * 2 ** (self.duplicates - 2)
+            self._next = now + min(backoff, self.idle_interval)
+            return
+        earliest = self._fetch_start + self.min_interval
+        offset = self.margin * period - self.latency / 2
+        # Aim at the first frame that a fetch at earliest can still capture
+        target = earliest + self.latency / 2 + self.margin * period
+        k = max(1, math.floor((target - self._boundary) / period))
+        self._next = max(self._boundary + k * period + offset, earliest)
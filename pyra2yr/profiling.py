@@ -0,0 +1,116 @@
+import cProfile
+import logging as lg
+import os
+from dataclasses import dataclass
+
+from pyra2yr.util import finish_profiler
+
+
+@dataclass
+class SlowFrame:
+    frame: int
+    duration: float
+    path: str
+
+
+class SlowFrameProfiler:
+    """Profile state processing only when frames exceed a latency budget.
+
+    Profiling a frame after the fact isn't possible, so when a frame exceeds
+    the budget, cProfile is armed for the next ``profile_frames`` frames.
+    Profiled frames that also exceed the budget are dumped to ``directory``
+    as ``frame_<frame>.pstats`` (load with pstats.Stats) and
+    ``frame_<frame>.txt``. Only the ``top_n`` slowest are kept.
+
+    cProfile profiles the thread, so while step() awaits, other tasks of the
+    event loop show up in the profile too.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        budget: float = 1 / 15,
+        top_n: int = 5,
+        profile_frames: int = 10,
+    ):
+        """
+        Parameters
+        ----------
+        directory : str
+            Output directory, created if needed
+        budget : float, optional
+            Latency budget of a frame in seconds, by default 1/15
+        top_n : int, optional
+            Number of slowest profiled frames to keep, by default 5
+        profile_frames : int, optional
+            Number of frames to profile after a slow frame, by default 10
+        """
+        self.directory = directory
+        self.budget = budget
+        self.top_n = top_n
+        self.profile_frames = profile_frames
+        # Kept frames, slowest first
+        self.slow: list[SlowFrame] = []
+        self.slow_frames = 0
+        self.profiled_frames = 0
+        self._armed = 0
+        self._profile: cProfile.Profile = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, frame: int):
+        """Called before processing the state of frame."""
+        # pylint: disable=unused-argument
+        if self._armed <= 0 or self._profile is not None:
+            return
+        p = cProfile.Profile()
+        try:
+            p.enable()
+        except ValueError as e:
+            # Another profiler is active
+            lg.warning("can't profile frame: %s", e)
+            self._armed = 0
+            return
+        self._profile = p
+
+    def finish(self, frame: int, duration: float) -> bool:
+        """Called after processing the state of frame.
+
+        Returns
+        -------
+        bool
+            True if the profile of the frame was kept.
+        """
+        slow = duration > self.budget
+        self.slow_frames += slow
+        p, self._profile = self._profile, None
+        if p is None:
+            if slow:
+                self._armed = self.profile_frames
+            return False
+        text = finish_profiler(p)
+        self._armed -= 1
+        self.profiled_frames += 1
+        if not slow or (
+            len(self.slow) >= self.top_n and duration <= self.slow[-1].duration
+        ):
+            return False
+        base = os.path.join(self.directory, f"frame_{frame}")
+        p.dump_stats(f"{base}.pstats")
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(f"frame={frame} duration={duration:f}\n{text}")
+        self.slow.append(SlowFrame(frame, duration, f"{base}.pstats"))
+        self.slow.sort(key=lambda x: -x.duration)
+        for x in self.slow[self.top_n :]:
+            for path in (x.path, x.path.replace(".pstats", ".txt")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        del self.slow[self.top_n :]
+        lg.info("profiled slow frame %d (%f s): %s", frame, duration, base)
+        return True
+
+    def close(self):
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile = None
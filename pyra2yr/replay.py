@@ -0,0 +1,404 @@
+import gzip
+import logging as lg
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal.encoder import _VarintBytes
+from google.protobuf.json_format import MessageToDict
+from google.protobuf.message import Message
+from ra2yrproto import ra2yr
+
+from pyra2yr.delta import is_delta_replay, read_delta_messages
+from pyra2yr.util import read_raw_messages
+from pyra2yr.wire import peek_state_header
+
+
+def _peek_frame(m: bytes) -> int:
+    return peek_state_header(m)["current_frame"]
+
+
+def filter_frames(
+    messages: Iterable[bytes],
+    from_frame: int = 0,
+    to_frame: int = None,
+    every: int = 1,
+    frame_of=_peek_frame,
+) -> Iterator[bytes]:
+    """Filter serialized GameStates by frame without decoding them.
+
+    Parameters
+    ----------
+    messages : Iterable[bytes]
+        Serialized states, e.g. from ``read_raw_messages``.
+    from_frame : int, optional
+        First frame to include, by default 0
+    to_frame : int, optional
+        Last frame to include, by default None (no limit)
+    every : int, optional
+        Minimum frame distance between included states, by default 1
+    frame_of : Callable, optional
+        Function to get frame number of a message. By default, read it from
+        serialized GameState.
+
+    Yields
+    ------
+    Iterator[bytes]
+        Serialized states within the range.
+    """
+    next_frame = from_frame
+    for m in messages:
+        frame = frame_of(m)
+        if to_frame is not None and frame > to_frame:
+            break
+        if frame < next_frame:
+            continue
+        next_frame = frame + max(every, 1)
+        yield m
+
+
+def check_field_path(path: str, descriptor=ra2yr.GameState.DESCRIPTOR):
+    """Check that dotted field path, like "objects.health" is valid.
+
+    Raises
+    ------
+    ValueError
+        If path doesn't refer to an existing field.
+    """
+    for k in path.split("."):
+        if descriptor is None or k not in descriptor.fields_by_name:
+            raise ValueError(f"invalid field path: {path}")
+        descriptor = descriptor.fields_by_name[k].message_type
+
+
+def select_field(m: Message, path: list[str]):
+    """Get value of a field path from a message. Repeated message fields along
+    the path are mapped element-wise to lists.
+
+    Parameters
+    ----------
+    m : Message
+        Message to select from
+    path : list[str]
+        Field names, e.g. ["objects", "health"]
+
+    Returns
+    -------
+    Any
+        JSON serializable value.
+    """
+    k, rest = path[0], path[1:]
+    fd = m.DESCRIPTOR.fields_by_name[k]
+    v = getattr(m, k)
+    if fd.message_type is None:
+        return list(v) if fd.label == FieldDescriptor.LABEL_REPEATED else v
+
+    def sel(x):
+        if rest:
+            return select_field(x, rest)
+        return MessageToDict(x, preserving_proto_field_name=True)
+
+    if fd.label == FieldDescriptor.LABEL_REPEATED:
+        return [sel(x) for x in v]
+    return sel(v)
+
+
+def iter_headers(f) -> Iterator[dict[str, int]]:
+    """Iterate over current_frame, stage and crc of each state in a replay.
+    States in full state replays aren't decoded.
+
+    Parameters
+    ----------
+    f : gzip.GzipFile
+        Decompressed replay stream
+    """
+    if is_delta_replay(f):
+        for s in read_delta_messages(f):
+            yield {"current_frame": s.current_frame, "stage": s.stage, "crc": s.crc}
+    else:
+        for m in read_raw_messages(f):
+            yield peek_state_header(m)
+
+
+def first_divergent_frame(paths: list[str | Path]) -> int | None:
+    """Find the first frame present in all replays where the CRCs differ.
+
+    Replays are streamed in lockstep and reading stops at the first
+    divergence.
+
+    Parameters
+    ----------
+    paths : list[str | Path]
+        Replay paths
+
+    Returns
+    -------
+    int | None
+        The frame, or None if CRCs match on all common frames.
+    """
+    files = [gzip.open(p, "rb") for p in paths]
+    try:
+        its = [iter_headers(f) for f in files]
+        cur = [next(it, None) for it in its]
+        while all(cur):
+            frame = max(h["current_frame"] for h in cur)
+            for i, it in enumerate(its):
+                while cur[i] and cur[i]["current_frame"] < frame:
+                    cur[i] = next(it, None)
+            if not all(cur):
+                break
+            if any(h["current_frame"] != frame for h in cur):
+                continue
+            if len(set(h["crc"] for h in cur)) > 1:
+                return frame
+            cur = [next(it, None) for it in its]
+        return None
+    finally:
+        for f in files:
+            f.close()
+
+
+def read_state_at(path: str | Path, frame: int) -> ra2yr.GameState | None:
+    """Decode the state at given frame, skipping others without decoding."""
+    with gzip.open(path, "rb") as f:
+        if is_delta_replay(f):
+            return next(
+                (s for s in read_delta_messages(f) if s.current_frame == frame), None
+            )
+        m = next(filter_frames(read_raw_messages(f), frame, frame), None)
+        return ra2yr.GameState.FromString(m) if m is not None else None
+
+
+def _json_value(fd: FieldDescriptor, v):
+    if fd.message_type is None:
+        return list(v) if fd.label == FieldDescriptor.LABEL_REPEATED else v
+    if fd.label == FieldDescriptor.LABEL_REPEATED:
+        return [MessageToDict(x, preserving_proto_field_name=True) for x in v]
+    return MessageToDict(v, preserving_proto_field_name=True)
+
+
+def diff_messages(a: Message, b: Message) -> dict[str, list]:
+    """Get differing fields of two messages of the same type.
+
+    Returns
+    -------
+    dict[str, list]
+        Mapping from field name to values in a and b.
+    """
+    res = {}
+    for fd in a.DESCRIPTOR.fields:
+        va, vb = getattr(a, fd.name), getattr(b, fd.name)
+        if va != vb:
+            res[fd.name] = [_json_value(fd, va), _json_value(fd, vb)]
+    return res
+
+
+def _index_by(items: Iterable[Message], key: Callable) -> dict:
+    """Map items by key. Items with equal keys, like idle factories of a
+    house, are told apart by occurrence, as ``"<key>#<n>"``."""
+    res = {}
+    for x in items:
+        k = key(x)
+        n = 1
+        while k in res:
+            k = f"{key(x)}#{n}"
+            n += 1
+        res[k] = x
+    return res
+
+
+def _diff_keyed(xs: Iterable[Message], ys: Iterable[Message], key: Callable) -> dict:
+    A = _index_by(xs, key)
+    B = _index_by(ys, key)
+    changed = {}
+    for k in A.keys() & B.keys():
+        d = diff_messages(A[k], B[k])
+        if d:
+            changed[k] = d
+    return {
+        "only_a": sorted(A.keys() - B.keys(), key=str),
+        "only_b": sorted(B.keys() - A.keys(), key=str),
+        "changed": changed,
+    }
+
+
+def diff_states(a: ra2yr.GameState, b: ra2yr.GameState) -> dict:
+    """Structural difference of objects, houses and factories of two states.
+    Objects and houses are matched by their pointers, factories by
+    ``"<owner>/<object>"``.
+
+    Returns
+    -------
+    dict
+        For each of "objects", "houses" and "factories", keys present only
+        in a or b, and differing fields of items present in both.
+    """
+    return {
+        "objects": _diff_keyed(a.objects, b.objects, lambda x: x.pointer_self),
+        "houses": _diff_keyed(a.houses, b.houses, lambda x: x.self),
+        "factories": _diff_keyed(
+            a.factories, b.factories, lambda x: f"{x.owner}/{x.object}"
+        ),
+    }
+
+
+def rotated_path(path: str | Path, index: int) -> Path:
+    """Insert rotation index before the suffixes of path, e.g.
+    ``game.pb.gz`` -> ``game.0001.pb.gz``."""
+    path = Path(path)
+    stem, dot, rest = path.name.partition(".")
+    return path.with_name(f"{stem}.{index:04d}{dot}{rest}")
+
+
+class ReplayRecorder:
+    """Append game states to gzip compressed, length-delimited replay files
+    readable by ``read_protobuf_messages``.
+
+    Serialization, compression and disk writes happen in a background thread.
+    States are passed through a bounded queue. If the queue is full, the state
+    is dropped instead of blocking the caller.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_queue: int = 256,
+        max_bytes: int = None,
+        max_frames: int = None,
+        compresslevel: int = 6,
+    ):
+        """
+        Parameters
+        ----------
+        path : str | Path
+            Output path. If rotation is enabled, a running index is inserted
+            to the file name (see ``rotated_path``).
+        max_queue : int, optional
+            Maximum number of states waiting to be written, by default 256
+        max_bytes : int, optional
+            Rotate after file grows past this many (compressed) bytes, by
+            default None (no limit)
+        max_frames : int, optional
+            Rotate after this many states have been written to a file, by
+            default None (no limit)
+        compresslevel : int, optional
+            gzip compression level, by default 6
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+        self.compresslevel = compresslevel
+        self.dropped = 0
+        self.written = 0
+        self.paths: list[Path] = []
+        # Exception that stopped the writer thread
+        self.error: Exception = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread = None
+        self._raw = None
+        self._f = None
+        self._file_frames = 0
+
+    @property
+    def rotate(self) -> bool:
+        return self.max_bytes is not None or self.max_frames is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write pending states and close the current file. Blocks until the
+        writer thread has finished."""
+        if not self._thread:
+            return
+        # If the writer has failed, nothing consumes the queue
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        if self.error:
+            lg.error("recorder stopped after failure: %s", self.error)
+
+    def write(self, s: ra2yr.GameState | bytes) -> bool:
+        """Queue state for writing. The state must not be modified afterwards.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState | bytes
+            State or serialized state.
+
+        Returns
+        -------
+        bool
+            False if the queue was full or the writer has failed, and the
+            state was dropped.
+        """
+        if self.error:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(s)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            lg.warning("recorder queue full, dropped=%d", self.dropped)
+            return False
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _open(self):
+        path = self.path
+        if self.rotate:
+            path = rotated_path(self.path, len(self.paths))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._raw = open(path, "wb")  # pylint: disable=consider-using-with
+        self._f = gzip.GzipFile(
+            fileobj=self._raw, mode="wb", compresslevel=self.compresslevel
+        )
+        self._file_frames = 0
+        self.paths.append(path)
+
+    def _close(self):
+        if self._f:
+            self._f.close()
+            self._raw.close()
+            self._f = None
+            self._raw = None
+
+    def _should_rotate(self) -> bool:
+        return (
+            self.max_frames is not None and self._file_frames >= self.max_frames
+        ) or (self.max_bytes is not None and self._raw.tell() >= self.max_bytes)
+
+    def _run(self):
+        try:
+            while True:
+                s = self._queue.get()
+                if s is None:
+                    break
+                if isinstance(s, Message):
+                    s = s.SerializeToString()
+                if self._f is None:
+                    self._open()
+                elif self._should_rotate():
+                    self._close()
+                    self._open()
+                self._f.write(_VarintBytes(len(s)))
+                self._f.write(s)
+                self._file_frames += 1
+                self.written += 1
+        except Exception as e:
+            self.error = e
+            lg.exception("recorder failed")
+        finally:
+            self._close()
@@ -0,0 +1,172 @@
+import asyncio
+import gzip
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+from ra2yrproto import commands_yr, core, ra2yr
+
+from pyra2yr.delta import read_replay
+from pyra2yr.manager import Manager
+
+
+@dataclass
+class RecordedCommand:
+    frame: int
+    command: Any
+
+
+class ReplayClient:
+    """Stand-in for DualClient that records commands instead of sending them.
+
+    Every command succeeds and its result is the command itself. ReadValue
+    queries for the initial game state are answered from ``initial_state``
+    if given.
+    """
+
+    def __init__(self, manager: Manager, initial_state: ra2yr.GameState = None):
+        self.manager = manager
+        self.initial_state = initial_state
+        self.commands: list[RecordedCommand] = []
+
+    def connect(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def exec_command(self, c: Any, timeout: float = None) -> core.CommandResult:
+        # pylint: disable=unused-argument
+        cmd = type(c)()
+        cmd.CopyFrom(c)
+        self.commands.append(RecordedCommand(self.manager.state.s.current_frame, cmd))
+        if (
+            isinstance(cmd, commands_yr.ReadValue)
+            and cmd.data.HasField("initial_game_state")
+            and self.initial_state
+        ):
+            cmd.data.initial_game_state.CopyFrom(self.initial_state)
+        res = core.CommandResult(result_code=core.ResponseCode.OK)
+        res.result.Pack(cmd)
+        return res
+
+    async def exec_command_raw(self, c: Any, timeout: float = None) -> bytes:
+        """Like exec_command, but return the serialized result."""
+        return (await self.exec_command(c, timeout)).SerializeToString()
+
+    async def wait_submitted(self):
+        """Commands are recorded immediately, so nothing is pending."""
+
+
+class ReplayDriver:
+    """Drive a Manager with recorded states instead of a live game.
+
+    States are fed to the manager as fast as it processes them. Outgoing
+    commands are recorded by a ReplayClient that replaces the manager's
+    client. Subsystems of the manager, like its recorder, are started by
+    the first run() and stopped by stop().
+    """
+
+    def __init__(
+        self,
+        manager: Manager,
+        states: Iterable[ra2yr.GameState | bytes],
+        initial_state: ra2yr.GameState = None,
+    ):
+        """
+        Parameters
+        ----------
+        manager : Manager
+            The manager to drive. Must not be started.
+        states : Iterable[ra2yr.GameState | bytes]
+            States to feed. Serialized states are processed with
+            Manager.process_raw().
+        initial_state : ra2yr.GameState, optional
+            State holding object_types and prerequisite_groups, by default None
+        """
+        self.manager = manager
+        self.states = states
+        self.client = ReplayClient(manager, initial_state)
+        self.manager.client = self.client
+        self.processed = 0
+        self.elapsed = 0.0
+        self._started = False
+        if initial_state:
+            manager.state.sc.set_initials(
+                initial_state.object_types, initial_state.prerequisite_groups
+            )
+
+    @property
+    def commands(self) -> list[RecordedCommand]:
+        return self.client.commands
+
+    @property
+    def fps(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    async def run(self, max_states: int = None) -> int:
+        """Feed states to the manager.
+
+        Parameters
+        ----------
+        max_states : int, optional
+            Stop after processing this many states, by default None
+
+        Returns
+        -------
+        int
+            Number of processed states.
+        """
+        if not self._started:
+            self.manager.start_subsystems()
+            self._started = True
+        t = time.perf_counter()
+        try:
+            for s in self.states:
+                if max_states is not None and self.processed >= max_states:
+                    break
+                if isinstance(s, (bytes, memoryview)):
+                    processed = await self.manager.process_raw(s)
+                else:
+                    processed = await self.manager.process_state(s)
+                if processed:
+                    self.processed += 1
+                # Let tasks spawned by step() make progress
+                await asyncio.sleep(0)
+        finally:
+            self.elapsed += time.perf_counter() - t
+        return self.processed
+
+    async def stop(self):
+        """Wait for offloaded decisions, so that their commands are recorded,
+        then stop subsystems of the manager."""
+        if not self._started:
+            return
+        self._started = False
+        if self.manager.offload:
+            await self.manager.offload.join()
+        await self.manager.stop_subsystems()
+
+
+async def run_replay(
+    manager: Manager,
+    path: str | Path,
+    initial_state: ra2yr.GameState = None,
+    max_states: int = None,
+) -> ReplayDriver:
+    """Drive manager with states read from a replay file.
+
+    Returns
+    -------
+    ReplayDriver
+        The driver, holding recorded commands and statistics. It's already
+        stopped.
+    """
+    with gzip.open(path, "rb") as f:
+        D = ReplayDriver(manager, read_replay(f), initial_state)
+        try:
+            await D.run(max_states)
+        finally:
+            await D.stop()
+    return D
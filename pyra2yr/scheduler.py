@@ -0,0 +1,89 @@
+import asyncio
+import heapq
+import itertools
+import logging as lg
+from typing import Awaitable
+
+
+class FrameScheduler:
+    """Buffers awaitables (typically commands) until a target frame.
+
+    Due awaitables are started together as tasks by :meth:`flush`, which the
+    manager calls after processing each state. The caller gets a future that
+    resolves to the awaitable's result.
+    """
+
+    def __init__(self):
+        self._queue: list[tuple[int, int, Awaitable, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def schedule(self, aw: Awaitable, frame: int) -> asyncio.Future:
+        """Schedule awaitable to be started after state for frame has been
+        processed.
+
+        Parameters
+        ----------
+        aw : Awaitable
+            Awaitable to execute, e.g. ``ManagerUtil.attack(...)`` coroutine
+        frame : int
+            Target frame
+
+        Returns
+        -------
+        asyncio.Future
+            Future for the result.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (frame, next(self._seq), aw, fut))
+        return fut
+
+    def flush(self, frame: int) -> int:
+        """Start all awaitables scheduled at or before frame.
+
+        Returns
+        -------
+        int
+            Number of started awaitables.
+        """
+        n = 0
+        while self._queue and self._queue[0][0] <= frame:
+            _, _, aw, fut = heapq.heappop(self._queue)
+            if fut.cancelled():
+                self._close(aw)
+                continue
+            t = asyncio.ensure_future(aw)
+            self._tasks.add(t)
+            t.add_done_callback(lambda t, fut=fut: self._done(t, fut))
+            n += 1
+        return n
+
+    def _done(self, t: asyncio.Task, fut: asyncio.Future):
+        self._tasks.discard(t)
+        if fut.cancelled():
+            return
+        if t.cancelled():
+            fut.cancel()
+        elif t.exception() is not None:
+            fut.set_exception(t.exception())
+        else:
+            fut.set_result(t.result())
+
+    @staticmethod
+    def _close(aw: Awaitable):
+        if asyncio.iscoroutine(aw):
+            aw.close()
+
+    def cancel_all(self):
+        """Cancel pending awaitables and running tasks."""
+        for _, _, aw, fut in self._queue:
+            self._close(aw)
+            fut.cancel()
+        if self._queue:
+            lg.debug("cancelled %d scheduled commands", len(self._queue))
+        self._queue.clear()
+        for t in list(self._tasks):
+            t.cancel()
@@ -0,0 +1,324 @@
+"""Broadcast game states to other processes through shared memory.
+
+The writer (usually the process running Manager) stores each state into a
+ring of slots in a :class:`multiprocessing.shared_memory.SharedMemory` block.
+A slot holds the serialized GameState and the object columns from
+:data:`pyra2yr.columnar.OBJECT_COLUMNS`. Readers map the same block and access
+slots without copying, using a per-slot sequence counter as a seqlock: the
+counter is odd while the slot is written, so a reader retries (or discards
+what it read) if the counter was odd or changed during the read.
+
+Layout: a header of uint64 values, followed by the slots::
+
+    magic, version, num_slots, max_bytes, max_objects, slot_size, head, 0,
+    then for each slot: seq, frame, num_bytes, num_objects
+
+``head`` is the sequence number of the latest complete write, starting from
+1. Write ``n`` goes to slot ``(n - 1) % num_slots``.
+"""
+
+import logging as lg
+import os
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.columnar import OBJECT_COLUMNS, column_arrays
+from pyra2yr.wire_columns import WIRE_DECODE_MIN, ObjectDecoder
+
+MAGIC = 0x50524132595253  # "PRA2YRS"
+VERSION = 1
+_HEADER_FIELDS = 8
+_SLOT_FIELDS = 4
+_HEAD = 6
+# Names of blocks created by SharedStateWriter in this process
+_created: set[str] = set()
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _slot_size(max_bytes: int, max_objects: int) -> int:
+    return sum(
+        _align(np.dtype(t).itemsize * max_objects) for t in OBJECT_COLUMNS.values()
+    ) + _align(max_bytes)
+
+
+@dataclass
+class SharedFrame:
+    """A state read from the ring.
+
+    Unless copied, ``data`` and ``columns`` are views to shared memory, and
+    stay valid only while :meth:`SharedStateReader.is_valid` returns True.
+    """
+
+    seq: int
+    frame: int
+    data: memoryview | bytes
+    columns: dict[str, np.ndarray]
+    slot_seq: int = 0
+
+    def state(self) -> ra2yr.GameState:
+        return ra2yr.GameState.FromString(self.data)
+
+
+class _Ring:
+    def __init__(self, shm: SharedMemory):
+        self.shm = shm
+        hdr = np.ndarray((_HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        if int(hdr[0]) != MAGIC or int(hdr[1]) != VERSION:
+            raise RuntimeError(f"{shm.name} is not a state ring")
+        self.num_slots, self.max_bytes, self.max_objects, self.slot_size = (
+            int(x) for x in hdr[2:6]
+        )
+        self.header = np.ndarray(
+            (_HEADER_FIELDS + _SLOT_FIELDS * self.num_slots,),
+            dtype=np.uint64,
+            buffer=shm.buf,
+        )
+        self.meta = self.header[_HEADER_FIELDS:].reshape((self.num_slots, _SLOT_FIELDS))
+        base = _align(self.header.nbytes)
+        self.columns: list[dict[str, np.ndarray]] = []
+        self.data: list[memoryview] = []
+        for i in range(self.num_slots):
+            off = base + i * self.slot_size
+            cols = {}
+            for k, dtype in OBJECT_COLUMNS.items():
+                cols[k] = np.ndarray(
+                    (self.max_objects,), dtype=dtype, buffer=shm.buf, offset=off
+                )
+                off += _align(cols[k].nbytes)
+            self.columns.append(cols)
+            self.data.append(shm.buf[off : off + self.max_bytes])
+
+    @property
+    def head(self) -> int:
+        return int(self.header[_HEAD])
+
+    def release(self):
+        # Views must be released before the block can be closed
+        for d in self.data:
+            d.release()
+        self.data.clear()
+        self.columns.clear()
+        self.meta = self.header = None
+
+
+class SharedStateWriter:
+    """Write states into a shared memory ring."""
+
+    def __init__(
+        self,
+        name: str = None,
+        num_slots: int = 4,
+        max_bytes: int = 1 << 22,
+        max_objects: int = 4096,
+    ):
+        """
+        Parameters
+        ----------
+        name : str, optional
+            Shared memory block name, by default a random one
+        num_slots : int, optional
+            Number of frames kept in the ring, by default 4
+        max_bytes : int, optional
+            Maximum size of a serialized state, by default 4 MiB
+        max_objects : int, optional
+            Maximum number of objects in a state, by default 4096
+        """
+        num_slots = max(num_slots, 1)
+        header_size = _align(8 * (_HEADER_FIELDS + _SLOT_FIELDS * num_slots))
+        slot_size = _slot_size(max_bytes, max_objects)
+        self.shm = SharedMemory(
+            name=name, create=True, size=header_size + num_slots * slot_size
+        )
+        hdr = np.ndarray((_HEADER_FIELDS,), dtype=np.uint64, buffer=self.shm.buf)
+        hdr[:] = [MAGIC, VERSION, num_slots, max_bytes, max_objects, slot_size, 0, 0]
+        del hdr
+        _created.add(self.shm.name)
+        self._ring = _Ring(self.shm)
+        self._decoder = ObjectDecoder(OBJECT_COLUMNS, capacity=max_objects)
+        self.written = 0
+        self.skipped = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, s: ra2yr.GameState, raw: bytes = None) -> bool:
+        """Write state to the next slot.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state
+        raw : bytes, optional
+            Serialized form of s, by default serialize s
+
+        Returns
+        -------
+        bool
+            False if the state didn't fit in a slot and was skipped.
+        """
+        R = self._ring
+        if raw is None:
+            raw = s.SerializeToString()
+        if len(raw) > R.max_bytes or len(s.objects) > R.max_objects:
+            self.skipped += 1
+            lg.error(
+                "state too large for shared memory ring: bytes=%d objects=%d",
+                len(raw),
+                len(s.objects),
+            )
+            return False
+        seq = self.written + 1
+        i = (seq - 1) % R.num_slots
+        meta = R.meta[i]
+        meta[0] += 1
+        n = len(s.objects)
+        if n >= WIRE_DECODE_MIN:
+            cols = self._decoder.decode(raw).columns
+        else:
+            cols = column_arrays(s.objects, OBJECT_COLUMNS)
+        for k, v in cols.items():
+            R.columns[i][k][:n] = v
+        R.data[i][: len(raw)] = raw
+        meta[1:] = [s.current_frame, len(raw), n]
+        meta[0] += 1
+        R.header[_HEAD] = seq
+        self.written = seq
+        return True
+
+    def close(self):
+        """Release and remove the shared memory block."""
+        if self._ring is None:
+            return
+        self._ring.release()
+        self._ring = None
+        self.shm.close()
+        self.shm.unlink()
+        _created.discard(self.shm.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedStateReader:
+    """Read states from a ring created by SharedStateWriter in another
+    process."""
+
+    def __init__(self, name: str):
+        if sys.version_info >= (3, 13):
+            # pylint: disable-next=unexpected-keyword-arg
+            self.shm = SharedMemory(name=name, track=False)
+        else:
+            # The writer owns the block, but without this, the resource
+            # tracker of this process would remove it on exit. Blocks created
+            # in this process (or its parent, if forked) are tracked by the
+            # same tracker and are left registered. Only POSIX blocks are
+            # tracked, under their name with a leading slash.
+            self.shm = SharedMemory(name=name)
+            if os.name == "posix" and self.shm.name not in _created:
+                resource_tracker.unregister(f"/{self.shm.name}", "shared_memory")
+        self._ring = _Ring(self.shm)
+
+    @property
+    def head(self) -> int:
+        """Sequence number of the latest write, 0 if nothing was written."""
+        return self._ring.head
+
+    def is_valid(self, f: SharedFrame) -> bool:
+        """Check that the slot of an uncopied frame wasn't overwritten."""
+        R = self._ring
+        return int(R.meta[(f.seq - 1) % R.num_slots][0]) == f.slot_seq
+
+    def read(
+        self, seq: int = None, copy: bool = True, timeout: float = 1.0
+    ) -> SharedFrame | None:
+        """Read a state.
+
+        Parameters
+        ----------
+        seq : int, optional
+            Sequence number to read, by default the latest
+        copy : bool, optional
+            Copy data out of shared memory, by default True. If False, the
+            returned frame references shared memory, and must be checked with
+            is_valid() after use.
+        timeout : float, optional
+            Seconds to retry while the slot is being written, by default 1.0.
+            A writer that died mid-write leaves the slot locked for good.
+
+        Returns
+        -------
+        SharedFrame | None
+            The state, or None if it's not (or no longer) available, or the
+            slot stayed locked until timeout.
+        """
+        R = self._ring
+        head = R.head
+        if seq is None:
+            seq = head
+        if seq <= 0 or seq > head or head - seq >= R.num_slots:
+            return None
+        i = (seq - 1) % R.num_slots
+        meta = R.meta[i]
+        deadline = time.monotonic() + timeout
+        while True:
+            s1 = int(meta[0])
+            if s1 % 2 == 0:
+                frame, num_bytes, n = (int(x) for x in meta[1:])
+                data = R.data[i][:num_bytes]
+                cols = {k: v[:n] for k, v in R.columns[i].items()}
+                if copy:
+                    data = bytes(data)
+                    cols = {k: v.copy() for k, v in cols.items()}
+                if int(meta[0]) == s1:
+                    # The slot may have been reused for a newer write
+                    if R.head - seq >= R.num_slots:
+                        return None
+                    return SharedFrame(seq, frame, data, cols, s1)
+            # Write in progress
+            if time.monotonic() > deadline:
+                lg.error("slot %d of %s stayed locked, writer died?", i, self.shm.name)
+                return None
+            time.sleep(0)
+
+    def wait(
+        self, after: int = 0, timeout: float = None, interval: float = 0.001
+    ) -> int:
+        """Wait until a write newer than ``after`` is available.
+
+        Returns
+        -------
+        int
+            The latest sequence number, or ``after`` on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (head := self.head) <= after:
+            if deadline is not None and time.monotonic() > deadline:
+                return after
+            time.sleep(interval)
+        return head
+
+    def close(self):
+        if self._ring is None:
+            return
+        self._ring.release()
+        self._ring = None
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
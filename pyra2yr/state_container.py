@@ -60,6 +60,14 @@ class StateContainer:
 
     def set_state(self, s: ra2yr.GameState):
         self.s.CopyFrom(s)
+        self._check_state()
+
+    def parse_state(self, buf: bytes | memoryview):
+        """Set state from serialized GameState, decoding it in place."""
+        self.s.ParseFromString(buf)
+        self._check_state()
+
+    def _check_state(self):
         if any(o.pointer_technotypeclass == 0 for o in self.s.objects):
             raise RuntimeError(
                 f"zero TC, frame={self.s.current_frame}, objs={self.s.objects}"
@@ -1,8 +1,10 @@
 import numpy as np
 from ra2yrproto import ra2yr
 
+from pyra2yr.columnar import object_columns
 from pyra2yr.state_container import StateContainer
 from pyra2yr.util import coord2array
+from pyra2yr.wire_columns import ObjectDecoder
 
 
 class ViewObject:
@@ -120,3 +122,187 @@ class MapData:
                 [m_min[0] - 1, m_min[1] - 1],  # TR
             ]
         )
+
+
+def object_changes(
+    prev_ptr: np.ndarray, prev_rows: np.ndarray, ptr: np.ndarray, rows: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compare per-object rows of two frames.
+
+    Parameters
+    ----------
+    prev_ptr : np.ndarray
+        Sorted object pointers of the previous frame
+    prev_rows : np.ndarray
+        2-D array of rows of the previous frame, aligned with prev_ptr
+    ptr : np.ndarray
+        Sorted object pointers of the current frame
+    rows : np.ndarray
+        Rows of the current frame, aligned with ptr
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Masks of previous rows to remove and current rows to add. Changed
+        objects are in both. Of duplicate pointers, only the first ones are
+        compared, the rest are removed and added.
+    """
+    unique = not (np.any(prev_ptr[1:] == prev_ptr[:-1]) or np.any(ptr[1:] == ptr[:-1]))
+    _, i_old, i_new = np.intersect1d(
+        prev_ptr, ptr, assume_unique=unique, return_indices=True
+    )
+    same = np.all(prev_rows[i_old] == rows[i_new], axis=1)
+    removed = np.ones(prev_ptr.size, dtype=bool)
+    removed[i_old[same]] = False
+    added = np.ones(ptr.size, dtype=bool)
+    added[i_new[same]] = False
+    return removed, added
+
+
+def lookup(keys: np.ndarray, order: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Map values of x to their positions in keys, -1 if not found.
+
+    Parameters
+    ----------
+    keys : np.ndarray
+        Keys
+    order : np.ndarray
+        ``np.argsort(keys)``
+    x : np.ndarray
+        Values to look up
+    """
+    if keys.size == 0:
+        return np.full(x.shape, -1, dtype=np.int64)
+    sk = keys[order]
+    i = np.clip(np.searchsorted(sk, x), 0, sk.size - 1)
+    return np.where(sk[i] == x, order[i], -1)
+
+
+class ObservationEncoder:
+    """Encode game states into fixed shape feature arrays.
+
+    Arrays are preallocated and updated in place from the objects that were
+    added, removed or changed since the previous state:
+
+    - ``planes``: object counts per house and map cell, shape
+      ``(num_houses, width, height)``, indexed like ``MapData.ind2sub``, i.e.
+      ``planes[h, y, x]`` for cell coordinates ``(x, y)``
+    - ``type_counts``: object counts per house and type class, shape
+      ``(num_houses, num_types)``
+    - ``economy``: ``ECONOMY_FIELDS`` of each house, shape ``(num_houses, 3)``
+
+    Objects of unknown houses are ignored, as are unknown types (for
+    type_counts) and coordinates outside the map (for planes).
+
+    Reading object fields dominates the cost of an update. Pass the serialized
+    state to update() or encode() to decode large states with ObjectDecoder
+    instead.
+    """
+
+    ECONOMY_FIELDS = ["money", "power_output", "power_drain"]
+    COLUMNS = {
+        "pointer_self": np.uint32,
+        "pointer_house": np.uint32,
+        "pointer_technotypeclass": np.uint32,
+        "coordinates.x": np.int32,
+        "coordinates.y": np.int32,
+    }
+
+    def __init__(
+        self,
+        map_data: MapData,
+        houses: list[int],
+        type_classes: list[int] = None,
+        cell_size: int = 256,
+    ):
+        """
+        Parameters
+        ----------
+        map_data : MapData
+            The map
+        houses : list[int]
+            Pointers of encoded houses, in plane order
+        type_classes : list[int], optional
+            Pointers of type classes to count, by default none
+        cell_size : int, optional
+            Cell size in coordinate units, by default 256
+        """
+        self.shape = (map_data.m.width, map_data.m.height)
+        self.cell_size = cell_size
+        self.houses = np.asarray(houses, dtype=np.int64)
+        self.type_classes = np.asarray(type_classes or [], dtype=np.int64)
+        nh = len(self.houses)
+        self.planes = np.zeros((nh,) + self.shape, dtype=np.float32)
+        self.type_counts = np.zeros((nh, len(self.type_classes)), dtype=np.int32)
+        self.economy = np.zeros((nh, len(self.ECONOMY_FIELDS)), dtype=np.float32)
+        self._h_order = np.argsort(self.houses)
+        self._t_order = np.argsort(self.type_classes)
+        self._decoder = ObjectDecoder(self.COLUMNS)
+        self.reset()
+
+    def reset(self):
+        self.planes[:] = 0
+        self.type_counts[:] = 0
+        self.economy[:] = 0
+        self._ptr = np.empty(0, dtype=np.int64)
+        self._code = np.empty((0, 4), dtype=np.int64)
+
+    def _encode(
+        self, s: ra2yr.GameState, raw: bytes = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        cols = object_columns(s, raw, self._decoder)
+        n = len(s.objects)
+        ptr = cols["pointer_self"].astype(np.int64)
+        code = np.empty((n, 4), dtype=np.int64)
+        code[:, 0] = lookup(self.houses, self._h_order, cols["pointer_house"])
+        code[:, 1] = lookup(
+            self.type_classes, self._t_order, cols["pointer_technotypeclass"]
+        )
+        y = cols["coordinates.y"].astype(np.int64) // self.cell_size
+        x = cols["coordinates.x"].astype(np.int64) // self.cell_size
+        inside = (y >= 0) & (y < self.shape[0]) & (x >= 0) & (x < self.shape[1])
+        code[:, 2] = np.where(inside, y, -1)
+        code[:, 3] = np.where(inside, x, -1)
+        o = np.argsort(ptr, kind="stable")
+        return ptr[o], code[o]
+
+    def _apply(self, code: np.ndarray, sign: int):
+        h, t, y, x = code.T
+        m = (h >= 0) & (y >= 0)
+        np.add.at(self.planes, (h[m], y[m], x[m]), sign)
+        m = (h >= 0) & (t >= 0)
+        np.add.at(self.type_counts, (h[m], t[m]), sign)
+
+    def update(self, s: ra2yr.GameState, raw: bytes = None):
+        """Update arrays to match the state.
+
+        Parameters
+        ----------
+        s : ra2yr.GameState
+            The state
+        raw : bytes, optional
+            Serialized form of s, see object_columns
+        """
+        ptr, code = self._encode(s, raw)
+        removed, added = object_changes(self._ptr, self._code, ptr, code)
+        self._apply(self._code[removed], -1)
+        self._apply(code[added], 1)
+        self._ptr, self._code = ptr, code
+
+        hi = lookup(
+            self.houses,
+            self._h_order,
+            np.fromiter((h.self for h in s.houses), dtype=np.int64),
+        )
+        for i, h in zip(hi, s.houses):
+            if i >= 0:
+                self.economy[i] = [getattr(h, k) for k in self.ECONOMY_FIELDS]
+
+    def encode(self, s: ra2yr.GameState, raw: bytes = None) -> dict[str, np.ndarray]:
+        """Update and return the arrays. They are reused by later calls."""
+        self.update(s, raw)
+        return {
+            "planes": self.planes,
+            "type_counts": self.type_counts,
+            "economy": self.economy,
+        }
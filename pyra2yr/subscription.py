@@ -0,0 +1,127 @@
+import asyncio
+from enum import Enum
+
+from ra2yrproto import ra2yr
+
+
+class SubscriptionPolicy(Enum):
+    """Which states a subscriber receives."""
+
+    # Only the most recent state. Unconsumed older states are replaced.
+    LATEST = 0
+    # Every state in order. If the queue is full, the oldest state is dropped.
+    EVERY = 1
+
+
+class Subscription:
+    """Per-subscriber bounded queue of game states.
+
+    Publishing never blocks, so a slow subscriber can't stall the publisher.
+    Instead, states that don't fit the queue are dropped and counted in
+    ``dropped``. Iterating the subscription yields states until it's closed.
+
+    Example
+    -------
+    >>> async with manager.states(SubscriptionPolicy.EVERY, every=2) as sub:
+    ...     async for s in sub:
+    ...         ...
+    """
+
+    def __init__(
+        self,
+        policy: SubscriptionPolicy = SubscriptionPolicy.LATEST,
+        every: int = 1,
+        maxsize: int = 64,
+    ):
+        """
+        Parameters
+        ----------
+        policy : SubscriptionPolicy, optional
+            By default SubscriptionPolicy.LATEST
+        every : int, optional
+            Receive a state only if at least this many frames have passed since
+            the previously accepted one, by default 1
+        maxsize : int, optional
+            Queue size with SubscriptionPolicy.EVERY, by default 64
+        """
+        self.policy = policy
+        self.every = max(every, 1)
+        self.maxsize = 1 if policy == SubscriptionPolicy.LATEST else max(maxsize, 1)
+        # Bounded by _put, so that the end marker always fits
+        self._queue = asyncio.Queue()
+        self._last_frame = None
+        self._closed = False
+        # Number of accepted, delivered and dropped states, and the largest
+        # observed backlog.
+        self.accepted = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.max_lag = 0
+        self.on_close = None
+
+    @property
+    def lag(self) -> int:
+        """Number of states waiting to be consumed."""
+        return self._queue.qsize() - int(self._closed)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _put(self, s: ra2yr.GameState):
+        if self._queue.qsize() >= self.maxsize:
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(s)
+
+    def publish(self, s: ra2yr.GameState):
+        """Queue state without blocking. The state must not be modified
+        afterwards."""
+        if self._closed:
+            return
+        if (
+            self._last_frame is not None
+            and 0 <= s.current_frame - self._last_frame < self.every
+        ):
+            return
+        self._last_frame = s.current_frame
+        self.accepted += 1
+        self._put(s)
+        self.max_lag = max(self.max_lag, self.lag)
+
+    def close(self):
+        """Stop iteration once queued states have been consumed."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put_nowait(None)
+        if self.on_close:
+            self.on_close(self)
+
+    async def get(self) -> ra2yr.GameState | None:
+        """Wait for the next state. Returns None if the subscription is
+        closed."""
+        if self._closed and self._queue.empty():
+            return None
+        s = await self._queue.get()
+        if s is None:
+            # Keep the sentinel for subsequent calls
+            self._queue.put_nowait(None)
+            return None
+        self.delivered += 1
+        return s
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ra2yr.GameState:
+        s = await self.get()
+        if s is None:
+            raise StopAsyncIteration
+        return s
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
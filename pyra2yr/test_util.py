@@ -1,14 +1,18 @@
 import asyncio
+import gzip
+import tempfile
 import unittest
 import logging
 import json
 import os
+import shutil
 from functools import cached_property
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 
 import numpy as np
+from google.protobuf.internal.encoder import _VarintBytes
 from ra2yrproto import commands_yr, core, ra2yr
 
 from pyra2yr.manager import Manager, ManagerUtil, PlaceStrategy
@@ -358,3 +362,50 @@ class SingleStepManager(ExManager):
 
     async def step(self, s: ra2yr.GameState):
         self.crcs.append(s.crc)
+
+
+def make_states(num_frames: int, num_objects: int = 4) -> list[ra2yr.GameState]:
+    """Make states of a synthetic game, with two houses and a factory."""
+    res = []
+    for f in range(num_frames):
+        s = ra2yr.GameState(current_frame=f + 1, stage=ra2yr.STAGE_INGAME, crc=f * 7)
+        s.houses.add(self=1, current_player=True, money=1000 - f)
+        s.houses.add(self=2, money=2000 + f)
+        for i in range(num_objects):
+            s.objects.add(
+                pointer_self=100 + i,
+                pointer_house=1 + i % 2,
+                pointer_technotypeclass=10 + i,
+                health=100 - (f if i == 0 else 0),
+                coordinates=ra2yr.Coordinates(x=256 * i + f, y=512, z=0),
+            )
+        s.factories.add(object=100, owner=1, completed=f % 2 == 1)
+        res.append(s)
+    return res
+
+
+def write_replay(path: Path, states: list[ra2yr.GameState]):
+    with gzip.open(path, "wb") as f:
+        for s in states:
+            b = s.SerializeToString()
+            f.write(_VarintBytes(len(b)) + b)
+
+
+def make_map(width: int = 16, height: int = 12) -> MapData:
+    return MapData(ra2yr.MapData(width=width, height=height))
+
+
+def decide(s: ra2yr.GameState) -> list:
+    """Decision function for offload tests. Must be importable by workers."""
+    return [commands_yr.AddMessage(message=str(s.current_frame))]
+
+
+class ReplayTestCase(unittest.TestCase):
+    """Test case with a temporary directory and a replay of make_states(10)."""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.states = make_states(10)
+        self.replay_path = self.tmp / "replay.pb.gz"
+        write_replay(self.replay_path, self.states)
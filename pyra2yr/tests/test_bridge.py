@@ -0,0 +1,41 @@
+import asyncio
+import unittest
+
+from ra2yrproto import commands_yr
+
+from pyra2yr.bridge import SyncBridge
+from pyra2yr.manager import Manager
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+
+
+class SyncBridgeTest(ReplayTestCase):
+    def test_sync_bridge(self):
+        def worker(bridge: SyncBridge):
+            s = bridge.wait_state(after_frame=9, timeout=5)
+            res = bridge.submit_many(
+                [commands_yr.AddMessage(message=str(i)) for i in range(3)]
+            ).result(timeout=5)
+            bridge.close()
+            with self.assertRaises(TimeoutError):
+                bridge.wait_state(after_frame=s.current_frame, timeout=5)
+            return s.current_frame, [r.message for r in res]
+
+        async def run():
+            m = Manager()
+            bridge = SyncBridge(m)
+            t = asyncio.create_task(asyncio.to_thread(worker, bridge))
+            await asyncio.sleep(0)
+            D = await run_replay(m, self.replay_path)
+            return D, await t
+
+        D, (frame, msgs) = asyncio.run(run())
+        self.assertEqual(frame, 10)
+        self.assertEqual(msgs, ["0", "1", "2"])
+        self.assertEqual(
+            sum(isinstance(c.command, commands_yr.AddMessage) for c in D.commands), 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+import numpy as np
+
+from pyra2yr.columnar import ColumnarTables, load_columns
+from pyra2yr.test_util import ReplayTestCase
+
+
+class ColumnarTest(ReplayTestCase):
+    def test_columnar_roundtrip(self):
+        T = ColumnarTables()
+        for s in self.states:
+            T.append(s)
+        for p in [self.tmp / "out.npz", self.tmp / "out"]:
+            T.save(p)
+            C = load_columns(p)
+            self.assertEqual(C["objects.frame"].size, 40)
+            self.assertEqual(C["houses.money"].size, 20)
+            np.testing.assert_array_equal(
+                C["frames.current_frame"], np.arange(1, 11, dtype=np.uint32)
+            )
+            ix = C["objects.pointer_self"] == 100
+            np.testing.assert_array_equal(C["objects.health"][ix], 100 - np.arange(10))
+            np.testing.assert_array_equal(C["objects.coordinates.x"][ix], np.arange(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
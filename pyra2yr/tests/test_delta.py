@@ -0,0 +1,42 @@
+import gzip
+import unittest
+
+from pyra2yr.delta import DeltaReplayWriter, read_replay
+from pyra2yr.test_util import ReplayTestCase, make_states
+
+
+class DeltaTest(ReplayTestCase):
+    def test_delta_roundtrip(self):
+        states = make_states(12)
+        # Remove, add, reorder and reset fields to default values
+        del states[3].objects[1]
+        states[4].objects.add(pointer_self=200, pointer_technotypeclass=5)
+        states[5].objects[0].health = 0
+        states[5].objects[0].ClearField("coordinates")
+        states[6].objects.reverse()
+        states[7].objects.add(pointer_self=100)
+        p = self.tmp / "delta.pb.gz"
+        with DeltaReplayWriter(p, keyframe_interval=5) as w:
+            for s in states:
+                w.write(s)
+        with gzip.open(p, "rb") as f:
+            self.assertEqual(list(read_replay(f)), states)
+        with gzip.open(self.replay_path, "rb") as f:
+            self.assertEqual(list(read_replay(f)), self.states)
+
+    def test_delta_duplicate_pointers(self):
+        states = make_states(4)
+        # Duplicates force a keyframe, then the duplicated object is removed
+        states[1].objects.add(pointer_self=101, health=1)
+        for s in states[2:]:
+            del s.objects[1]
+        p = self.tmp / "delta.pb.gz"
+        with DeltaReplayWriter(p, keyframe_interval=10) as w:
+            for s in states:
+                w.write(s)
+        with gzip.open(p, "rb") as f:
+            self.assertEqual(list(read_replay(f)), states)
+
+
+if __name__ == "__main__":
+    unittest.main()
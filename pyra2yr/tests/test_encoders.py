@@ -0,0 +1,142 @@
+import unittest
+
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.influence import InfluenceMap, disk_kernel
+from pyra2yr.pathing import DistanceFields, blocked_mask, distance_field
+from pyra2yr.state_objects import MapData, ObservationEncoder
+from pyra2yr.test_util import make_map, make_states
+from pyra2yr.wire_columns import WIRE_DECODE_MIN
+
+
+class EncoderTest(unittest.TestCase):
+    def setUp(self):
+        self.states = make_states(10, num_objects=6)
+        # Remove and add objects between frames
+        for s in self.states[4:]:
+            del s.objects[2]
+        for s in self.states[6:]:
+            s.objects.add(
+                pointer_self=999,
+                pointer_house=2,
+                pointer_technotypeclass=11,
+                coordinates=ra2yr.Coordinates(x=256 * 3, y=256 * 7),
+            )
+
+    def encoder(self) -> ObservationEncoder:
+        return ObservationEncoder(make_map(), houses=[2, 1], type_classes=[10, 11])
+
+    def test_incremental_matches_full(self):
+        E = self.encoder()
+        for s in self.states:
+            res = E.encode(s)
+            F = self.encoder()
+            full = F.encode(s)
+            for k, v in full.items():
+                np.testing.assert_array_equal(res[k], v)
+        self.assertEqual(E.planes.sum(), len(self.states[-1].objects))
+        self.assertEqual(E.planes[0, 7, 3], 1)
+        np.testing.assert_array_equal(E.type_counts, [[0, 2], [1, 0]])
+        self.assertEqual(E.economy[1, 0], self.states[-1].houses[0].money)
+
+    def test_duplicate_pointers(self):
+        E = self.encoder()
+        for s in self.states:
+            s.objects[1].pointer_self = s.objects[0].pointer_self
+            E.encode(s)
+            full = self.encoder().encode(s)
+            for k, v in full.items():
+                np.testing.assert_array_equal(E.encode(s)[k], v)
+        self.assertEqual(E.planes.sum(), len(self.states[-1].objects))
+
+    def test_wire_decode(self):
+        states = make_states(3, num_objects=WIRE_DECODE_MIN)
+        E = self.encoder()
+        F = self.encoder()
+        for s in states:
+            raw = s.SerializeToString()
+            for k, v in E.encode(s, raw).items():
+                np.testing.assert_array_equal(F.encode(s)[k], v)
+        I = InfluenceMap(make_map(), houses=[1, 2])
+        J = InfluenceMap(make_map(), houses=[1, 2])
+        for s in states:
+            I.update(s, s.SerializeToString())
+            J.update(s)
+            np.testing.assert_allclose(I.maps, J.maps)
+
+    def test_grid_matches_ind2sub(self):
+        M = make_map()
+        E = self.encoder()
+        E.update(self.states[0])
+        _, y, x = np.nonzero(E.planes)
+        I = np.ravel_multi_index((y, x), E.shape)
+        np.testing.assert_array_equal(M.ind2sub(I), np.c_[x, y])
+
+    def test_influence_map(self):
+        def brute(s, houses, ranges, default):
+            res = np.zeros((len(houses), 16, 12))
+            for o in s.objects:
+                if o.pointer_house not in houses or o.health == 0:
+                    continue
+                r = ranges.get(o.pointer_technotypeclass, default)
+                K = disk_kernel(r)
+                y, x = o.coordinates.y // 256, o.coordinates.x // 256
+                for (dy, dx), k in np.ndenumerate(K):
+                    yy, xx = y + dy - r, x + dx - r
+                    if 0 <= yy < 16 and 0 <= xx < 12:
+                        res[houses.index(o.pointer_house), yy, xx] += o.health * k
+            return res
+
+        ranges = {10: 2, 11: 3}
+        I = InfluenceMap(make_map(), houses=[1, 2], ranges=ranges, default_range=1)
+        for s in self.states:
+            I.update(s)
+            np.testing.assert_allclose(I.maps, brute(s, [1, 2], ranges, 1), atol=1e-9)
+        # Only the first update is a full recompute
+        self.assertEqual(I.recomputes, 1)
+        I.reset()
+        I.update(self.states[-1])
+        np.testing.assert_allclose(
+            I.maps, brute(self.states[-1], [1, 2], ranges, 1), atol=1e-9
+        )
+        np.testing.assert_allclose(I.threat(1), I.maps[1])
+        np.testing.assert_allclose(I.influence(1), I.maps[0] - I.maps[1])
+
+    def test_distance_field(self):
+        m = ra2yr.MapData(width=5, height=6)
+        for i in range(30):
+            m.cells.add(index=i)
+        # Wall at y=2, except for x=5
+        for x in range(5):
+            m.cells[2 * 6 + x].passability = 1
+        M = MapData(m)
+        blocked = blocked_mask(M)
+        self.assertEqual(blocked.sum(), 5)
+        dist = distance_field(blocked, [[0, 0]], diagonal=False)
+        self.assertEqual(dist[0, 5], 5)
+        self.assertEqual(dist[3, 0], 3 + 5 + 5)
+        self.assertTrue(np.isinf(dist[2, 0]))
+        self.assertEqual(distance_field(blocked, [[0, 0]])[3, 0], 5 + 5)
+        # No diagonal step between two blocked cells
+        corner = np.zeros((3, 3), dtype=bool)
+        corner[0, 1] = corner[1, 0] = True
+        self.assertTrue(np.isinf(distance_field(corner, [[0, 0]])[1, 1]))
+        corner[0, 1] = False
+        self.assertEqual(distance_field(corner, [[0, 0]])[1, 1], 1)
+
+        D = DistanceFields(blocked, diagonal=False)
+        a = D.get(np.array([[0, 0]]))
+        self.assertIs(D.get([[0, 0]]), a)
+        D.get([[0, 4]])
+        # Closing the gap affects both fields
+        blocked[2, 5] = True
+        self.assertEqual(D.update_blocked(blocked), 2)
+        self.assertTrue(np.isinf(D.get([[0, 0]])[3, 0]))
+        b = D.get([[0, 4]])
+        # Only the field of the lower half sees this one
+        blocked[4, 5] = True
+        self.assertEqual(D.update_blocked(blocked), 1)
+        self.assertIs(D.get([[0, 0]]), D.get([[0, 0]]))
+        self.assertIsNot(D.get([[0, 4]]), b)
+        self.assertTrue(np.isinf(D.get([[0, 4]])[4, 5]))
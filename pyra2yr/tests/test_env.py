@@ -0,0 +1,40 @@
+import contextlib
+import unittest
+
+import numpy as np
+from ra2yrproto import commands_yr
+
+from pyra2yr.env import VecEnv, env_configs
+from pyra2yr.game import Game
+from pyra2yr.test_util import BaseGameTest
+from pyra2yr.util import setup_logging
+
+
+def add_message(M, a):
+    # pylint: disable=unused-argument
+    return [commands_yr.AddMessage(message=f"action {int(a)}")]
+
+
+class VecEnvTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        setup_logging()
+
+    async def test_vec_env(self):
+        num_envs = 2
+        cfgs = env_configs(BaseGameTest.get_test_config(), num_envs)
+        with contextlib.ExitStack() as stack:
+            games = [
+                stack.enter_context(Game(c, project=f"env{i}"))
+                for i, c in enumerate(cfgs)
+            ]
+            env = VecEnv.from_games(games, act=add_message, frame_skip=2)
+            obs = await env.reset()
+            self.assertEqual(obs.shape[0], num_envs)
+            frames = obs[:, 0]
+            for k in range(10):
+                obs, rewards, dones, infos = await env.step(np.full(num_envs, k))
+                self.assertEqual(rewards.shape, (num_envs,))
+                self.assertFalse(np.any(dones))
+                self.assertTrue(all(not x["errors"] for x in infos))
+            np.testing.assert_array_equal(obs[:, 0], frames + 20)
+            await env.close()
@@ -0,0 +1,34 @@
+import asyncio
+import unittest
+
+from pyra2yr.hub import StateHub, read_hub_states
+from pyra2yr.manager import Manager
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.subscription import SubscriptionPolicy
+from pyra2yr.test_util import ReplayTestCase
+
+
+class StateHubTest(ReplayTestCase):
+    def test_state_hub(self):
+        path = self.tmp / "hub.sock"
+
+        async def read(n):
+            return [x async for x in read_hub_states(path)][:n]
+
+        async def run():
+            async with StateHub(path, client_queue_size=16) as hub:
+                sub = hub.states(SubscriptionPolicy.EVERY)
+                t = asyncio.create_task(read(10))
+                while hub.num_clients == 0:
+                    await asyncio.sleep(0.01)
+                await run_replay(Manager(hub=hub), self.replay_path)
+                self.assertEqual(sub.lag, 10)
+            return await t
+
+        states = asyncio.run(run())
+        self.assertEqual([s.current_frame for s in states], list(range(1, 11)))
+        self.assertEqual(states[-1], self.states[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
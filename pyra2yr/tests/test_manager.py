@@ -0,0 +1,153 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from ra2yrproto import commands_yr, core, ra2yr
+
+from pyra2yr.manager import Manager, PipelinePolicy
+from pyra2yr.polling import FixedPoller
+from pyra2yr.replay_driver import ReplayDriver
+from pyra2yr.subscription import SubscriptionPolicy
+from pyra2yr.test_util import make_states
+
+
+class PipelineManager(Manager):
+    """Fetches states of a replay, one per fetch. Stops after the last one."""
+
+    def __init__(self, states: list[ra2yr.GameState], step_time: float, **kwargs):
+        super().__init__(poller=FixedPoller(1000), **kwargs)
+        self.raw = [s.SerializeToString() for s in states]
+        self.step_time = step_time
+        self.fetches = 0
+        self.frames = []
+
+    async def fetch_state_raw(self) -> memoryview:
+        await asyncio.sleep(0.001)
+        i = min(self.fetches, len(self.raw) - 1)
+        self.fetches += 1
+        if self.fetches >= len(self.raw):
+            self._stop.set()
+        return memoryview(self.raw[i])
+
+    async def step(self, s: ra2yr.GameState):
+        self.frames.append(s.current_frame)
+        await asyncio.sleep(self.step_time)
+
+
+class ManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.states = make_states(10)
+
+    def run_pipeline(self, **kwargs) -> PipelineManager:
+        m = PipelineManager(make_states(20), **kwargs)
+        ReplayDriver(m, [])
+        asyncio.run(m.mainloop())
+        return m
+
+    def test_pipeline_latest(self):
+        m = self.run_pipeline(step_time=0.01, pipeline=PipelinePolicy.LATEST)
+        processed = m.metrics.get("pyra2yr_processed_states_total").value
+        self.assertEqual(m.frames, sorted(set(m.frames)))
+        self.assertEqual(m.frames[-1], 20)
+        self.assertGreater(m.discarded_states, 0)
+        self.assertEqual(processed + m.discarded_states, m.fetches)
+
+    def test_pipeline_every(self):
+        m = self.run_pipeline(
+            step_time=0.005, pipeline=PipelinePolicy.EVERY, pipeline_depth=2
+        )
+        self.assertEqual(m.frames, list(range(1, 21)))
+        self.assertEqual(m.discarded_states, 0)
+        self.assertEqual(m.fetches, 20)
+
+    def test_no_pipeline(self):
+        m = self.run_pipeline(step_time=0.0)
+        self.assertEqual(m.frames, list(range(1, 21)))
+
+    def test_pipeline_fetch_error(self):
+        class M(PipelineManager):
+            async def fetch_state_raw(self) -> memoryview:
+                if self.fetches == 5:
+                    raise RuntimeError("failed to get state")
+                return await super().fetch_state_raw()
+
+        for policy in PipelinePolicy:
+            m = M(make_states(20), step_time=0.0, pipeline=policy)
+            ReplayDriver(m, [])
+            with self.assertRaisesRegex(RuntimeError, "failed to get state"):
+                asyncio.run(asyncio.wait_for(m.mainloop(), 5))
+            self.assertLessEqual(len(m.frames), 5)
+
+    def test_lockstep(self):
+        events = []
+
+        class Conn:  # pylint: disable=too-few-public-methods
+            """Command connection that acknowledges sends after a delay."""
+
+            async def send_message(self, msg: bytes):
+                # pylint: disable=unused-argument
+                await asyncio.sleep(0.01)
+                events.append("ack")
+                res = core.Response()
+                res.body.Pack(core.RunCommandAck())
+                return SimpleNamespace(data=res.SerializeToString())
+
+        class M(PipelineManager):
+            async def fetch_state_raw(self) -> memoryview:
+                events.append("fetch")
+                return await super().fetch_state_raw()
+
+            async def step(self, s: ra2yr.GameState):
+                # Send without awaiting, like a fire and forget command
+                asyncio.create_task(
+                    self.client.run_client_command(commands_yr.AddMessage())
+                )
+
+        async def run():
+            m = M(make_states(5), step_time=0.0, lockstep=True)
+            # Keep the DualClient, whose wait_submitted() is under test, but
+            # skip fetching initials from the game
+            initial = ra2yr.GameState()
+            initial.object_types.add(pointer_self=10)
+            m.state.sc.set_initials(initial.object_types, initial.prerequisite_groups)
+            m.client.conns["command"] = Conn()
+            await m.mainloop()
+
+        asyncio.run(run())
+        # Each fetch waits for the command sent by the previous step
+        self.assertEqual(events, ["fetch"] + ["ack", "fetch"] * 4)
+
+    def test_process_raw(self):
+        raw = [s.SerializeToString() for s in self.states]
+        # Duplicates aren't decoded nor processed
+        raw = [memoryview(x) for x in raw[:3] + raw[2:]]
+
+        class M(Manager):
+            def __init__(self):
+                super().__init__()
+                self.frames = []
+
+            async def step(self, s: ra2yr.GameState):
+                self.frames.append(s.current_frame)
+
+        async def run():
+            m = M()
+            sub = m.states(SubscriptionPolicy.EVERY)
+            D = ReplayDriver(m, raw)
+            await D.run()
+            sub.close()
+            return m, D, [s async for s in sub]
+
+        m, D, states = asyncio.run(run())
+        self.assertEqual(D.processed, 10)
+        self.assertEqual(m.frames, list(range(1, 11)))
+        self.assertEqual(m.metrics.get("pyra2yr_duplicate_states_total").value, 1)
+        self.assertEqual(m.metrics.get("pyra2yr_state_decode_seconds").count, 10)
+        # Subscribers get copies of the reused current state
+        self.assertEqual([s.current_frame for s in states], list(range(1, 11)))
+        self.assertEqual(states, self.states)
+        self.assertEqual(m.state.s, self.states[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+
+from ra2yrproto import ra2yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.memory import MemoryMonitor
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.subscription import SubscriptionPolicy
+from pyra2yr.test_util import ReplayTestCase
+
+
+class MemoryTest(ReplayTestCase):
+    def test_memory_monitor(self):
+        leak = []
+
+        class M(Manager):
+            async def step(self, s: ra2yr.GameState):
+                leak.append(bytearray(100000))
+
+        async def run():
+            m = M(memory=MemoryMonitor(every=3, top_n=3))
+            sub = m.states(SubscriptionPolicy.EVERY)
+            await run_replay(m, self.replay_path)
+            return m, sub
+
+        m, sub = asyncio.run(run())
+        self.assertEqual(m.memory.snapshots, 4)
+        self.assertIn(__file__, str(m.memory.growth[0].traceback))
+        self.assertGreaterEqual(m.memory.growth[0].size_diff, 3 * 100000)
+        get = m.metrics.get
+        self.assertEqual(
+            get("pyra2yr_container_size", container="subscriptions").value, 1
+        )
+        self.assertEqual(
+            get("pyra2yr_container_size", container="subscription_queues").value,
+            sub.lag,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
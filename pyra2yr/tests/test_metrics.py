@@ -0,0 +1,33 @@
+import asyncio
+import unittest
+
+from pyra2yr.manager import Manager
+from pyra2yr.metrics import Histogram, write_prometheus
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+
+
+class MetricsTest(ReplayTestCase):
+    def test_metrics(self):
+        H = Histogram(buckets=(1, 2, 4))
+        for v in (0.5, 1.5, 1.5, 3, 10):
+            H.observe(v)
+        self.assertEqual(H.counts, [1, 2, 1, 1])
+        self.assertEqual(H.quantile(0.5), 1.75)
+        self.assertEqual(H.quantile(1.0), 4)
+
+        m = Manager()
+        D = asyncio.run(run_replay(m, self.replay_path))
+        R = m.metrics
+        self.assertEqual(R.get("pyra2yr_processed_states_total").value, D.processed)
+        self.assertEqual(R.get("pyra2yr_step_seconds").count, D.processed)
+        self.assertEqual(R.get("pyra2yr_current_frame").value, 10)
+        path = self.tmp / "metrics.prom"
+        write_prometheus([R], str(path))
+        text = path.read_text()
+        self.assertIn("pyra2yr_processed_states_total 10\n", text)
+        self.assertIn('pyra2yr_step_seconds_bucket{le="+Inf"} 10\n', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from ra2yrproto import core
+
+from pyra2yr.network import DualClient
+from pyra2yr.test_util import make_states
+
+
+class NetworkTest(unittest.TestCase):
+    def setUp(self):
+        self.states = make_states(10)
+
+    def test_scan_poll_results(self):
+        results = [
+            core.CommandResult(command_id=i, result_code=core.ResponseCode.OK)
+            for i in (5, 6)
+        ]
+        results[1].result.Pack(self.states[3])
+        pr = core.PollResults()
+        pr.result.results.extend(results)
+        res = core.Response()
+        res.body.Pack(pr)
+        buf = res.SerializeToString()
+        C = DualClient("0.0.0.0", 0)
+        locs = C.scan_poll_results(buf)
+        self.assertEqual(
+            [core.CommandResult.FromString(buf[a:b]) for a, b in locs], results
+        )
+        res.body.Pack(core.PollResults())
+        self.assertEqual(C.scan_poll_results(res.SerializeToString()), [])
+        res.body.Pack(core.RunCommandAck(id=1))
+        for b in (res.SerializeToString(), b""):
+            with self.assertRaises(RuntimeError):
+                C.scan_poll_results(b)
+
+
+if __name__ == "__main__":
+    unittest.main()
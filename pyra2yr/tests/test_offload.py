@@ -0,0 +1,33 @@
+import asyncio
+import unittest
+
+from ra2yrproto import commands_yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.offload import StepOffload
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase, decide
+
+
+class OffloadTest(ReplayTestCase):
+    def test_offload(self):
+        async def run():
+            off = StepOffload(decide, max_in_flight=1)
+            D = await run_replay(Manager(offload=off), self.replay_path)
+            return D, off
+
+        D, off = asyncio.run(run())
+        msgs = [
+            int(c.command.message)
+            for c in D.commands
+            if isinstance(c.command, commands_yr.AddMessage)
+        ]
+        self.assertEqual(off.errors, 0)
+        self.assertEqual(off.submitted + off.skipped, 10)
+        self.assertEqual(len(msgs), off.completed)
+        self.assertEqual(msgs, sorted(msgs))
+        self.assertEqual(msgs[-1], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
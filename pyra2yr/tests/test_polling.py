@@ -0,0 +1,104 @@
+import math
+import unittest
+from unittest import mock
+
+from ra2yrproto import ra2yr
+
+from pyra2yr import polling
+from pyra2yr.polling import AdaptivePoller, FixedPoller
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, dt: float):
+        self.now += dt
+
+
+def ingame(frame: int) -> ra2yr.GameState:
+    return ra2yr.GameState(current_frame=frame, stage=ra2yr.STAGE_INGAME)
+
+
+class PollerTest(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeTime()
+        patcher = mock.patch.object(polling, "time", self.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_game(
+        self, P: AdaptivePoller, fps: float, duration: float, latency: float = 0.002
+    ) -> list[int]:
+        """Fetch states of a game running at fps. Returns fetched frames."""
+        start = self.time.now
+        frames = []
+        while self.time.now - start < duration:
+            self.time.advance(P.delay())
+            P.fetch_started()
+            frame = math.floor((self.time.now + latency / 2 - start) * fps) + 1
+            self.time.advance(latency)
+            P.observe(ingame(frame))
+            frames.append(frame)
+        return frames
+
+    def test_fixed_poller(self):
+        P = FixedPoller(10)
+        self.assertEqual(P.delay(), 0.0)
+        P.fetch_started()
+        self.assertAlmostEqual(P.delay(), 0.1)
+        self.time.advance(0.04)
+        self.assertAlmostEqual(P.delay(), 0.06)
+        self.time.advance(1.0)
+        self.assertEqual(P.delay(), 0.0)
+
+    def test_adaptive_tracks_frame_rate(self):
+        P = AdaptivePoller(max_frequency=60, initial_fps=60)
+        frames = self.run_game(P, fps=15, duration=10)
+        self.assertAlmostEqual(P.fps, 15, delta=0.5)
+        tail = frames[len(frames) // 2 :]
+        # Few duplicate fetches, and no frames skipped
+        self.assertLess(len(tail), 1.3 * (tail[-1] - tail[0] + 1))
+        self.assertEqual(set(range(tail[0], tail[-1] + 1)) - set(tail), set())
+
+    def test_adaptive_max_frequency(self):
+        P = AdaptivePoller(max_frequency=20, initial_fps=60)
+        frames = self.run_game(P, fps=60, duration=5)
+        self.assertLessEqual(len(frames), 5 * 20 + 2)
+
+    def test_adaptive_backoff_and_idle(self):
+        P = AdaptivePoller(idle_interval=0.5)
+        frame = self.run_game(P, fps=30, duration=1)[-1]
+        # Game is paused
+        delays = []
+        for _ in range(8):
+            self.time.advance(P.delay())
+            P.fetch_started()
+            P.observe(ingame(frame))
+            delays.append(P.delay())
+        self.assertGreaterEqual(P.duplicates, 8)
+        self.assertEqual(delays, sorted(delays))
+        self.assertEqual(delays[-1], 0.5)
+        P.observe(None)
+        self.assertEqual(P.delay(), 0.5)
+        self.assertEqual(P.duplicates, 0)
+        P.observe(ra2yr.GameState(current_frame=5, stage=ra2yr.STAGE_LOADING))
+        self.assertEqual(P.delay(), 0.5)
+
+    def test_adaptive_restart(self):
+        P = AdaptivePoller(max_frequency=60, initial_fps=30)
+        self.run_game(P, fps=30, duration=2)
+        # Game restarts from frame 1, which isn't a duplicate
+        P.fetch_started()
+        P.observe(ingame(1))
+        self.assertEqual(P.duplicates, 0)
+        self.assertLess(P.delay(), 2 / 30)
+        frames = self.run_game(P, fps=30, duration=1)
+        self.assertEqual(set(range(frames[0], frames[-1] + 1)) - set(frames), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
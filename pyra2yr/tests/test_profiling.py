@@ -0,0 +1,34 @@
+import asyncio
+import time
+import unittest
+
+from ra2yrproto import ra2yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.profiling import SlowFrameProfiler
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+
+
+class ProfilingTest(ReplayTestCase):
+    def test_slow_frame_profiler(self):
+        class M(Manager):
+            async def step(self, s: ra2yr.GameState):
+                if s.current_frame in (3, 5, 6, 7):
+                    time.sleep(0.01 * s.current_frame)
+
+        P = SlowFrameProfiler(str(self.tmp / "prof"), budget=0.02, top_n=2)
+        asyncio.run(run_replay(M(profiler=P), self.replay_path))
+        # Frame 3 arms the profiler, so frames 4-10 are profiled.
+        self.assertEqual(P.slow_frames, 4)
+        self.assertEqual(P.profiled_frames, 7)
+        self.assertEqual([x.frame for x in P.slow], [7, 6])
+        self.assertEqual(
+            sorted(p.name for p in (self.tmp / "prof").iterdir()),
+            ["frame_6.pstats", "frame_6.txt", "frame_7.pstats", "frame_7.txt"],
+        )
+        self.assertIn("step", (self.tmp / "prof" / "frame_7.txt").read_text())
+
+
+if __name__ == "__main__":
+    unittest.main()
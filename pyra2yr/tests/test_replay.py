@@ -0,0 +1,120 @@
+import gzip
+import json
+import sys
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest import mock
+
+from ra2yrproto import ra2yr
+
+from pyra2yr.main import parse_args
+from pyra2yr.replay import (
+    ReplayRecorder,
+    diff_states,
+    filter_frames,
+    first_divergent_frame,
+    read_state_at,
+    select_field,
+)
+from pyra2yr.test_util import ReplayTestCase, make_states, write_replay
+from pyra2yr.util import read_protobuf_messages, read_raw_messages
+
+
+class ReplayTest(ReplayTestCase):
+    def test_read_replay(self):
+        with gzip.open(self.replay_path, "rb") as f:
+            self.assertEqual(list(read_protobuf_messages(f)), self.states)
+
+    def test_filter_frames(self):
+        with gzip.open(self.replay_path, "rb") as f:
+            res = list(filter_frames(read_raw_messages(f), 2, 9, 3))
+        frames = [ra2yr.GameState.FromString(m).current_frame for m in res]
+        self.assertEqual(frames, [2, 5, 8])
+
+    def test_select_field(self):
+        s = self.states[3]
+        self.assertEqual(select_field(s, ["houses", "money"]), [997, 2003])
+        self.assertEqual(select_field(s, ["objects", "coordinates", "x"])[1], 259)
+        self.assertEqual(select_field(s, ["current_frame"]), 4)
+
+    def test_parse_args(self):
+        def parse(*argv):
+            with mock.patch.object(sys, "argv", ["pyra2yr", *argv]):
+                return parse_args()
+
+        def error(*argv) -> str:
+            err = StringIO()
+            with redirect_stderr(err), self.assertRaises(SystemExit):
+                parse(*argv)
+            return err.getvalue()
+
+        args = parse("-d", "-i", "x", "--fields", "objects.health")
+        self.assertEqual(args.fields, ["objects.health"])
+        self.assertIn(
+            "invalid field path: objects.bogus",
+            error("-d", "-i", "x", "--fields", "objects.bogus"),
+        )
+        self.assertIn(
+            "--convert-delta requires -o", error("--convert-delta", "-i", "x")
+        )
+
+    def test_recorder(self):
+        R = ReplayRecorder(self.tmp / "rec.pb.gz", max_frames=4)
+        R.start()
+        for s in self.states:
+            self.assertTrue(R.write(s))
+        R.stop()
+        self.assertEqual([p.name for p in R.paths][-1], "rec.0002.pb.gz")
+        res = []
+        for p in R.paths:
+            with gzip.open(p, "rb") as f:
+                res.extend(read_protobuf_messages(f))
+        self.assertEqual(res, self.states)
+
+    def test_recorder_failure(self):
+        (self.tmp / "file").touch()
+        R = ReplayRecorder(self.tmp / "file" / "rec.pb.gz", max_queue=1)
+        R.start()
+        for s in self.states:
+            R.write(s)
+        # Must not block on the full queue of the failed writer
+        R.stop()
+        self.assertIsInstance(R.error, OSError)
+        self.assertEqual(R.written, 0)
+        self.assertGreaterEqual(R.dropped, 8)
+        self.assertEqual(R.qsize(), 0)
+
+    def test_compare_replays(self):
+        states = make_states(10)
+        for s in states[6:]:
+            s.crc += 1
+            s.objects[2].health -= 1
+        p = self.tmp / "other.pb.gz"
+        # Missing frames are skipped
+        write_replay(p, states[:2] + states[4:])
+        frame = first_divergent_frame([self.replay_path, p])
+        self.assertEqual(frame, 7)
+        a, b = (read_state_at(x, frame) for x in [self.replay_path, p])
+        self.assertEqual(a, self.states[6])
+        d = diff_states(a, b)
+        self.assertEqual(d["objects"]["changed"], {102: {"health": [100, 99]}})
+        self.assertFalse(d["houses"]["changed"])
+        self.assertIsNone(first_divergent_frame([self.replay_path] * 2))
+
+    def test_diff_idle_factories(self):
+        a, b = make_states(1) + make_states(1)
+        for s in (a, b):
+            s.factories.add(owner=1)
+            s.factories.add(owner=2)
+        b.factories[1].progress_timer = 5
+        b.factories.add(owner=2)
+        d = diff_states(a, b)["factories"]
+        self.assertEqual(d["changed"], {"1/0": {"progress_timer": [0, 5]}})
+        self.assertEqual(d["only_a"], [])
+        self.assertEqual(d["only_b"], ["2/0#1"])
+        self.assertEqual(json.loads(json.dumps(d))["only_b"], ["2/0#1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import gzip
+import unittest
+
+from ra2yrproto import ra2yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.replay import ReplayRecorder
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+from pyra2yr.util import read_protobuf_messages
+
+
+class ReplayDriverTest(ReplayTestCase):
+    def test_replay_driver(self):
+        class M(Manager):
+            def __init__(self):
+                super().__init__()
+                self.frames = []
+
+            async def step(self, s: ra2yr.GameState):
+                self.frames.append(s.current_frame)
+                await self.M.add_message(message=f"frame {s.current_frame}")
+
+        initial = ra2yr.GameState()
+        initial.object_types.add(pointer_self=10, name="Foo")
+        initial.prerequisite_groups.power.append(10)
+        m = M()
+        D = asyncio.run(run_replay(m, self.replay_path, initial_state=initial))
+        self.assertEqual(D.processed, 10)
+        self.assertEqual(m.frames, list(range(1, 11)))
+        self.assertEqual([c.frame for c in D.commands], list(range(1, 11)))
+        self.assertEqual(D.commands[-1].command.message, "frame 10")
+
+    def test_recorder(self):
+        path = self.tmp / "recorded.pb.gz"
+        m = Manager(recorder=ReplayRecorder(path))
+        asyncio.run(run_replay(m, self.replay_path))
+        self.assertEqual(m.recorder.dropped, 0)
+        with gzip.open(path, "rb") as f:
+            self.assertEqual(list(read_protobuf_messages(f)), self.states)
+
+
+if __name__ == "__main__":
+    unittest.main()
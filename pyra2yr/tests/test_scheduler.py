@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+from ra2yrproto import commands_yr, ra2yr
+
+from pyra2yr.manager import Manager
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+
+
+class SchedulerTest(ReplayTestCase):
+    def test_execute_at(self):
+        class M(Manager):
+            def __init__(self):
+                super().__init__()
+                self.futs = []
+                self.error = None
+
+            async def step(self, s: ra2yr.GameState):
+                if s.current_frame == 2:
+                    for f in (5, 3, 5):
+                        self.futs.append(
+                            self.M.execute_at(self.M.add_message(message=str(f)), f)
+                        )
+                    try:
+                        self.M.execute_at(self.M.add_message(message="x"), 1)
+                    except RuntimeError as e:
+                        self.error = e
+
+        m = M()
+        D = asyncio.run(run_replay(m, self.replay_path))
+        self.assertEqual(
+            [
+                (c.frame, c.command.message)
+                for c in D.commands
+                if isinstance(c.command, commands_yr.AddMessage)
+            ],
+            [(3, "3"), (5, "5"), (5, "5")],
+        )
+        self.assertTrue(all(f.done() for f in m.futs))
+        self.assertIsInstance(m.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
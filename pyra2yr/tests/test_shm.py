@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+
+from pyra2yr.shm import SharedStateReader, SharedStateWriter
+from pyra2yr.test_util import make_states
+
+
+class SharedMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.states = make_states(10)
+
+    def test_shared_memory_ring(self):
+        with SharedStateWriter(num_slots=3, max_bytes=4096, max_objects=8) as w:
+            with SharedStateReader(w.name) as r:
+                self.assertIsNone(r.read())
+                for s in self.states:
+                    self.assertTrue(w.write(s))
+                self.assertEqual(r.head, 10)
+                f = r.read()
+                self.assertEqual(f.frame, 10)
+                self.assertEqual(f.state(), self.states[-1])
+                np.testing.assert_array_equal(
+                    f.columns["coordinates.x"],
+                    [o.coordinates.x for o in self.states[-1].objects],
+                )
+                self.assertEqual(r.read(8).frame, 8)
+                self.assertIsNone(r.read(7))
+                view = r.read(copy=False)
+                self.assertTrue(r.is_valid(view))
+                for s in self.states[:3]:
+                    w.write(s)
+                self.assertFalse(r.is_valid(view))
+                del view
+                self.assertFalse(w.write(make_states(1, num_objects=9)[0]))
+
+    def test_locked_slot(self):
+        with SharedStateWriter(num_slots=2, max_bytes=4096, max_objects=8) as w:
+            with SharedStateReader(w.name) as r:
+                w.write(self.states[0])
+                # Writer died in the middle of a write: the sequence counter
+                # of slot 0 follows the 8 header fields
+                hdr = np.ndarray((9,), dtype=np.uint64, buffer=w.shm.buf)
+                hdr[8] += 1
+                del hdr
+                with self.assertLogs(level="ERROR"):
+                    self.assertIsNone(r.read(timeout=0.01))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,7 @@ class SingleStepTest(BaseGameTest):
 
     async def run_one(self, max_frames: int):
         with Game(cfg=self.get_test_config()):
-            M = SingleStepManager(port=14521)
+            M = SingleStepManager(port=14521, lockstep=True)
             M.start()
             q = await M.M.set_single_step(True)
             self.assertTrue(q.single_step)
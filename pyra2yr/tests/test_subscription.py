@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+
+from pyra2yr.manager import Manager
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.subscription import SubscriptionPolicy
+from pyra2yr.test_util import ReplayTestCase
+
+
+class SubscriptionTest(ReplayTestCase):
+    def test_subscription(self):
+        async def consume(sub, delay=0.0):
+            frames = []
+            async for s in sub:
+                frames.append(s.current_frame)
+                await asyncio.sleep(delay)
+            return frames
+
+        async def run():
+            m = Manager()
+            every = m.states(SubscriptionPolicy.EVERY, every=2)
+            latest = m.states()
+            tasks = [
+                asyncio.create_task(consume(every)),
+                asyncio.create_task(consume(latest, 0.1)),
+            ]
+            await run_replay(m, self.replay_path)
+            every.close()
+            latest.close()
+            self.assertEqual(m.subscriptions, [])
+            return every, latest, await asyncio.gather(*tasks)
+
+        every, latest, (f_every, f_latest) = asyncio.run(run())
+        self.assertEqual(f_every, [1, 3, 5, 7, 9])
+        self.assertEqual(every.dropped, 0)
+        self.assertEqual(f_latest[-1], 10)
+        self.assertLess(len(f_latest), 10)
+        self.assertEqual(latest.dropped + latest.delivered, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import asyncio
+import json
+import unittest
+
+from pyra2yr.manager import Manager
+from pyra2yr.replay_driver import run_replay
+from pyra2yr.test_util import ReplayTestCase
+from pyra2yr.tracing import ChromeTracer
+
+
+class TracingTest(ReplayTestCase):
+    def test_chrome_trace(self):
+        path = self.tmp / "trace.json"
+        with ChromeTracer(str(path), pid=1) as tracer:
+            m = Manager(tracer=tracer)
+            asyncio.run(run_replay(m, self.replay_path))
+            sid = tracer.begin("AddMessage")
+            tracer.mark(sid, "ack")
+            tracer.end(sid, "AddMessage")
+        # Dropped after close
+        tracer.begin("late")
+        tracer.close()
+        events = json.loads(path.read_text())
+        self.assertEqual(len(events), tracer.num_events)
+        spans = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(
+            [e["args"]["frame"] for e in spans if e["name"] == "step"],
+            list(range(1, 11)),
+        )
+        for e in spans:
+            self.assertGreaterEqual(e["dur"], 0)
+        self.assertEqual([e["ph"] for e in events if e.get("id") == sid], list("bne"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from ra2yrproto import commands_yr
+
+from pyra2yr.test_util import make_states
+from pyra2yr.wire import find_field, peek_state_header
+
+
+class WireTest(unittest.TestCase):
+    def setUp(self):
+        self.states = make_states(10)
+
+    def test_peek_state_header(self):
+        for s in self.states:
+            h = peek_state_header(s.SerializeToString())
+            self.assertEqual(
+                h,
+                {"current_frame": s.current_frame, "stage": s.stage, "crc": s.crc},
+            )
+
+    def test_find_field(self):
+        s = self.states[0]
+        buf = commands_yr.GetGameState(state=s).SerializeToString()
+        num = commands_yr.GetGameState.DESCRIPTOR.fields_by_name["state"].number
+        start, stop = find_field(buf, num)
+        self.assertEqual(buf[start:stop], s.SerializeToString())
+        self.assertIsNone(find_field(buf, num + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
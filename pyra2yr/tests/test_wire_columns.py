@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+from ra2yrproto import ra2yr
+
+from pyra2yr.columnar import OBJECT_COLUMNS, ColumnarTables, column_arrays
+from pyra2yr.test_util import make_states
+from pyra2yr.wire_columns import WIRE_DECODE_MIN, ObjectDecoder
+
+
+class ObjectDecoderTest(unittest.TestCase):
+    def test_object_decoder(self):
+        s = make_states(1, num_objects=WIRE_DECODE_MIN + 10)[0]
+        for i, o in enumerate(s.objects):
+            o.coordinates.z = -i
+            o.pointer_self = 0xFFFF0000 + i
+            o.current_mission = i % 5
+            o.object_type = i % 3
+            o.passengers.extend(range(i % 4))
+        # Fields missing from the message default to zero
+        s.objects[1].ClearField("coordinates")
+        raw = s.SerializeToString()
+        D = ObjectDecoder(OBJECT_COLUMNS, capacity=2)
+        objs = D.decode(raw)
+        self.assertEqual(len(objs), len(s.objects))
+        for k, v in column_arrays(s.objects, OBJECT_COLUMNS).items():
+            np.testing.assert_array_equal(objs[k], v, err_msg=k)
+        self.assertEqual(objs.message(3), s.objects[3])
+        self.assertEqual(objs.state, s)
+        self.assertEqual(len(D.decode(ra2yr.GameState().SerializeToString())), 0)
+
+        T = [ColumnarTables(), ColumnarTables()]
+        T[0].append(s)
+        T[1].append(s, raw)
+        a, b = (t.arrays() for t in T)
+        for k, v in a.items():
+            np.testing.assert_array_equal(v, b[k], err_msg=k)
+
+    def test_empty_messages(self):
+        D = ObjectDecoder(OBJECT_COLUMNS)
+        # An empty object followed by another field of GameState
+        s = ra2yr.GameState(
+            objects=[ra2yr.Object(pointer_self=3), ra2yr.Object()],
+            current_frame=1234,
+        )
+        objs = D.decode(s.SerializeToString())
+        for k, v in column_arrays(s.objects, OBJECT_COLUMNS).items():
+            np.testing.assert_array_equal(objs[k], v, err_msg=k)
+        # An empty nested message followed by another field of the object
+        s = ra2yr.GameState(
+            objects=[ra2yr.Object(coordinates=ra2yr.Coordinates(), health=5)]
+        )
+        self.assertTrue(s.objects[0].HasField("coordinates"))
+        objs = D.decode(s.SerializeToString())
+        for k, v in column_arrays(s.objects, OBJECT_COLUMNS).items():
+            np.testing.assert_array_equal(objs[k], v, err_msg=k)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import itertools
+import json
+import logging as lg
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """Tracer that records nothing. Used by default, so that instrumented code
+    needs no checks. See ChromeTracer.
+
+    Spans on the same track must nest. Operations that overlap with others,
+    like commands awaited concurrently, use begin()/mark()/end(), which
+    produce async events identified by the returned id.
+    """
+
+    enabled = False
+
+    def __init__(self):
+        # Game frame, added to every event
+        self.frame = -1
+
+    def span(self, name: str, track: str = "main", **args):
+        """Context manager recording the duration of the block."""
+        # pylint: disable=unused-argument
+        return _NULL_SPAN
+
+    def begin(self, name: str, cat: str = "command", **args) -> int:
+        # pylint: disable=unused-argument
+        return 0
+
+    def mark(self, sid: int, name: str, cat: str = "command", **args):
+        pass
+
+    def end(self, sid: int, name: str, cat: str = "command", **args):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ChromeTracer(Tracer):
+    """Record spans in Chrome trace event format, viewable in
+    chrome://tracing or https://ui.perfetto.dev.
+
+    Timestamps are monotonic microseconds since the tracer was created. Every
+    event has the game frame at that point in its args. Events are serialized
+    and written by a background thread.
+
+    Example
+    -------
+    >>> with ChromeTracer("trace.json") as tracer:
+    ...     m = MyManager(tracer=tracer)
+    """
+
+    enabled = True
+
+    def __init__(self, path: str, pid: int = None, flush_interval: float = 0.5):
+        """
+        Parameters
+        ----------
+        path : str
+            Output file
+        pid : int, optional
+            Process id of events, e.g. to tell games apart when merging
+            traces. By default, the id of this process.
+        flush_interval : float, optional
+            Seconds between writes, by default 0.5
+        """
+        super().__init__()
+        self.path = path
+        self.pid = os.getpid() if pid is None else pid
+        self.flush_interval = flush_interval
+        self.num_events = 0
+        self._t0 = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._tracks: dict[str, int] = {}
+        self._queue = queue.SimpleQueue()
+        # Closed in close(), or here if the writer can't be started
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, "w", encoding="utf-8")
+        self._first = True
+        try:
+            self._file.write("[\n")
+            self._thread = threading.Thread(target=self._writer, daemon=True)
+            self._thread.start()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _ts(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def _tid(self, track: str) -> int:
+        if track not in self._tracks:
+            self._tracks[track] = len(self._tracks) + 1
+            self._emit(
+                {
+                    "ph": "M",
+                    "name": "thread_name",
+                    "pid": self.pid,
+                    "tid": self._tracks[track],
+                    "args": {"name": track},
+                }
+            )
+        return self._tracks[track]
+
+    def _emit(self, ev: dict[str, Any]):
+        self._queue.put(ev)
+
+    @contextmanager
+    def _span(self, name: str, track: str, args: dict):
+        ts = self._ts()
+        args["frame"] = self.frame
+        try:
+            yield
+        finally:
+            self._emit(
+                {
+                    "ph": "X",
+                    "name": name,
+                    "ts": ts,
+                    "dur": self._ts() - ts,
+                    "pid": self.pid,
+                    "tid": self._tid(track),
+                    "args": args,
+                }
+            )
+
+    def span(self, name: str, track: str = "main", **args):
+        return self._span(name, track, args)
+
+    def _async(self, ph: str, sid: int, name: str, cat: str, args: dict):
+        args["frame"] = self.frame
+        self._emit(
+            {
+                "ph": ph,
+                "name": name,
+                "cat": cat,
+                "id": sid,
+                "ts": self._ts(),
+                "pid": self.pid,
+                "tid": 0,
+                "args": args,
+            }
+        )
+
+    def begin(self, name: str, cat: str = "command", **args) -> int:
+        sid = next(self._ids)
+        self._async("b", sid, name, cat, args)
+        return sid
+
+    def mark(self, sid: int, name: str, cat: str = "command", **args):
+        self._async("n", sid, name, cat, args)
+
+    def end(self, sid: int, name: str, cat: str = "command", **args):
+        self._async("e", sid, name, cat, args)
+
+    def _write(self, events: list[dict]):
+        for ev in events:
+            if not self._first:
+                self._file.write(",\n")
+            self._file.write(json.dumps(ev, separators=(",", ":")))
+            self._first = False
+        self.num_events += len(events)
+        self._file.flush()
+
+    def _writer(self):
+        done = False
+        while not done:
+            events = []
+            try:
+                ev = self._queue.get(timeout=self.flush_interval)
+                # Events emitted after close() follow the None sentinel and
+                # are dropped
+                while ev is not None:
+                    events.append(ev)
+                    ev = self._queue.get_nowait()
+                done = True
+            except queue.Empty:
+                pass
+            try:
+                self._write(events)
+            except OSError as e:
+                lg.error("failed to write trace %s: %s", self.path, e)
+
+    def close(self):
+        """Write remaining events and close the file."""
+        if self._file.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._file.write("\n]\n")
+        self._file.close()
@@ -48,17 +48,23 @@ def pdist(x1, x2, axis=0):
     return np.sqrt(np.sum((x1 - x2) ** 2, axis=axis))
 
 
-def read_protobuf_messages(f) -> Iterator[ra2yr.GameState]:
+def read_raw_messages(f) -> Iterator[bytes]:
+    """Read length-delimited messages without decoding them."""
     buf = f.read(10)  # Maximum length of length prefix
     while buf:
         msg_len, new_pos = _DecodeVarint32(buf, 0)
         buf = buf[new_pos:]
-        buf += f.read(msg_len - len(buf))
+        buf += f.read(max(msg_len - len(buf), 0))
+        yield buf[:msg_len]
+        buf = buf[msg_len:]
+        buf += f.read(10 - len(buf))
+
+
+def read_protobuf_messages(f) -> Iterator[ra2yr.GameState]:
+    for buf in read_raw_messages(f):
         s = ra2yr.GameState()
         s.ParseFromString(buf)
         yield s
-        buf = buf[msg_len:]
-        buf += f.read(10 - len(buf))
 
 
 def msg_oneline(m):
@@ -0,0 +1,183 @@
+"""Low level helpers for inspecting serialized protobuf messages without
+decoding them."""
+
+from typing import Iterator
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal.decoder import _DecodeVarint
+from ra2yrproto import ra2yr
+
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_FIXED32 = 5
+
+
+def iter_fields(
+    buf, pos: int = 0, end: int = None
+) -> Iterator[tuple[int, int, int, int]]:
+    """Iterate over top level fields of a serialized message.
+
+    Parameters
+    ----------
+    buf : bytes | memoryview
+        Serialized message
+    pos : int, optional
+        Start offset, by default 0
+    end : int, optional
+        End offset, by default len(buf)
+
+    Yields
+    ------
+    Iterator[tuple[int, int, int, int]]
+        Tuples of (field_number, wire_type, start, stop) where
+        ``buf[start:stop]`` is the payload. For varint fields, start is the
+        decoded value instead.
+
+    Raises
+    ------
+    RuntimeError
+        If an unsupported wire type is encountered.
+    """
+    if end is None:
+        end = len(buf)
+    while pos < end:
+        tag, pos = _DecodeVarint(buf, pos)
+        num, wt = tag >> 3, tag & 7
+        if wt == WIRETYPE_VARINT:
+            value, pos = _DecodeVarint(buf, pos)
+            yield num, wt, value, pos
+        elif wt == WIRETYPE_LENGTH_DELIMITED:
+            size, pos = _DecodeVarint(buf, pos)
+            yield num, wt, pos, pos + size
+            pos += size
+        elif wt == WIRETYPE_FIXED64:
+            yield num, wt, pos, pos + 8
+            pos += 8
+        elif wt == WIRETYPE_FIXED32:
+            yield num, wt, pos, pos + 4
+            pos += 4
+        else:
+            raise RuntimeError(f"unsupported wire type {wt} at {pos}")
+
+
+def _header_class(descriptor, names: list[str], name: str):
+    """Create message type with only the given scalar fields of descriptor.
+
+    Parsing a message with it skips all other fields in native code, which is
+    much faster than walking the fields in Python."""
+    # Members of generated modules are created at runtime
+    # pylint: disable-next=no-member
+    fp = descriptor_pb2.FileDescriptorProto(
+        name=f"pyra2yr/{name}.proto", package="pyra2yr", syntax="proto3"
+    )
+    m = fp.message_type.add(name=name)
+    for k in names:
+        f = descriptor.fields_by_name[k]
+        m.field.add(
+            name=k,
+            number=f.number,
+            type=(
+                FieldDescriptor.TYPE_INT32
+                if f.type == FieldDescriptor.TYPE_ENUM
+                else f.type
+            ),
+            label=FieldDescriptor.LABEL_OPTIONAL,
+        )
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(fp)
+    return message_factory.GetMessageClass(
+        pool.FindMessageTypeByName(f"pyra2yr.{name}")
+    )
+
+
+# GameState with only current_frame, stage and crc
+_StateHeader = _header_class(
+    ra2yr.GameState.DESCRIPTOR, ["current_frame", "stage", "crc"], "StateHeader"
+)
+
+
+def state_header(buf):
+    """Parse only current_frame, stage and crc of a serialized GameState.
+
+    Returns
+    -------
+    Message
+        Message with the fields of peek_state_header as attributes, which
+        can stand in for the GameState, e.g. in Poller.observe().
+    """
+    return _StateHeader.FromString(buf)
+
+
+def peek_state_header(buf) -> dict[str, int]:
+    """Get current_frame, stage and crc of a serialized GameState without
+    decoding the whole message."""
+    h = state_header(buf)
+    return {"current_frame": h.current_frame, "stage": h.stage, "crc": h.crc}
+
+
+def find_field(buf, number: int, pos: int = 0, end: int = None) -> tuple[int, int]:
+    """Find payload of a top level length delimited field.
+
+    Parameters
+    ----------
+    buf : bytes | memoryview
+        Serialized message
+    number : int
+        Field number
+    pos : int, optional
+        Start offset, by default 0
+    end : int, optional
+        End offset, by default len(buf)
+
+    Returns
+    -------
+    tuple[int, int]
+        (start, stop) of the last occurrence of the field, or None if not found.
+    """
+    res = None
+    for num, wt, start, stop in iter_fields(buf, pos, end):
+        if num == number and wt == WIRETYPE_LENGTH_DELIMITED:
+            res = (start, stop)
+    return res
+
+
+def find_path(
+    buf, numbers: list[int], pos: int = 0, end: int = None
+) -> tuple[int, int]:
+    """Find payload of a nested length delimited field, e.g. the value of an
+    Any inside a message, without decoding the enclosing messages.
+
+    Parameters
+    ----------
+    buf : bytes | memoryview
+        Serialized message
+    numbers : list[int]
+        Field numbers from the outermost message inwards
+    pos : int, optional
+        Start offset, by default 0
+    end : int, optional
+        End offset, by default len(buf)
+
+    Returns
+    -------
+    tuple[int, int]
+        (start, stop) of the innermost field, or None if any of the fields
+        wasn't found.
+    """
+    loc = (pos, len(buf) if end is None else end)
+    for number in numbers:
+        loc = find_field(buf, number, *loc)
+        if loc is None:
+            return None
+    return loc
+
+
+def varint_field(buf, number: int, pos: int = 0, end: int = None) -> int:
+    """Get value of a top level varint field, zero if not found."""
+    res = 0
+    for num, wt, value, _ in iter_fields(buf, pos, end):
+        if num == number and wt == WIRETYPE_VARINT:
+            res = value
+    return res
@@ -0,0 +1,241 @@
+"""Decode numeric fields of repeated messages in a serialized GameState
+straight into NumPy columns, without creating message objects."""
+
+from functools import cached_property
+
+import numpy as np
+from google.protobuf.internal.decoder import _DecodeVarint
+from google.protobuf.internal.encoder import _VarintBytes
+from ra2yrproto import ra2yr
+
+from pyra2yr.wire import (
+    WIRETYPE_FIXED32,
+    WIRETYPE_FIXED64,
+    WIRETYPE_LENGTH_DELIMITED,
+    WIRETYPE_VARINT,
+)
+
+_MAX_VARINT = 10
+
+# Below this many objects, decoding with protobuf and reading attributes is
+# faster, due to the fixed cost of array operations.
+WIRE_DECODE_MIN = 256
+
+
+def repeated_ranges(
+    buf, number: int, pos: int = 0, end: int = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find payloads of a top level repeated message field.
+
+    Consecutive entries are scanned in a tight loop, since serializers write
+    repeated fields contiguously.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Start and stop offsets of each entry.
+    """
+    if end is None:
+        end = len(buf)
+    tag = _VarintBytes(number << 3 | WIRETYPE_LENGTH_DELIMITED)
+    nt = len(tag)
+    starts = []
+    stops = []
+    while pos < end:
+        if buf[pos : pos + nt] == tag:
+            pos += nt
+            size = buf[pos]
+            if size & 0x80:
+                size, pos = _DecodeVarint(buf, pos)
+            else:
+                pos += 1
+            starts.append(pos)
+            pos += size
+            stops.append(pos)
+            continue
+        t, pos = _DecodeVarint(buf, pos)
+        wt = t & 7
+        if wt == WIRETYPE_VARINT:
+            _, pos = _DecodeVarint(buf, pos)
+        elif wt == WIRETYPE_LENGTH_DELIMITED:
+            size, pos = _DecodeVarint(buf, pos)
+            pos += size
+        elif wt == WIRETYPE_FIXED64:
+            pos += 8
+        elif wt == WIRETYPE_FIXED32:
+            pos += 4
+        else:
+            raise RuntimeError(f"unsupported wire type {wt} at {pos}")
+    return np.array(starts, dtype=np.int64), np.array(stops, dtype=np.int64)
+
+
+def _varints(b: np.ndarray, pos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Decode varints starting at each of pos. Returns values and lengths."""
+    last = b.size - 1
+    g = b[np.minimum(pos, last)]
+    val = (g & 0x7F).astype(np.uint64)
+    length = np.ones(pos.size, dtype=np.int64)
+    # Continue only with the varints that have more bytes
+    i = np.flatnonzero(g >= 0x80)
+    for k in range(1, _MAX_VARINT):
+        if not i.size:
+            break
+        g = b[np.minimum(pos[i] + k, last)]
+        val[i] |= (g & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+        length[i] += 1
+        i = i[g >= 0x80]
+    return val, length
+
+
+def _next_fields(b: np.ndarray, pos: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Read the field starting at each of pos.
+
+    Returns
+    -------
+    tuple[np.ndarray, ...]
+        Field numbers, wire types, varint values (payload sizes of length
+        delimited fields), value offsets of length delimited fields, and
+        offsets of the next fields.
+    """
+    tag, n = _varints(b, pos)
+    wt = (tag & np.uint64(7)).astype(np.int64)
+    if np.any((wt == 3) | (wt == 4) | (wt > 5)):
+        raise RuntimeError("unsupported wire type")
+    vpos = pos + n
+    val, n = _varints(b, vpos)
+    size = np.where(wt == WIRETYPE_LENGTH_DELIMITED, n + val.astype(np.int64), n)
+    size[wt == WIRETYPE_FIXED64] = 8
+    size[wt == WIRETYPE_FIXED32] = 4
+    return (tag >> np.uint64(3)).astype(np.int64), wt, val, vpos + n, vpos + size
+
+
+def _field_paths(descriptor, columns: dict[str, type]) -> dict:
+    """Map column paths like ``coordinates.x`` to nested dicts of field
+    numbers, with column names at the leaves."""
+    res = {}
+    for k in columns:
+        d, node = descriptor, res
+        parts = k.split(".")
+        for p in parts[:-1]:
+            f = d.fields_by_name[p]
+            node = node.setdefault(f.number, {})
+            d = f.message_type
+        node[d.fields_by_name[parts[-1]].number] = k
+    return res
+
+
+class DecodedObjects:
+    """Columns of decoded messages, with lazy access to full messages.
+
+    Columns are views to the decoder's buffers and are overwritten by its
+    next decode() call.
+    """
+
+    def __init__(self, buf, starts, stops, columns: dict[str, np.ndarray], cls):
+        self.buf = buf
+        self.starts = starts
+        self.stops = stops
+        self.columns = columns
+        self._cls = cls
+
+    def __len__(self) -> int:
+        return self.starts.size
+
+    def __getitem__(self, k: str) -> np.ndarray:
+        return self.columns[k]
+
+    def message(self, i: int):
+        """Decode the i'th message, e.g. a ra2yr.Object."""
+        return self._cls.FromString(self.buf[self.starts[i] : self.stops[i]])
+
+    @cached_property
+    def state(self) -> ra2yr.GameState:
+        """The fully decoded GameState."""
+        return ra2yr.GameState.FromString(self.buf)
+
+
+class ObjectDecoder:  # pylint: disable=too-few-public-methods
+    """Decode numeric fields of GameState.objects from the wire format into
+    preallocated columns.
+
+    Objects are decoded in parallel: each step reads the next field of every
+    object with vectorized varint decoding, so the number of Python level
+    iterations is the number of fields per object, not the number of objects.
+    Fields missing from an object are zero, like in protobuf.
+
+    Example
+    -------
+    >>> D = ObjectDecoder(OBJECT_COLUMNS)
+    >>> objs = D.decode(raw)
+    >>> objs["health"][objs["pointer_house"] == house]
+    """
+
+    def __init__(
+        self,
+        columns: dict[str, type],
+        field: str = "objects",
+        capacity: int = 1024,
+    ):
+        """
+        Parameters
+        ----------
+        columns : dict[str, type]
+            Varint fields to decode, as paths (e.g. ``coordinates.x``) mapped
+            to dtypes, e.g. OBJECT_COLUMNS
+        field : str, optional
+            Repeated message field of GameState, by default "objects"
+        capacity : int, optional
+            Initial number of rows, grown as needed. By default 1024
+        """
+        self.columns = columns
+        f = ra2yr.GameState.DESCRIPTOR.fields_by_name[field]
+        self.number = f.number
+        self._cls = f.message_type._concrete_class
+        self._paths = _field_paths(f.message_type, self.columns)
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self.capacity = capacity
+        self._out = {
+            k: np.zeros(capacity, dtype=dtype) for k, dtype in self.columns.items()
+        }
+
+    def _decode(self, b, msg, pos, stop, paths: dict):
+        """Decode fields of messages msg, spanning b[pos:stop]."""
+        while True:
+            # Drop messages that ended, including empty ones
+            m = pos < stop
+            msg, pos, stop = msg[m], pos[m], stop[m]
+            if not msg.size:
+                return
+            num, wt, val, vstart, pos = _next_fields(b, pos)
+            for number, sub in paths.items():
+                if isinstance(sub, str):
+                    m = (num == number) & (wt == WIRETYPE_VARINT)
+                    out = self._out[sub]
+                    out[msg[m]] = val[m].astype(np.int64).astype(out.dtype)
+                else:
+                    m = (num == number) & (wt == WIRETYPE_LENGTH_DELIMITED)
+                    self._decode(
+                        b, msg[m], vstart[m], vstart[m] + val[m].astype(np.int64), sub
+                    )
+
+    def decode(self, buf: bytes | memoryview) -> DecodedObjects:
+        """Decode serialized GameState.
+
+        Returns
+        -------
+        DecodedObjects
+            Columns, valid until the next call.
+        """
+        starts, stops = repeated_ranges(buf, self.number)
+        n = starts.size
+        if n > self.capacity:
+            self._alloc(max(n, 2 * self.capacity))
+        for v in self._out.values():
+            v[:n] = 0
+        b = np.frombuffer(buf, dtype=np.uint8)
+        if n:
+            self._decode(b, np.arange(n), starts, stops, self._paths)
+        cols = {k: v[:n] for k, v in self._out.items()}
+        return DecodedObjects(buf, starts, stops, cols, self._cls)